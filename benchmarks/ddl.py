@@ -0,0 +1,153 @@
+"""Throughput and peak memory of DDL generation at scale.
+
+Run from the repository root:
+
+    python -m benchmarks.ddl --output bench.json
+    python -m benchmarks.ddl --scale 0.1 --compare bench.json
+
+Every case builds its objects through the public fluent API and renders their create statements.  Timings are the
+best of --repeat runs.  Peak memory, with every object and its cached statements still alive, comes from a separate
+run under tracemalloc since tracing distorts the timings.
+"""
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from collections import OrderedDict
+
+from sqlalchemy import Column, Integer, MetaData, Table, Text
+
+from pgalchemy.function import FunctionGenerator
+from pgalchemy.policy import Policy
+from pgalchemy.privilege import Privilege
+from pgalchemy.trigger import Trigger
+
+metadata = MetaData()
+account = Table("account", metadata, Column("id", Integer, primary_key=True), Column("owner", Text))
+wide_table = Table("wide_table", metadata, Column("id", Integer, primary_key=True),
+                   *[Column("column_%d" % i, Integer) for i in range(200)])
+
+
+def sample_function(a: int, b: int = 1, name: str = "x") -> int:
+    total = a + b
+    return total * len(name)
+
+
+def audit() -> Trigger:
+    return "OK"
+
+
+def privileges(count):
+    objects = []
+    for i in range(count):
+        privilege = Privilege()
+        privilege.select.insert(account.c.id).update.on.table(account).to("role_%d" % (i % 100))
+        privilege._grant_statement
+        objects.append(privilege)
+    return objects
+
+
+def policies(count):
+    objects = []
+    for i in range(count):
+        policy = Policy("policy_%d" % i)
+        policy.on(account).for_.select.to("role_%d" % (i % 100)).using(account.c.id > i)
+        policy._create_statement
+        objects.append(policy)
+    return objects
+
+
+def functions(count):
+    objects = []
+    for _ in range(count):
+        function = FunctionGenerator.from_function(sample_function)
+        function._create_statement
+        objects.append(function)
+    return objects
+
+
+def wide_triggers(count, columns=200):
+    update_of = list(wide_table.c)[1:columns + 1]
+    objects = []
+    for i in range(count):
+        trigger = Trigger("trigger_%d" % i)
+        trigger.after.update_of(*update_of).on(wide_table).for_each.row(audit)
+        trigger._create_statement
+        objects.append(trigger)
+    return objects
+
+
+# name -> (callable returning the objects it built, object count at scale 1.0)
+cases = OrderedDict([
+    ("privileges", (privileges, 100000)),
+    ("policies", (policies, 10000)),
+    ("functions", (functions, 10000)),
+    ("wide_triggers", (wide_triggers, 1000)),
+])
+
+
+def measure(run, count, repeat=3):
+    seconds = min(_timed(run, count) for _ in range(repeat))
+    tracemalloc.start()
+    try:
+        objects = run(count)  # Keep every object alive, the way a registry holds them, until peak is read
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return OrderedDict([("count", count), ("seconds", seconds), ("per_second", count / seconds if seconds else None),
+                        ("peak_bytes", peak)])
+
+
+def _timed(run, count):
+    started = time.perf_counter()
+    run(count)
+    return time.perf_counter() - started
+
+
+def run_cases(names=None, scale=1.0, repeat=3):
+    unknown = set(names or ()) - set(cases)
+    if unknown:
+        raise ValueError("Unknown benchmark cases: %s" % ", ".join(sorted(unknown)))
+    results = OrderedDict()
+    for name, (run, count) in cases.items():
+        if names and name not in names:
+            continue
+        results[name] = measure(run, max(1, int(count * scale)), repeat)
+    return OrderedDict([("python", platform.python_version()), ("scale", scale), ("results", results)])
+
+
+def compare(report, baseline):
+    """Ratio of current to baseline for every case in both reports; above 1.0 means slower or larger."""
+    comparison = OrderedDict()
+    for name, result in report["results"].items():
+        previous = baseline["results"].get(name)
+        if previous is None or previous["count"] != result["count"]:
+            continue
+        comparison[name] = OrderedDict([("seconds", result["seconds"] / previous["seconds"]),
+                                        ("peak_bytes", result["peak_bytes"] / max(previous["peak_bytes"], 1))])
+    return comparison
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("cases", nargs="*", help="cases to run, any of %s; all of them by default" % ", ".join(cases))
+    parser.add_argument("--scale", type=float, default=1.0, help="multiplier for the number of objects per case")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="write the report as JSON to this path")
+    parser.add_argument("--compare", help="JSON report from an earlier run to compare against")
+    args = parser.parse_args(argv)
+    report = run_cases(args.cases, args.scale, args.repeat)
+    if args.compare:
+        with open(args.compare) as f:
+            report["comparison"] = compare(report, json.load(f))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    json.dump(report, sys.stdout, indent=2)
+    sys.stdout.write("\n")
+
+
+if __name__ == "__main__":
+    main()
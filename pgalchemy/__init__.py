@@ -1,3 +1 @@
-from .mocks import *
-from .core import *
-
+from .core import PostgresAlchemy
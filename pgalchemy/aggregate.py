@@ -0,0 +1,50 @@
+from pgalchemy.types import Creatable, cached_statement
+
+
+class Aggregate(Creatable):
+    _object_kind = "aggregate"
+
+    _sql_create_template = """
+        CREATE AGGREGATE {name} ({arguments}) (
+            {options}
+        )
+    """
+
+    _sql_drop_template = """
+        DROP AGGREGATE IF EXISTS {name} ({arguments})
+    """
+
+    def __init__(self, name, arguments, state_type, transition, final=None, combine=None, serialize=None,
+                 deserialize=None, initial_condition=None, parallel=None, functions=()):
+        self.name = name
+        self.arguments = list(arguments)  # SQL types
+        self.state_type = state_type
+        self.transition = transition
+        self.final = final
+        self.combine = combine
+        self.serialize = serialize
+        self.deserialize = deserialize
+        self.initial_condition = initial_condition
+        self.parallel = parallel
+        self.functions = list(functions)  # Support Functions generated along with the aggregate
+
+    def _arguments(self):
+        return ", ".join(self.arguments) or "*"
+
+    def _options(self):
+        options = [("SFUNC", self.transition), ("STYPE", self.state_type), ("FINALFUNC", self.final),
+                   ("COMBINEFUNC", self.combine), ("SERIALFUNC", self.serialize), ("DESERIALFUNC", self.deserialize)]
+        options = ["%s = %s" % (option, value) for option, value in options if value]
+        if self.initial_condition is not None:
+            options.append("INITCOND = '%s'" % str(self.initial_condition).replace("'", "''"))
+        if self.parallel:
+            options.append("PARALLEL = %s" % self.parallel.upper())
+        return ",\n            ".join(options)
+
+    @cached_statement
+    def _create_statement(self):
+        return self._sql_create_template.format(name=self.name, arguments=self._arguments(), options=self._options())
+
+    @cached_statement
+    def _drop_statement(self):
+        return self._sql_drop_template.format(name=self.name, arguments=self._arguments())
@@ -0,0 +1,166 @@
+import ast
+import re
+import textwrap
+import warnings
+
+from .util import literal_string
+
+# Weakest to strongest guarantee, the index is used to pick the weaker of two levels
+VOLATILITIES = ("VOLATILE", "STABLE", "IMMUTABLE")
+PARALLEL_SAFETIES = ("UNSAFE", "RESTRICTED", "SAFE")
+
+# plpy functions that only report messages or quote values, and so have no bearing on volatility
+_plpy_harmless = {"debug", "log", "info", "notice", "warning", "error", "fatal", "quote_literal", "quote_nullable",
+                  "quote_ident", "Error", "Fatal", "SPIError"}
+_plpy_queries = {"execute", "prepare", "cursor"}
+_plpy_transactions = {"commit", "rollback", "subtransaction"}
+_random_modules = {"random", "secrets", "uuid"}
+_clock_calls = {("time", "time"), ("time", "time_ns"), ("time", "monotonic"), ("time", "perf_counter"),
+                ("time", "localtime"), ("time", "gmtime"), ("datetime", "now"), ("datetime", "utcnow"),
+                ("datetime", "today"), ("date", "today"), ("os", "urandom"), ("os", "getpid")}
+_io_modules = {"os", "subprocess", "socket", "shutil", "urllib", "requests", "http", "io", "sys"}
+_io_builtins = {"open", "input", "exec", "eval", "__import__"}
+_read_only_sql = ("SELECT", "WITH", "VALUES", "TABLE", "SHOW")
+# Anywhere in a query, these write, lock rows or change state (a data-modifying WITH, SELECT INTO, nextval(), ...)
+_writing_sql_re = re.compile(r"\b(INSERT|UPDATE|DELETE|MERGE|TRUNCATE|INTO|SHARE|NEXTVAL|SETVAL|SET_CONFIG|RANDOM|"
+                             r"PG_ADVISORY_\w+)\b", re.IGNORECASE)
+_dict_reads = {"get", "keys", "values", "items", "copy", "__contains__"}
+
+
+class FunctionAttributeWarning(UserWarning):
+    """A function was declared with a volatility or parallel safety its body doesn't live up to."""
+
+
+class Analysis(object):
+    def __init__(self):
+        self.volatility = "IMMUTABLE"
+        self.parallel = "SAFE"
+        self.reasons = []
+
+    def restrict(self, volatility, parallel, reason):
+        if VOLATILITIES.index(volatility) < VOLATILITIES.index(self.volatility):
+            self.volatility = volatility
+        if PARALLEL_SAFETIES.index(parallel) < PARALLEL_SAFETIES.index(self.parallel):
+            self.parallel = parallel
+        self.reasons.append(reason)
+
+    def __repr__(self):
+        return "Analysis(%s PARALLEL %s)" % (self.volatility, self.parallel)
+
+
+def _dotted_name(node):
+    parts = []
+    while isinstance(node, ast.Attribute):
+        parts.append(node.attr)
+        node = node.value
+    if isinstance(node, ast.Name):
+        parts.append(node.id)
+        return tuple(reversed(parts))
+    return ()
+
+
+def _is_read_only(sql):
+    return sql.lstrip().upper().startswith(_read_only_sql) and not _writing_sql_re.search(sql)
+
+
+class _BodyVisitor(ast.NodeVisitor):
+    def __init__(self, analysis, prepared):
+        self.analysis = analysis
+        self.prepared = prepared  # Names bound to plpy.prepare plans, their queries are checked where prepared
+
+    def visit_Global(self, node):
+        self.analysis.restrict("VOLATILE", "UNSAFE", "writes globals: %s" % ", ".join(node.names))
+
+    def visit_Import(self, node):
+        for alias in node.names:
+            self._check_module(alias.name.split(".")[0])
+
+    def visit_ImportFrom(self, node):
+        self._check_module((node.module or "").split(".")[0])
+
+    def _check_module(self, module):
+        if module in _random_modules:
+            self.analysis.restrict("VOLATILE", "RESTRICTED", "uses %s" % module)
+        elif module in _io_modules:
+            self.analysis.restrict("VOLATILE", "UNSAFE", "uses %s" % module)
+
+    def visit_Subscript(self, node):
+        if isinstance(node.value, ast.Name) and node.value.id in ("SD", "GD"):
+            if isinstance(node.ctx, ast.Store) or isinstance(node.ctx, ast.Del):
+                self.analysis.restrict("VOLATILE", "RESTRICTED", "writes %s" % node.value.id)
+            else:
+                self.analysis.restrict("STABLE", "RESTRICTED", "reads %s" % node.value.id)
+        self.generic_visit(node)
+
+    def visit_Call(self, node):
+        name = _dotted_name(node.func)
+        if name and name[0] == "plpy" and len(name) == 2:
+            self._check_plpy(name[1], node)
+        elif name and name[0] in ("SD", "GD") and len(name) == 2:
+            if name[1] in _dict_reads:
+                self.analysis.restrict("STABLE", "RESTRICTED", "reads %s" % name[0])
+            else:
+                self.analysis.restrict("VOLATILE", "RESTRICTED", "writes %s" % name[0])
+        elif name and name[0] in _random_modules:
+            self.analysis.restrict("VOLATILE", "RESTRICTED", "calls %s" % ".".join(name))
+        elif name and name[-2:] in _clock_calls:
+            self.analysis.restrict("VOLATILE", "RESTRICTED", "calls %s" % ".".join(name))
+        elif name and (name[0] in _io_modules or name == (name[0],) and name[0] in _io_builtins):
+            self.analysis.restrict("VOLATILE", "UNSAFE", "calls %s" % ".".join(name))
+        self.generic_visit(node)
+
+    def _check_plpy(self, attribute, node):
+        if attribute in _plpy_harmless:
+            return
+        elif attribute in _plpy_transactions:
+            self.analysis.restrict("VOLATILE", "UNSAFE", "controls transactions with plpy.%s" % attribute)
+        elif attribute in _plpy_queries:
+            query = node.args[0] if node.args else None
+            sql = literal_string(query)
+            if sql is not None and _is_read_only(sql):
+                self.analysis.restrict("STABLE", "RESTRICTED", "reads the database with plpy.%s" % attribute)
+            elif attribute == "execute" and isinstance(query, ast.Name) and query.id in self.prepared:
+                self.analysis.restrict("STABLE", "RESTRICTED", "executes a prepared plan")
+            else:
+                self.analysis.restrict("VOLATILE", "UNSAFE", "may write to the database with plpy.%s" % attribute)
+        else:
+            self.analysis.restrict("VOLATILE", "UNSAFE", "calls plpy.%s" % attribute)
+
+
+def _prepared_plans(tree):
+    plans = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Assign) and isinstance(node.value, ast.Call):
+            if _dotted_name(node.value.func) == ("plpy", "prepare"):
+                plans.update(target.id for target in node.targets if isinstance(target, ast.Name))
+    return plans
+
+
+def analyze(code) -> Analysis:
+    """Infer the strongest volatility and parallel safety a plpython body can safely be declared with.
+
+    Only the body itself is inspected, so anything it calls that isn't recognised (helper functions imported
+    into the interpreter, for instance) is assumed to be pure.
+    """
+    analysis = Analysis()
+    # Wrapped in a def so that return and yield statements in the body parse
+    source = "def body():\n" + textwrap.indent(textwrap.dedent(code), "    ")
+    tree = ast.parse(source)
+    _BodyVisitor(analysis, _prepared_plans(tree)).visit(tree)
+    return analysis
+
+
+def check_declared_attributes(function, analysis=None):
+    """Warn when a Function claims a stronger volatility or parallel safety than its body supports."""
+    analysis = analysis or analyze(function.code)
+    reasons = "; ".join(analysis.reasons)
+    if VOLATILITIES.index(function.volatility.upper()) > VOLATILITIES.index(analysis.volatility):
+        message = "Function %s is declared %s but its body is at most %s (%s)"
+        warnings.warn(message % (function.name, function.volatility.upper(), analysis.volatility, reasons),
+                      FunctionAttributeWarning, stacklevel=3)
+    parallel = (function.parallel or "UNSAFE").upper()
+    if PARALLEL_SAFETIES.index(parallel) > PARALLEL_SAFETIES.index(analysis.parallel):
+        message = "Function %s is declared PARALLEL %s but its body is at most PARALLEL %s (%s)"
+        warnings.warn(message % (function.name, parallel, analysis.parallel, reasons), FunctionAttributeWarning,
+                      stacklevel=3)
+    return analysis
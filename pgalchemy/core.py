@@ -1,4 +1,10 @@
 from collections import OrderedDict
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .deploy import DependencyGraph
+
+__all__ = ["PostgresAlchemy"]
 
 
 class PostgresAlchemy(object):
@@ -6,27 +12,116 @@ class PostgresAlchemy(object):
     def __init__(self, connection=None):
         self.engine = connection
         self.roles = OrderedDict()
-        self.procedure = OrderedDict()
+        self.domains = OrderedDict()
+        self.tables = OrderedDict()
+        self.procedures = OrderedDict()
+        self.aggregates = OrderedDict()
         self.triggers = OrderedDict()
         self.privileges = OrderedDict()
         self.policies = OrderedDict()
 
-    def role(self):
-        pass
+    @property
+    def objects(self):
+        for registry in (self.roles, self.domains, self.tables, self.procedures, self.aggregates, self.triggers,
+                         self.policies, self.privileges):
+            yield from registry.values()
+
+    def role(self, name, options=None):
+        from .role import Role
+        role = Role(name, options)
+        self.roles[name] = role
+        return role
+
+    def domain(self, domain):
+        self.domains[domain.name] = domain
+        return domain
+
+    def table(self, table):
+        self.tables[getattr(table, "__table__", table).name] = table
+        return table
+
+    def procedure(self, f):
+        from .function import Function, FunctionGenerator
+        function = f if isinstance(f, Function) else FunctionGenerator.from_function(f)
+        self.procedures[function.name] = function
+        if getattr(f, "_function_options", {}).get("batched"):
+            batched = FunctionGenerator.batched_from_function(f)
+            self.procedures[batched.name] = batched
+        return f
+
+    def aggregate(self, aggregate_class):
+        from .function import FunctionGenerator
+        aggregate = FunctionGenerator.aggregate_from_class(aggregate_class)
+        for function in aggregate.functions:
+            self.procedures[function.name] = function
+        self.aggregates[aggregate.name] = aggregate
+        return aggregate_class
+
+    def trigger(self, f_or_name):
+        from .trigger import Trigger
+        trigger = Trigger(f_or_name)
+        self.triggers[trigger._name] = trigger
+        return trigger
+
+    def policy(self, name):
+        from .policy import Policy
+        policy = Policy(name)
+        self.policies[name] = policy
+        return policy
+
+    def grant(self, privilege=None):
+        from .privilege import Privilege
+        privilege = privilege if privilege is not None else Privilege()
+        self.privileges[id(privilege)] = privilege
+        return privilege
+
+    def revoke(self, privilege):
+        self.privileges.pop(id(privilege), None)
+
+    def dependency_graph(self) -> "DependencyGraph":
+        from .deploy import DependencyGraph
+        return DependencyGraph(self.objects)
+
+    def create_all(self, connection=None, max_statements=500, workers=1, lock_timeout=None):
+        return self._deploy(connection, False, max_statements, workers, lock_timeout)
 
-    def procedure(self):
-        pass
+    def drop_all(self, connection=None, max_statements=500, workers=1, lock_timeout=None):
+        return self._deploy(connection, True, max_statements, workers, lock_timeout)
 
-    def trigger(self):
-        pass
+    async def create_all_async(self, connection=None, max_statements=500):
+        from .deploy import deploy_async
+        return await deploy_async(self.dependency_graph(), connection or self.engine, max_statements=max_statements)
 
-    def policy(self):
-        pass
+    async def drop_all_async(self, connection=None, max_statements=500):
+        from .deploy import deploy_async
+        return await deploy_async(self.dependency_graph(), connection or self.engine, drop=True,
+                                  max_statements=max_statements)
 
-    def grant(self):
-        pass
+    def reconcile(self, connection=None, prune=True, max_statements=500):
+        """Only apply the changes needed to bring the database in line with the registered objects."""
+        from .introspection import reconcile
+        return reconcile(self.dependency_graph(), connection or self.engine, prune, max_statements)
 
-    def revoke(self):
-        pass
+    def deploy_changes(self, connection=None, ledger=None, prune=False, max_statements=500):
+        """Skip every object whose fingerprint matches the one recorded in the ledger when it was last deployed."""
+        from .ledger import deploy_changes
+        return deploy_changes(self.dependency_graph(), connection or self.engine, ledger, prune, max_statements)
 
+    def fan_out(self, urls, concurrency=8, method="create_all", progress=None, engine_factory=None, **kwargs):
+        """Apply the registered objects to every database in urls concurrently, collecting failures per database.
+        Keyword arguments are passed on to method, e.g. fan_out(urls, method="reconcile", prune=False)."""
+        from .fanout import fan_out
+        return fan_out(self, urls, concurrency, method, progress, engine_factory, **kwargs)
 
+    def _deploy(self, connection, drop, max_statements, workers, lock_timeout=None):
+        connection = connection or self.engine
+        graph = self.dependency_graph()
+        if lock_timeout is not None:
+            if workers > 1:
+                raise ValueError("Lock aware deployment applies one table at a time, it can't use several workers")
+            from .locking import lock_aware_deploy
+            return lock_aware_deploy(graph, connection, drop, lock_timeout, max_statements=max_statements)
+        from .deploy import deploy, parallel_deploy
+        if workers > 1:
+            return parallel_deploy(graph, connection, workers, drop=drop, max_statements=max_statements)
+        return deploy(graph, connection, drop=drop, max_statements=max_statements)
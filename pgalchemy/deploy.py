@@ -0,0 +1,317 @@
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from . import instrumentation
+from .types import fingerprint_statement
+from .util import execute_async, get_name, get_table_name, split_statement
+
+
+def resolve_object(obj):
+    """Fluent clauses stand in for the object they are building, so deploy the underlying object instead."""
+    for attribute in ("_policy", "_trigger", "_privilege"):
+        target = getattr(obj, attribute, None)
+        if target is not None:
+            return target
+    return obj
+
+
+def object_kind(obj):
+    kind = getattr(obj, "_object_kind", None)
+    if kind:
+        return kind
+    if hasattr(obj, "__table__"):
+        return "table"
+    if hasattr(obj, "columns") and hasattr(obj, "metadata"):
+        return "table"
+    raise ValueError("Don't know how to deploy object of type: %s" % type(obj))
+
+
+def _sql_type_names(type_names):
+    for type_name in type_names:
+        type_name = type_name.strip()
+        if type_name.upper().startswith("SETOF "):
+            type_name = type_name[len("SETOF "):]
+        yield type_name.rstrip("[]").strip()
+
+
+class DeployNode(object):
+    def __init__(self, obj, kind, name, dependencies=()):
+        self.object = obj
+        self.kind = kind
+        self.name = name
+        self.dependencies = list(dependencies)
+
+    @property
+    def key(self):
+        return self.kind, self.name
+
+    @property
+    def lock_key(self):
+        """Objects sharing a lock key contend for the same lock, so they are never applied concurrently."""
+        if self.kind == "table":
+            return "table", self.name
+        elif self.kind == "trigger":
+            return "table", get_table_name(self.object._selectable)
+        elif self.kind == "policy":
+            return "table", get_table_name(self.object._table)
+        elif self.kind == "privilege" and self.object._target_type == "TABLE":
+            return "table", ", ".join(sorted(get_table_name(t) for t in self.object._target))
+        return self.key
+
+    @property
+    def fingerprint(self):
+        if self.kind == "table":
+            return fingerprint_statement(self.create_statement)
+        return self.object._fingerprint
+
+    @property
+    def create_statement(self):
+        if self.kind == "privilege":
+            return self.object._grant_statement
+        elif self.kind == "table":
+            from sqlalchemy.schema import CreateTable
+            from sqlalchemy.dialects.postgresql import dialect
+            return str(CreateTable(getattr(self.object, "__table__", self.object)).compile(dialect=dialect()))
+        return self.object._create_statement
+
+    @property
+    def drop_statement(self):
+        if self.kind == "privilege":
+            return self.object._revoke_statement
+        elif self.kind == "table":
+            from sqlalchemy.schema import DropTable
+            from sqlalchemy.dialects.postgresql import dialect
+            return str(DropTable(getattr(self.object, "__table__", self.object)).compile(dialect=dialect()))
+        return self.object._drop_statement
+
+    def __repr__(self):
+        return "DeployNode(%s %s)" % self.key
+
+
+class DependencyGraph(object):
+    """Orders roles, domains, tables, functions, aggregates, triggers, policies and privileges so that everything an
+    object refers to is created before it."""
+
+    def __init__(self, objects=()):
+        self.nodes = OrderedDict()
+        self._privilege_count = 0
+        for obj in objects:
+            self.add(obj)
+
+    def add(self, obj) -> DeployNode:
+        obj = resolve_object(obj)
+        kind = object_kind(obj)
+        node = DeployNode(obj, kind, self._name(kind, obj), self._dependencies(kind, obj))
+        self.nodes[node.key] = node
+        return node
+
+    def _name(self, kind, obj):
+        if kind == "table":
+            return get_table_name(obj)
+        elif kind == "trigger":
+            return "%s.%s" % (get_name(obj._selectable), obj._name)
+        elif kind == "policy":
+            return "%s.%s" % (get_name(obj._table), obj._name)
+        elif kind == "privilege":
+            self._privilege_count += 1
+            return str(self._privilege_count)
+        return obj.name
+
+    @staticmethod
+    def _dependencies(kind, obj):
+        dependencies = []
+        if kind == "role":
+            dependencies.extend(("role", r) for r in obj._referenced_roles)
+        elif kind == "table":
+            table = getattr(obj, "__table__", obj)
+            for column in table.columns:
+                if getattr(type(column.type), "_object_kind", None) == "domain":
+                    dependencies.append(("domain", column.type.name))
+        elif kind == "function":
+            parameter_types = [p.split()[1] for p in obj.parameters if len(p.split()) > 1]
+            for type_name in _sql_type_names(parameter_types + [obj.return_type]):
+                dependencies.extend((("domain", type_name), ("table", type_name)))
+        elif kind == "aggregate":
+            dependencies.extend(("function", f.name) for f in obj.functions)
+            for type_name in _sql_type_names(obj.arguments):
+                dependencies.extend((("domain", type_name), ("table", type_name)))
+        elif kind == "trigger":
+            dependencies.append(("function", obj._function_name))
+            dependencies.append(("table", get_table_name(obj._selectable)))
+            if obj._from_table is not None:
+                dependencies.append(("table", get_table_name(obj._from_table)))
+        elif kind == "policy":
+            dependencies.append(("table", get_table_name(obj._table)))
+            dependencies.extend(("role", get_name(r)) for r in obj._recipient)
+        elif kind == "privilege":
+            dependencies.extend(("role", get_name(r)) for r in obj._recipient)
+            target_kind = {"TABLE": "table", "FUNCTION": "function", "DOMAIN": "domain"}.get(obj._target_type)
+            for target in obj._target:
+                if isinstance(target, str) and target.startswith("ALL "):
+                    if target.startswith("ALL TABLES"):
+                        dependencies.append(("table", "*"))
+                    elif target.startswith("ALL FUNCTIONS"):
+                        dependencies.append(("function", "*"))
+                elif target_kind:
+                    name = get_table_name(target) if target_kind == "table" else getattr(target, "__name__", target)
+                    dependencies.append((target_kind, get_name(name).split("(")[0]))
+        return dependencies
+
+    def _resolve_dependencies(self, node):
+        """Only objects that are part of this graph constrain ordering, anything else is assumed to already exist."""
+        resolved = []
+        for kind, name in node.dependencies:
+            if name == "*":
+                resolved.extend(key for key in self.nodes if key[0] == kind)
+            elif (kind, name) in self.nodes and (kind, name) != node.key:
+                resolved.append((kind, name))
+        return resolved
+
+    def levels(self):
+        """Group the nodes into waves, where every node only depends on nodes in earlier waves."""
+        remaining = OrderedDict((key, set(self._resolve_dependencies(node))) for key, node in self.nodes.items())
+        levels = []
+        while remaining:
+            ready = [key for key, dependencies in remaining.items() if not dependencies]
+            if not ready:
+                cycle = ", ".join("%s %s" % key for key in remaining)
+                raise ValueError("Circular dependency detected between: %s" % cycle)
+            levels.append([self.nodes[key] for key in ready])
+            for key in ready:
+                del remaining[key]
+            for dependencies in remaining.values():
+                dependencies.difference_update(ready)
+        return levels
+
+    def ordered(self, drop=False):
+        nodes = [node for level in self.levels() for node in level]
+        return list(reversed(nodes)) if drop else nodes
+
+    def statements(self, drop=False):
+        return node_statements(self.ordered(drop), drop)
+
+    def waves(self, workers, drop=False):
+        """Split each dependency level into at most `workers` units that can be applied side by side.
+
+        Nodes that share a lock key always end up in the same unit, units are balanced by statement count.
+        """
+        levels = self.levels()
+        if drop:
+            levels = [list(reversed(level)) for level in reversed(levels)]
+        waves = []
+        for level in levels:
+            groups = OrderedDict()
+            for node in level:
+                groups.setdefault(node.lock_key, []).append(node)
+            units = [[] for _ in range(min(workers, len(groups)))]
+            for group in sorted(groups.values(), key=len, reverse=True):
+                min(units, key=len).extend(group)
+            waves.append(units)
+        return waves
+
+
+def node_statements(nodes, drop=False):
+    for node in nodes:
+        yield split_statement(node.drop_statement if drop else node.create_statement)
+
+
+def batch_statements(statements, max_statements=500):
+    """Join consecutive statements into multi-statement batches so each batch costs a single round trip.
+
+    Statements that carry bind parameters are emitted on their own, since the driver has to interpolate them.
+    """
+    batch = []
+    for sql, params in statements:
+        if params:
+            if batch:
+                yield ";\n".join(batch), []
+                batch = []
+            yield sql, params
+            continue
+        batch.append(sql)
+        if max_statements and len(batch) >= max_statements:
+            yield ";\n".join(batch), []
+            batch = []
+    if batch:
+        yield ";\n".join(batch), []
+
+
+@contextmanager
+def transaction(connection):
+    if hasattr(connection, "raw_connection"):  # an Engine, check out a connection for the duration
+        with connection.begin() as conn:
+            yield conn
+    else:
+        with connection.begin():
+            yield connection
+
+
+def execute(connection, sql, params=None):
+    if params:
+        return connection.execute(sql, params)
+    return connection.execute(sql)
+
+
+def _as_graph(objects):
+    return objects if isinstance(objects, DependencyGraph) else DependencyGraph(objects)
+
+
+def apply_nodes(connection, nodes, drop=False, max_statements=500, lock_wait=None):
+    """Execute the statements for nodes on a connection that is already in a transaction."""
+    if instrumentation.listening(connection):
+        # Someone is watching, so give up batching in favour of one timed statement per object
+        for node in nodes:
+            sql, params = split_statement(node.drop_statement if drop else node.create_statement)
+            instrumentation.instrumented(connection, node.kind, node.object, sql, execute, connection, sql, params,
+                                         lock_wait=lock_wait)
+            lock_wait = None  # Any wait happened before the first statement
+        return
+    for sql, params in batch_statements(node_statements(nodes, drop), max_statements):
+        execute(connection, sql, params)
+
+
+def _execute_nodes(connection, nodes, drop, max_statements):
+    with transaction(connection) as conn:
+        apply_nodes(conn, nodes, drop, max_statements)
+
+
+def deploy(objects, connection, drop=False, max_statements=500):
+    """Create (or drop) objects in dependency order, using a few multi-statement batches in one transaction."""
+    graph = _as_graph(objects)
+    _execute_nodes(connection, graph.ordered(drop), drop, max_statements)
+    return graph
+
+
+async def deploy_async(objects, connection, drop=False, max_statements=500):
+    """Asyncio counterpart of deploy, for SQLAlchemy AsyncConnections and asyncpg style connections."""
+    graph = _as_graph(objects)
+    # AsyncConnection.begin() and asyncpg's transaction() are both async context managers
+    transaction = connection.begin() if hasattr(connection, "exec_driver_sql") else connection.transaction()
+    async with transaction:
+        if instrumentation.listening(connection):
+            for node in graph.ordered(drop):
+                statement = node.drop_statement if drop else node.create_statement
+                await instrumentation.instrumented_async(connection, node.kind, node.object, statement, execute_async,
+                                                         connection, statement)
+            return graph
+        for sql, params in batch_statements(graph.statements(drop), max_statements):
+            await execute_async(connection, (sql, params))
+    return graph
+
+
+def parallel_deploy(objects, engine, workers=4, drop=False, max_statements=500):
+    """Apply each wave of independent objects concurrently, with one pooled connection per worker.
+
+    Every unit of a wave commits in its own transaction, and a wave only starts once the previous one has finished.
+    The engine's pool should allow at least `workers` connections.
+    """
+    if not hasattr(engine, "raw_connection"):
+        raise ValueError("Parallel deployment needs an Engine so that each worker can check out its own connection")
+    from concurrent.futures import ThreadPoolExecutor
+    graph = _as_graph(objects)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for wave in graph.waves(workers, drop):
+            futures = [executor.submit(_execute_nodes, engine, unit, drop, max_statements) for unit in wave]
+            for future in futures:
+                future.result()  # Wait for the whole wave, re-raising the first failure
+    return graph
@@ -3,9 +3,8 @@ from sqlalchemy.sql.visitors import VisitableType
 from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.sql.expression import ColumnClause
 from sqlalchemy.sql.compiler import GenericTypeCompiler
-from sqlalchemy.dialects.postgres import dialect
 
-from pgalchemy.types import Creatable
+from pgalchemy.types import Creatable, cached_statement, fingerprint_statement
 from .util import get_condition_text, camelcase_to_underscore
 
 
@@ -46,21 +45,38 @@ class DomainMeta(VisitableType):
             setattr(GenericTypeCompiler, "visit_" + domain.name, visit_domain)
         return domain
 
-    @property
+    def __setattr__(cls, name, value):
+        super().__setattr__(name, value)
+        if name != "_statement_cache" and "_statement_cache" in vars(cls):
+            type.__delattr__(cls, "_statement_cache")
+
+    @cached_statement
+    def _type_name(self):
+        type_ = self.type() if isinstance(self.type, type) else self.type
+        from sqlalchemy.dialects.postgresql import dialect
+        return type_.compile(dialect())
+
+    @cached_statement
     def _create_statement(self):
-        type_ = self.type.compile(dialect)
+        type_ = self._type_name
         collate = "COLLATE %s" % self.collate if hasattr(self, "collate") else ""
         default = "DEFAULT %s" % self.default if hasattr(self, "default") else ""
         constraint = "CHECK (%s)" % get_condition_text(self.constraint) if hasattr(self, "constraint") else ""
         return self._create_sql_template.format(name=self.name, type=type_, collate=collate, default=default,
                                                 constraint=constraint)
 
-    @property
+    @cached_statement
     def _drop_statement(self):
         return self._drop_sql_template.format(name=self.name)
 
+    @cached_statement
+    def _fingerprint(self):
+        return fingerprint_statement(self._create_statement)
+
 
 class Domain(Creatable, metaclass=DomainMeta):
+    _object_kind = "domain"
+
     _create_sql_template = """
         CREATE DOMAIN {name} AS {type} {collate} {default} {constraint}
     """
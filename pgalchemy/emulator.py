@@ -0,0 +1,305 @@
+"""Run generated plpython function and trigger bodies in-process, against a stand-in for the plpy module.
+
+    session = Session(handler=lambda sql, args, limit: [{"n": 1}])
+    count = session.function(count_rows)
+    assert count(10) == 1
+    print(count.benchmark([(10,)] * 1000))
+
+Queries go to the session's handler, called with (sql, args, limit) and returning a list of row dicts, so function
+hot paths can be exercised and profiled without a server that has plpython3u installed.
+"""
+import inspect
+import re
+import textwrap
+import time
+from collections import Counter, OrderedDict
+
+from .function import Function, FunctionGenerator
+from .util import get_name
+
+_identifier_re = re.compile(r"^[a-z_][a-z0-9_$]*$")
+
+
+class Error(Exception):
+    pass
+
+
+class Fatal(Exception):
+    pass
+
+
+class SPIError(Exception):
+    pass
+
+
+class Result(list):
+    """Rows returned by plpy.execute, a list of dicts like PL/Python's result object."""
+
+    def __init__(self, rows=(), status="SPI_OK_SELECT"):
+        super().__init__(rows)
+        self._status = status
+
+    def nrows(self):
+        return len(self)
+
+    def status(self):
+        return self._status
+
+    def colnames(self):
+        return list(self[0]) if self else []
+
+
+class Plan(object):
+    def __init__(self, plpy, query, argtypes):
+        self.plpy = plpy
+        self.query = query
+        self.argtypes = list(argtypes or [])
+
+    def execute(self, args=None, limit=None):
+        return self.plpy.execute(self, args, limit)
+
+    def cursor(self, args=None):
+        return self.plpy.cursor(self, args)
+
+    def status(self):
+        return True
+
+
+class _Subtransaction(object):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+class Plpy(object):
+    """Stands in for the plpy module, sending queries to a handler and counting every call made to it."""
+    Error = Error
+    Fatal = Fatal
+    SPIError = SPIError
+
+    def __init__(self, handler=None):
+        self.handler = handler or (lambda sql, args, limit: [])
+        self.calls = Counter()
+        self.messages = []
+        self.queries = Counter()  # Times each query was sent to the handler
+
+    def _query(self, query, args, limit):
+        if isinstance(query, Plan):
+            if len(args or ()) != len(query.argtypes):
+                raise SPIError("Expected %d arguments, got %d" % (len(query.argtypes), len(args or ())))
+            query = query.query
+        elif args:
+            raise SPIError("Arguments can only be passed along with a prepared plan")
+        self.queries[query] += 1
+        rows = self.handler(query, list(args or ()), limit) or []
+        return Result(rows[:limit] if limit else rows)
+
+    def execute(self, query, args=None, limit=None):
+        self.calls["execute"] += 1
+        return self._query(query, args, limit)
+
+    def prepare(self, query, argtypes=None):
+        self.calls["prepare"] += 1
+        return Plan(self, query, argtypes)
+
+    def cursor(self, query, args=None):
+        self.calls["cursor"] += 1
+        return iter(self._query(query, args, None))
+
+    def subtransaction(self):
+        self.calls["subtransaction"] += 1
+        return _Subtransaction()
+
+    def commit(self):
+        self.calls["commit"] += 1
+
+    def rollback(self):
+        self.calls["rollback"] += 1
+
+    def _message(self, level, message):
+        self.calls[level] += 1
+        self.messages.append((level, message))
+
+    def debug(self, message):
+        self._message("debug", message)
+
+    def log(self, message):
+        self._message("log", message)
+
+    def info(self, message):
+        self._message("info", message)
+
+    def notice(self, message):
+        self._message("notice", message)
+
+    def warning(self, message):
+        self._message("warning", message)
+
+    def error(self, message):
+        self._message("error", message)
+        raise Error(message)
+
+    def fatal(self, message):
+        self._message("fatal", message)
+        raise Fatal(message)
+
+    @staticmethod
+    def quote_literal(value):
+        return "'%s'" % str(value).replace("'", "''")
+
+    @classmethod
+    def quote_nullable(cls, value):
+        return "NULL" if value is None else cls.quote_literal(value)
+
+    @staticmethod
+    def quote_ident(name):
+        return name if _identifier_re.match(name) else '"%s"' % name.replace('"', '""')
+
+
+class BenchmarkReport(object):
+    def __init__(self, name, latencies, plpy_calls):
+        self.name = name
+        self.latencies = sorted(latencies)
+        self.plpy_calls = plpy_calls
+
+    @property
+    def calls(self):
+        return len(self.latencies)
+
+    @property
+    def total(self):
+        return sum(self.latencies)
+
+    @property
+    def mean(self):
+        return self.total / self.calls if self.calls else 0.0
+
+    def percentile(self, percent):
+        if not self.latencies:
+            return 0.0
+        return self.latencies[min(len(self.latencies) - 1, int(len(self.latencies) * percent / 100.0))]
+
+    def plpy_calls_per_call(self):
+        return OrderedDict((name, count / self.calls) for name, count in sorted(self.plpy_calls.items()))
+
+    def __str__(self):
+        lines = ["%s: %d calls, mean %.1fus, p50 %.1fus, p95 %.1fus" % (
+            self.name, self.calls, self.mean * 1e6, self.percentile(50) * 1e6, self.percentile(95) * 1e6)]
+        for name, per_call in self.plpy_calls_per_call().items():
+            lines.append("    plpy.%s: %.2f per call" % (name, per_call))
+        return "\n".join(lines)
+
+
+class FunctionRuntime(object):
+    """One function body compiled the way PL/Python does it: a procedure without parameters, reading its arguments
+    (and TD for triggers) from its globals, so assigning to an argument fails here just as it does on the server."""
+
+    def __init__(self, session, name, code, parameter_names, returns_set=False):
+        self.session = session
+        self.name = name
+        self.parameter_names = list(parameter_names)
+        self.returns_set = returns_set
+        self.SD = {}
+        self.globals = {"plpy": session.plpy, "SD": self.SD, "GD": session.GD, "__name__": "__plpython__"}
+        procedure = "__plpython_procedure_%s" % name
+        source = "def %s():\n%s" % (procedure, textwrap.indent(textwrap.dedent(code), "    "))
+        exec(compile(source, "<plpython %s>" % name, "exec"), self.globals)
+        self.procedure = self.globals[procedure]
+
+    def _bind(self, args, kwargs):
+        if len(args) + len(kwargs) != len(self.parameter_names):
+            raise TypeError("%s expects %d arguments" % (self.name, len(self.parameter_names)))
+        values = dict(zip(self.parameter_names, args), **kwargs)
+        self.globals.update(values)
+        self.globals["args"] = [values[name] for name in self.parameter_names]
+
+    def __call__(self, *args, **kwargs):
+        self._bind(args, kwargs)
+        result = self.procedure()
+        if self.returns_set and result is not None:
+            result = list(result)  # The server pulls every row before the call is over
+        return result
+
+    def _invoke(self, call):
+        return self(*call)
+
+    def benchmark(self, calls, warmup=1):
+        """Time the function once for each tuple of arguments in calls, counting the plpy calls the timed ones made.
+        The first `warmup` calls are left out, so per-session setup like plan preparation shows up separately."""
+        calls = list(calls)
+        for call in calls[:warmup]:
+            self._invoke(call)
+        plpy = self.session.plpy
+        before = Counter(plpy.calls)
+        latencies = []
+        for call in calls[warmup:]:
+            started = time.perf_counter()
+            self._invoke(call)
+            latencies.append(time.perf_counter() - started)
+        return BenchmarkReport(self.name, latencies, plpy.calls - before)
+
+
+class TriggerRuntime(FunctionRuntime):
+    def __init__(self, session, name, code, trigger=None):
+        super().__init__(session, name, code, [])
+        self.trigger = trigger
+
+    def _td(self, new, old, event, when, level, table_name, args):
+        trigger = self.trigger
+        if trigger is not None:
+            event = event or (trigger._event[0].split()[0] if trigger._event else None)
+            when = when or trigger._execution_time
+            level = level or ("ROW" if trigger._cardinality == "FOR EACH ROW" else "STATEMENT")
+            table_name = table_name or (get_name(trigger._selectable) if trigger._selectable is not None else None)
+            args = args if args is not None else trigger._arguments
+        return {"event": event or "INSERT", "when": when or "BEFORE", "level": level or "ROW",
+                "new": dict(new) if new is not None else None, "old": dict(old) if old is not None else None,
+                "name": trigger._name if trigger is not None else self.name, "table_name": table_name,
+                "table_schema": "public", "relid": None, "args": list(args) if args else None}
+
+    def fire(self, new=None, old=None, event=None, when=None, level=None, table_name=None, args=None):
+        """Run the trigger function for one event, returning (result, TD) so a MODIFY result's changes to
+        TD["new"] can be checked.  Anything not given is taken from the Trigger the runtime was made for."""
+        td = self._td(new, old, event, when, level, table_name, args)
+        self.globals["TD"] = td
+        self.globals["args"] = td["args"]
+        return self.procedure(), td
+
+    def __call__(self, *args, **kwargs):
+        return self.fire(*args, **kwargs)[0]
+
+    def _invoke(self, call):
+        return self.fire(**call)  # Trigger benchmarks take a dict of fire's keyword arguments per call
+
+
+class Session(object):
+    """One backend's worth of PL/Python state: a plpy, the GD dictionary shared by every function, and each
+    function's own SD."""
+
+    def __init__(self, handler=None):
+        self.plpy = Plpy(handler)
+        self.GD = {}
+        self.runtimes = {}
+
+    def function(self, f) -> FunctionRuntime:
+        """Compile a Python function as FunctionGenerator.from_function would generate it, or a Function."""
+        function = f if isinstance(f, Function) else FunctionGenerator.from_function(f, translate=False)
+        if function.language != "plpython3u":
+            raise ValueError("Only plpython3u functions can be run, %s is LANGUAGE %s" % (function.name,
+                                                                                         function.language))
+        if isinstance(f, Function):
+            names = [parameter.split()[0] for parameter in function.parameters]
+        else:
+            names = list(inspect.signature(f).parameters)
+        runtime = FunctionRuntime(self, function.name, function.code, names, function.returns_set)
+        self.runtimes[function.name] = runtime
+        return runtime
+
+    def trigger(self, f, trigger=None) -> TriggerRuntime:
+        """Compile a trigger function, optionally with the Trigger that fires it to fill in TD."""
+        function = f if isinstance(f, Function) else FunctionGenerator.from_function(f, translate=False)
+        runtime = TriggerRuntime(self, function.name, function.code, trigger)
+        self.runtimes[function.name] = runtime
+        return runtime
@@ -0,0 +1,62 @@
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+
+class FanOutResult(object):
+    def __init__(self, url, error=None, elapsed=0.0):
+        self.url = url
+        self.error = error
+        self.elapsed = elapsed
+
+    @property
+    def succeeded(self):
+        return self.error is None
+
+    def __repr__(self):
+        status = "ok" if self.succeeded else "failed: %s" % self.error
+        return "FanOutResult(%s, %s, %.3fs)" % (self.url, status, self.elapsed)
+
+
+def _create_engine(url):
+    from sqlalchemy import create_engine
+    return create_engine(url)
+
+
+def _apply(registry, url, method, engine_factory, kwargs):
+    started = time.perf_counter()
+    try:
+        engine = engine_factory(url)
+        try:
+            getattr(registry, method)(connection=engine, **kwargs)
+        finally:
+            dispose = getattr(engine, "dispose", None)
+            if dispose:
+                dispose()
+    except Exception as e:
+        return FanOutResult(url, e, time.perf_counter() - started)
+    return FanOutResult(url, None, time.perf_counter() - started)
+
+
+def fan_out(registry, urls, concurrency=8, method="create_all", progress=None, engine_factory=None, **kwargs):
+    """Apply one registry to many databases at once, with at most `concurrency` deployments in flight.
+
+    `method` names the PostgresAlchemy method used for each database (create_all, deploy_changes or reconcile),
+    and is called with the remaining keyword arguments.  `engine_factory` turns a URL into an engine, by default
+    with sqlalchemy.create_engine.
+    A failure on one database never stops the others; every outcome is collected and returned by URL, in the order
+    the URLs were given.  `progress` is called with (result, completed, total) as each database finishes.
+    """
+    urls = list(urls)
+    engine_factory = engine_factory or _create_engine
+    results = OrderedDict((url, None) for url in urls)
+    for node in registry.dependency_graph().nodes.values():
+        node.create_statement  # Compile every statement once up front, the workers then share the cached copies
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = [executor.submit(_apply, registry, url, method, engine_factory, kwargs) for url in urls]
+        for completed, future in enumerate(as_completed(futures), 1):
+            result = future.result()
+            results[result.url] = result
+            if progress:
+                progress(result, completed, len(urls))
+    return results
@@ -1,15 +1,35 @@
+import collections.abc
+import hashlib
 import inspect
+import json
 import zlib
 import math
 import re
-from typing import Sequence
+import textwrap
+from typing import Sequence, TypeVar, get_type_hints
 from datetime import date, time, datetime, timedelta
 
-from pgalchemy.types import Creatable
-from .util import convert_python_value_to_sql
+from pgalchemy.types import Creatable, cached_statement
+from .ndarray import ndarray_dtype, sql_type as ndarray_sql_type, wrap as wrap_ndarrays
+from .source import assigned_names, definition_source, function_source, parse_body
+from .util import camelcase_to_underscore, convert_python_value_to_sql
 from .trigger import Trigger
 
-Array = type('Array', Sequence.__bases__, dict(Sequence.__dict__))
+T = TypeVar('T')
+
+
+class Array(Sequence[T]):
+    """Annotation for Postgres arrays, Array[int] maps to int[]."""
+
+
+Hstore = type('Hstore', (dict,), {})
+
+
+def _origin(annotation):
+    # The class behind a subscripted annotation, list for List[int]; Python 3.6 gives typing.List itself instead
+    origin = getattr(annotation, "__origin__", None)
+    return getattr(origin, "__extra__", None) or origin
+
 
 mappings = {
     bool: 'boolean',
@@ -22,55 +42,367 @@ mappings = {
     time: 'time without time zone',
     datetime: 'timestamp without time zone',
     timedelta: 'interval',
+    dict: 'jsonb',
+    list: 'jsonb',
+    Hstore: 'hstore',
     Trigger: 'trigger'
 }
 
+# Types with a plpython3u transform extension (jsonb_plpython3u, hstore_plpython3u) that hands them over as Python
+# objects instead of strings
+transform_types = ('jsonb', 'hstore')
+_transform_type_re = re.compile(r"\b(%s)\b" % "|".join(transform_types))
+
 
 class Function(Creatable):
+    _object_kind = "function"
+    _valid_volatilities = {"VOLATILE", "STABLE", "IMMUTABLE"}
+    _valid_parallel = {"UNSAFE", "RESTRICTED", "SAFE"}
+
     _sql_create_template = """
-        CREATE FUNCTION {name} ({parameters}) RETURNS {return_type} AS $$
+        CREATE {replace}FUNCTION {name} ({parameters}) RETURNS {return_type} AS $$
         {code}
-        $$ LANGUAGE plpython3u {volatile}
+        $$ LANGUAGE {language} {transforms}{attributes}
     """
 
     _sql_drop_template = """
         DROP FUNCTION IF EXISTS {name} ({parameters})
     """
 
-    def __init__(self, name=None, parameters=None, return_type="void", code="", volatile=True):
-        self.name = name if name is not None else "procedure_" + str(abs(zlib.adler32(code)))
+    def __init__(self, name=None, parameters=None, return_type="void", code="", volatile=True, volatility=None,
+                 parallel=None, cost=None, rows=None, strict=False, leakproof=False, security_definer=False,
+                 settings=None, language="plpython3u", transforms=None):
+        self.name = name if name is not None else "procedure_" + str(abs(zlib.adler32(code.encode("utf-8"))))
         self.parameters = parameters if parameters is not None else []
         self.return_type = return_type
         self.code = code
-        self.volatile = volatile
+        self.volatility = volatility or ("VOLATILE" if volatile else "STABLE")
+        self.parallel = parallel
+        self.cost = cost
+        self.rows = rows
+        self.strict = strict
+        self.leakproof = leakproof
+        self.security_definer = security_definer
+        self.settings = dict(settings or {})  # Replace rather than mutate, so cached statements are invalidated
+        self.language = language
+        self.transforms = transforms
 
     @property
-    def _create_statement(self):
-        parameters = ", ".join(self.parameters)
-        volatile = "VOLATILE" if self.volatile else "STABLE"
-        return self._sql_create_template.format(name=self.name, parameters=parameters, return_type=self.return_type,
-                                                code=self.code, volatile=volatile)
+    def volatile(self):
+        return self.volatility == "VOLATILE"
+
+    @volatile.setter
+    def volatile(self, volatile):
+        self.volatility = "VOLATILE" if volatile else "STABLE"
 
     @property
+    def returns_set(self):
+        return self.return_type.upper().startswith(("SETOF ", "TABLE"))
+
+    def _attributes(self):
+        volatility = self.volatility.upper()
+        if volatility not in self._valid_volatilities:
+            raise ValueError("Invalid volatility, use one of: %s" % " | ".join(self._valid_volatilities))
+        attributes = [volatility]
+        if self.parallel:
+            parallel = self.parallel.upper()
+            if parallel not in self._valid_parallel:
+                raise ValueError("Invalid parallel safety, use one of: %s" % " | ".join(self._valid_parallel))
+            attributes.append("PARALLEL " + parallel)
+        if self.strict:
+            attributes.append("STRICT")
+        if self.leakproof:
+            attributes.append("LEAKPROOF")
+        if self.security_definer:
+            attributes.append("SECURITY DEFINER")
+        if self.cost is not None:
+            attributes.append("COST %s" % self.cost)
+        if self.rows is not None:
+            if not self.returns_set:
+                raise ValueError("ROWS can only be estimated for functions that return a set")
+            attributes.append("ROWS %s" % self.rows)
+        for setting, value in sorted(self.settings.items()):
+            attributes.append("SET %s %s" % (setting, self._setting_value(value)))
+        return " ".join(attributes)
+
+    def _transform_types(self):
+        """The types to apply transforms for, by default every transformable type among the parameters and result.
+
+        Pass transforms explicitly for trigger functions, whose rows don't show in their signature, or [] when the
+        transform extensions aren't installed.
+        """
+        if self.language != "plpython3u":
+            return []
+        if self.transforms is not None:
+            return list(self.transforms)
+        types = [parameter.split(" DEFAULT ")[0].split(None, 1)[-1] for parameter in self.parameters]
+        found = _transform_type_re.findall(" ".join(types + [self.return_type]))
+        return [t for t in transform_types if t in found]
+
+    def _transforms(self):
+        types = self._transform_types()
+        return "TRANSFORM %s " % ", ".join("FOR TYPE %s" % t for t in types) if types else ""
+
+    @staticmethod
+    def _setting_value(value):
+        if value is None:
+            return "FROM CURRENT"
+        elif isinstance(value, (list, tuple)):  # e.g. search_path
+            return "= " + ", ".join(convert_python_value_to_sql(v) for v in value)
+        return "= " + convert_python_value_to_sql(value)
+
+    def _function_statement(self, replace):
+        parameters = ", ".join(self.parameters)
+        return self._sql_create_template.format(replace="OR REPLACE " if replace else "", name=self.name,
+                                                parameters=parameters, return_type=self.return_type, code=self.code,
+                                                language=self.language, transforms=self._transforms(),
+                                                attributes=self._attributes())
+
+    @cached_statement
+    def _create_statement(self):
+        return self._function_statement(replace=False)
+
+    @cached_statement
+    def _replace_statement(self):
+        return self._function_statement(replace=True)
+
+    def _replace_statements(self, server_version=None):
+        # Only valid while the return type is unchanged, changing it needs a drop and create
+        return [self._replace_statement]
+
+    @cached_statement
     def _drop_statement(self):
         parameters = ", ".join(self.parameters)
         return self._sql_drop_template.format(name=self.name, parameters=parameters)
 
 
-class FunctionGenerator(object):
-    _re_flags = re.DOTALL | re.MULTILINE
-    _function_body_re = re.compile(r"\s*def\s+[^(]+\(.*?\)\s*(?:->\s*[^\n]+)?\s*:(?:\s*#[^\n]*)?\n(.*)",
-                                   flags=_re_flags)
+_function_options = {"volatile", "volatility", "parallel", "cost", "rows", "strict", "leakproof", "security_definer",
+                     "settings", "infer", "cache_plans", "translate", "batched", "transforms",
+                     "hoist", "zero_copy"}
+
+_aggregate_setup_template = """\
+if {key!r} not in GD:
+{source}
+    GD[{key!r}] = {class_name}
+_aggregate = GD[{key!r}]
+"""
+
+_aggregate_transition_template = """\
+_state = None if {state} is None else _aggregate.deserialize({state})
+return _aggregate.serialize(_aggregate.step(_state, {arguments}))
+"""
+
+_aggregate_combine_template = """\
+if {a} is None or {b} is None:
+    return {b} if {a} is None else {a}
+return _aggregate.serialize(_aggregate.combine(_aggregate.deserialize({a}), _aggregate.deserialize({b})))
+"""
+
+_aggregate_final_template = """\
+return _aggregate.final(None if {state} is None else _aggregate.deserialize({state}))
+"""
+
+_batched_template = """\
+def _batch_row({parameters}):
+{body}
+for _batch_array in [{arrays}]:
+    if len(_batch_array) != len({first}):
+        plpy.error("{name} needs arrays of the same length")
+return {open}{call} for _batch_args in zip({arrays}){close}
+"""
+
+
+def function_options(**options):
+    """Record planner attributes for FunctionGenerator.from_function to give the generated Function.
+
+        @function_options(volatility="IMMUTABLE", parallel="SAFE", cost=10, settings={"search_path": ["pg_temp"]})
+        def slugify(title: str) -> str:
+            ...
 
+    With infer=True the volatility and parallel safety that aren't declared are inferred from the function body.
+    With cache_plans=True plpy.execute calls on fixed queries are rewritten to reuse plans prepared once per session.
+    With translate=True a body that is a pure expression becomes a LANGUAGE sql function that Postgres can inline,
+    see pgalchemy.translate for the supported subset.  Anything else is left in plpython.
+    With batched=True PostgresAlchemy.procedure also registers the FunctionGenerator.batched_from_function companion.
+    With hoist=True imports, module level values and leading setup run once per session, see pgalchemy.hoist.
+    With zero_copy=True NumPy array parameters and results are passed as raw bytea buffers, see pgalchemy.ndarray.
+    """
+    invalid = set(options) - _function_options
+    if invalid:
+        raise TypeError("Unknown function options: %s" % ", ".join(sorted(invalid)))
+
+    def decorate(f):
+        f._function_options = dict(getattr(f, "_function_options", {}), **options)
+        return f
+
+    return decorate
+
+
+class FunctionGenerator(object):
     @classmethod
-    def from_function(cls, f):
-        parameters = cls.get_parameters(f)
+    def from_function(cls, f, **options):
+        options = dict(getattr(f, "_function_options", {}), **options)
+        infer = options.pop("infer", False)
+        cache_plans = options.pop("cache_plans", False)
+        translate = options.pop("translate", False)
+        options.pop("batched", None)
+        hoist = options.pop("hoist", False)
+        zero_copy = options.pop("zero_copy", False)
+        signature = inspect.signature(f)
+        parameters = signature.parameters.values()
         sql_parameters = [cls.generate_sql_function_parameter(p) for p in parameters]
-        sql_return = cls.generate_return_type(f)
+        sql_return = cls.generate_return_type(f, signature)
+        array_parameters = [(p.name, ndarray_dtype(p.annotation)) for p in parameters]
+        result_dtype = ndarray_dtype(signature.return_annotation)
+        uses_ndarrays = result_dtype is not None or any(dtype for _, dtype in array_parameters)
+        if zero_copy and uses_ndarrays:
+            sql_parameters = ["%s bytea" % name if dtype else sql_parameter
+                              for (name, dtype), sql_parameter in zip(array_parameters, sql_parameters)]
+            sql_return = "bytea" if result_dtype else sql_return
         # Code related
-        function_body = cls.get_function_body(f)
-        cls.check_for_overwritten_input_parameters(parameters, function_body)
-        return Function(name=f.__name__, parameters=sql_parameters, return_type=sql_return, code=function_body)
+        source = function_source(f)
+        function_body = source.body
+        cls._check_assigned_names(parameters, source.assigned)
+        function = Function(name=f.__name__, parameters=sql_parameters, return_type=sql_return, code=function_body,
+                            **options)
+        if infer or {"volatile", "volatility", "parallel"} & set(options):
+            cls.apply_analysis(function, options, infer)
+        parameter_types = None
+        if translate or cache_plans:
+            parameter_types = dict((p.name, cls.convert_python_type_to_sql(p.annotation)) for p in parameters
+                                   if p.annotation is not inspect.Parameter.empty)
+        if translate and not uses_ndarrays and not function.returns_set and sql_return not in ("void", "trigger"):
+            from .translate import translate
+            sql_body = translate(function_body, parameter_types, sql_return)
+            if sql_body is not None:
+                function.code, function.language = sql_body, "sql"
+                return function
+        if hoist:
+            from .hoist import hoist
+            function.code = hoist(f, function.code, [p.name for p in parameters])
+        if cache_plans:
+            from .plans import cache_plans
+            function.code = cache_plans(function.code, parameter_types)
+        if uses_ndarrays:
+            function.code = wrap_ndarrays(function.code, array_parameters, result_dtype, zero_copy)
+        return function
+
+    @classmethod
+    def batched_from_function(cls, f, **options) -> Function:
+        """A companion to from_function(f) named <name>_batch, taking an array per parameter and running the body once
+        per element, so that a whole column goes through one call:
+
+            SELECT unnest(slugify_batch(array_agg(title))) FROM post
+
+        Scalar results come back as an array in input order, array results as one row each.  NULL elements are
+        passed to the body as None, unless the function is strict, in which case their result is NULL as it would
+        be for the scalar function.  A NULL array makes the result NULL.
+        """
+        function = cls.from_function(f, **dict(options, translate=False))
+        if function.returns_set or function.return_type in ("void", "trigger"):
+            raise ValueError("Only functions returning a single value can be batched: %s" % function.name)
+        parameters = list(inspect.signature(f).parameters.values())
+        if not parameters:
+            raise ValueError("Function %s has no parameters to batch" % function.name)
+        sql_parameters = []
+        for parameter in parameters:
+            sql_type = cls.convert_python_type_to_sql(parameter.annotation)
+            if sql_type.endswith("[]"):
+                # Postgres has no arrays of arrays, only multidimensional ones that must be rectangular
+                raise ValueError("Array parameter %s of %s can't be batched" % (parameter.name, function.name))
+            sql_parameters.append("%s %s[]" % (parameter.name, sql_type))
+        returns_array = function.return_type.endswith("[]")
+        names = [parameter.name for parameter in parameters]
+        call = "_batch_row(*_batch_args)"
+        if function.strict:
+            call = "None if None in _batch_args else " + call
+        code = _batched_template.format(parameters=", ".join(names), arrays=", ".join(names), first=names[0],
+                                        body=textwrap.indent(textwrap.dedent(function.code), "    "),
+                                        name=function.name + "_batch", call=call,
+                                        open="(" if returns_array else "[", close=")" if returns_array else "]")
+        return_type = ("SETOF %s" if returns_array else "%s[]") % function.return_type
+        return Function(name=function.name + "_batch", parameters=sql_parameters, return_type=return_type,
+                        code=textwrap.indent(code, "    "), volatility=function.volatility, parallel=function.parallel,
+                        strict=True, leakproof=function.leakproof, security_definer=function.security_definer,
+                        settings=function.settings)
+
+    @classmethod
+    def aggregate_from_class(cls, aggregate_class, name=None, parallel="SAFE"):
+        """An Aggregate, with its support Functions, from a class of static (or class) methods:
+
+            class Mean:
+                @staticmethod
+                def step(state, value: float):  # Returns the new state, state is None on the first row
+                @staticmethod
+                def combine(a, b):  # Merges two partial states, optional but needed for parallel aggregation
+                @staticmethod
+                def final(state) -> float:  # Optional, without it the aggregate returns the serialized state
+                @staticmethod
+                def serialize(state) -> bytes:
+                @staticmethod
+                def deserialize(data: bytes):
+
+        plpython can't handle the internal type, so the state is kept as the bytea serialize returns and every support
+        function deserializes and reserializes it.  The class is defined once per session and kept in GD, it has to be
+        self-contained: anything it imports, it imports inside its methods.
+        """
+        methods = {}
+        for method in ("step", "combine", "final", "serialize", "deserialize"):
+            attribute = inspect.getattr_static(aggregate_class, method, None)
+            if attribute is None:
+                continue
+            if not isinstance(attribute, (staticmethod, classmethod)):
+                raise ValueError("Aggregate method %s.%s needs to be a staticmethod or classmethod" %
+                                 (aggregate_class.__name__, method))
+            methods[method] = inspect.signature(getattr(aggregate_class, method))
+        missing = {"step", "serialize", "deserialize"} - set(methods)
+        if missing:
+            raise ValueError("Aggregate %s is missing: %s" % (aggregate_class.__name__, ", ".join(sorted(missing))))
+        name = name or camelcase_to_underscore(aggregate_class.__name__)
+        state, *step_parameters = methods["step"].parameters.values()
+        arguments = [cls.generate_sql_function_parameter(p).split(" DEFAULT ")[0] for p in step_parameters]
+        source = definition_source(aggregate_class)
+        # GD outlives CREATE OR REPLACE, keying on the source makes a redeployed class replace the cached one
+        key = "aggregate_%s_%s" % (name, hashlib.sha1(source.encode("utf-8")).hexdigest()[:12])
+        source = textwrap.indent(source, "    ")
+        setup = _aggregate_setup_template.format(key=key, class_name=aggregate_class.__name__, source=source)
+
+        # STABLE rather than IMMUTABLE, the support functions read and write GD.  They stay parallel safe: GD belongs
+        # to the backend, so each parallel worker defines and caches its own copy of the class.
+        def support(suffix, parameters, return_type, code):
+            return Function(name="%s_%s" % (name, suffix), parameters=parameters, return_type=return_type,
+                            code=textwrap.indent(setup + code, "    "), volatility="STABLE", parallel=parallel)
+
+        transition = support("transition", ["%s bytea" % state.name] + arguments, "bytea",
+                             _aggregate_transition_template.format(state=state.name, arguments=", ".join(
+                                 p.name for p in step_parameters)))
+        functions = [transition]
+        combine = final = None
+        if "combine" in methods:
+            a, b = list(methods["combine"].parameters)
+            combine = support("combine", ["%s bytea" % a, "%s bytea" % b], "bytea",
+                              _aggregate_combine_template.format(a=a, b=b))
+            functions.append(combine)
+        if "final" in methods:
+            final_state = list(methods["final"].parameters)[0]
+            final = support("final", ["%s bytea" % final_state], cls.generate_return_type(None, methods["final"]),
+                            _aggregate_final_template.format(state=final_state))
+            functions.append(final)
+        from .aggregate import Aggregate
+        return Aggregate(name, [argument.split(" ", 1)[1] for argument in arguments], "bytea", transition.name,
+                         final=final.name if final else None, combine=combine.name if combine else None,
+                         parallel=parallel if combine else None, functions=functions)
+
+    @staticmethod
+    def apply_analysis(function, declared, infer):
+        from .analysis import analyze, check_declared_attributes
+        analysis = analyze(function.code)
+        if infer:
+            if "volatile" not in declared and "volatility" not in declared:
+                function.volatility = analysis.volatility
+            if "parallel" not in declared:
+                function.parallel = analysis.parallel
+        check_declared_attributes(function, analysis)
 
     @staticmethod
     def get_parameters(f) -> Sequence[inspect.Parameter]:
@@ -78,20 +410,22 @@ class FunctionGenerator(object):
         parameters = signature.parameters.values()
         return parameters
 
-    @classmethod
-    def get_function_body(cls, f):
-        source = inspect.getsource(f)
-        match = cls._function_body_re.match(source)
-        return match.group(1)
+    @staticmethod
+    def get_function_body(f):
+        return function_source(f).body
 
     @classmethod
     def check_for_overwritten_input_parameters(cls, parameters, code):
-        parameter_names = "|".join(p.name for p in parameters)
-        parameter_overwritten_re = re.compile(r"(%s)\s*=[^=]" % parameter_names, cls._re_flags)
-        match = parameter_overwritten_re.search(code)
-        if match:
-            message = "Function parameter '%s' incorrectly overwritten in function body"
-            raise ValueError(message % match.group(1))
+        cls._check_assigned_names(parameters, assigned_names(parse_body(code)))
+
+    @staticmethod
+    def _check_assigned_names(parameters, assigned):
+        # PL/Python passes arguments in as globals, so assigning to one makes it local and unbound on first use
+        assigned = set(assigned)
+        for parameter in parameters:
+            if parameter.name in assigned:
+                message = "Function parameter '%s' incorrectly overwritten in function body"
+                raise ValueError(message % parameter.name)
 
     @classmethod
     def convert_python_type_to_sql(cls, python_type):
@@ -100,7 +434,13 @@ class FunctionGenerator(object):
             type_name = python_type.__table__.name
         elif isinstance(python_type, str):
             type_name = python_type
-        elif is_class and issubclass(python_type, Array):
+        elif ndarray_dtype(python_type) is not None:
+            type_name = ndarray_sql_type(ndarray_dtype(python_type))
+        elif is_class and python_type in mappings:
+            type_name = mappings[python_type]
+        elif _origin(python_type) in (dict, list):
+            type_name = mappings[_origin(python_type)]  # Dict[str, int] and the like
+        elif getattr(python_type, "__origin__", None) is Array:
             type_name = cls.convert_python_type_to_sql(python_type.__args__[0]) + "[]"
         else:
             type_name = mappings.get(python_type)
@@ -111,8 +451,11 @@ class FunctionGenerator(object):
     @classmethod
     def generate_sql_default_value(cls, type_name, default=float('nan')):
         # Using NaN here instead of None since None is a default value you might actually use
-        if not (isinstance(default, float) and math.isnan(default)):
-            default_parameters = type_name, cls.convert_python_value_to_sql(default)
+        if default is not inspect.Parameter.empty and not (isinstance(default, float) and math.isnan(default)):
+            if type_name == "jsonb" and default is not None:
+                default_parameters = type_name, "'%s'" % json.dumps(default).replace("'", "''")
+            else:
+                default_parameters = type_name, cls.convert_python_value_to_sql(default)
             return " DEFAULT ".join(default_parameters)
         else:
             return type_name
@@ -129,16 +472,58 @@ class FunctionGenerator(object):
         sql_parameter = " ".join((parameter.name, type_and_default))
         return sql_parameter
 
+    @staticmethod
+    def get_set_element_type(annotation):
+        """T for Sequence[T], Iterable[T], Iterator[T] or Generator[T, ...], otherwise None.
+
+        List[T] and Dict[K, V] are single jsonb values, the same as they are as parameters.
+        """
+        origin = _origin(annotation)
+        if not (inspect.isclass(origin) and getattr(annotation, "__args__", None)):
+            return None
+        if annotation.__origin__ is Array or origin in (dict, list) or issubclass(origin, collections.abc.Mapping) or \
+                ndarray_dtype(annotation):
+            return None  # Arrays are a single value
+        if issubclass(origin, collections.abc.Iterable):
+            return annotation.__args__[0]
+        return None
+
+    @staticmethod
+    def get_row_fields(row_type):
+        """(name, type) for each field of a NamedTuple or dataclass, otherwise None."""
+        if hasattr(row_type, "_fields"):
+            names = row_type._fields
+        elif hasattr(row_type, "__dataclass_fields__"):
+            names = list(row_type.__dataclass_fields__)
+        else:
+            return None
+        hints = get_type_hints(row_type)
+        return [(name, hints.get(name)) for name in names]
+
     @classmethod
-    def generate_return_type(cls, f):
-        signature = inspect.signature(f)
+    def generate_table_columns(cls, row_type):
+        fields = cls.get_row_fields(row_type)
+        if fields is None:
+            return None
+        if not all(annotation is not None for _, annotation in fields):
+            raise ValueError("Every field of %s needs a type annotation" % row_type.__name__)
+        return ", ".join("%s %s" % (name, cls.convert_python_type_to_sql(t)) for name, t in fields)
+
+    @classmethod
+    def generate_return_type(cls, f, signature=None):
+        signature = signature or inspect.signature(f)
         annotation = signature.return_annotation
+        element_type = cls.get_set_element_type(annotation)
 
         if annotation == inspect.Signature.empty:
             return_type = "void"
-        elif issubclass(annotation, Sequence):
-            python_type = annotation.__args__[0]
-            return_type = "SETOF " + cls.convert_python_type_to_sql(python_type)
+        elif element_type is not None:
+            # Rows are handed over one at a time, so a generator body streams its result instead of building a list
+            columns = cls.generate_table_columns(element_type)
+            if columns is not None:
+                return_type = "TABLE (%s)" % columns
+            else:
+                return_type = "SETOF " + cls.convert_python_type_to_sql(element_type)
         else:
             return_type = cls.convert_python_type_to_sql(annotation)
 
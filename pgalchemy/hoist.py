@@ -0,0 +1,238 @@
+"""Hoisting of setup out of generated plpython bodies, so that it runs once per session instead of once per call.
+
+Two kinds of setup are hoisted into an initializer whose results are kept in the function's SD:
+
+* Module level names the body uses: modules are imported, compiled regular expressions recompiled, literal values
+  copied, and plain functions defined in the same module have their source (and, in turn, what they use) included.
+  Functions decorated with session_state are evaluated once and their result reused.
+* The leading statements of the body, as long as they are imports, or assignments that depend on nothing but
+  constants and earlier setup, and the names they bind are never rebound or modified in place afterwards.  The only
+  calls such an assignment may make are to re.compile, a few builtins and session_state functions, anything else
+  (datetime.now(), random.random(), ...) could give a different value on every call.
+
+Anything else is left where it is.
+"""
+import ast
+import builtins
+import functools
+import inspect
+import re
+import textwrap
+import types
+
+from .analysis import _dotted_name
+from .source import definition_source, parse_body
+from .util import literal_string
+
+_plpython_globals = {"plpy", "SD", "GD", "TD", "args"}
+_mutating_methods = {"append", "extend", "insert", "pop", "remove", "clear", "update", "setdefault", "add",
+                     "discard", "sort", "reverse", "popitem", "__setitem__", "__delitem__"}
+_literal_types = (bool, int, float, complex, str, bytes, tuple, list, dict, set, type(None))
+_pattern_type = type(re.compile(""))
+_pure_calls = {("re", "compile"), ("frozenset",), ("tuple",), ("list",), ("dict",), ("set",), ("int",), ("float",),
+               ("str",), ("bool",), ("len",), ("range",)}
+_hoisted_key = "hoisted"
+
+
+def session_state(f):
+    """Mark a module level function without parameters as per-session state.  Called from a hoisted function body,
+    it runs once per session on the server; called from Python, once per process.
+
+        @session_state
+        def stopwords():
+            return frozenset(row["word"] for row in plpy.execute("SELECT word FROM stopword"))
+    """
+    value = []
+
+    @functools.wraps(f)
+    def state():
+        if not value:
+            value.append(f())
+        return value[0]
+
+    state._session_state = True
+    return state
+
+
+def _bound_by_import(node):
+    return [(alias.asname or alias.name).split(".")[0] for alias in node.names]
+
+
+def _free_names(nodes, bound=()):
+    """Names read by nodes that nothing in them binds, other than builtins and the ones plpython provides."""
+    loaded, stored = [], set(bound)
+    for node in nodes:
+        for child in ast.walk(node):
+            if isinstance(child, ast.Name):
+                if isinstance(child.ctx, ast.Load):
+                    loaded.append(child.id)
+                else:
+                    stored.add(child.id)
+            elif isinstance(child, ast.arg):
+                stored.add(child.arg)
+            elif isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                stored.add(child.name)
+            elif isinstance(child, (ast.Import, ast.ImportFrom)):
+                stored.update(_bound_by_import(child))
+            elif isinstance(child, ast.ExceptHandler) and child.name:
+                stored.add(child.name)
+    free = []
+    for name in loaded:
+        if name not in stored and name not in _plpython_globals and not hasattr(builtins, name) and name not in free:
+            free.append(name)
+    return free
+
+
+def _modified_names(nodes):
+    """Names that are rebound, deleted or changed in place anywhere in nodes."""
+    modified = set()
+    for node in nodes:
+        for child in ast.walk(node):
+            if isinstance(child, ast.Name) and not isinstance(child.ctx, ast.Load):
+                modified.add(child.id)
+            elif isinstance(child, (ast.Subscript, ast.Attribute)) and not isinstance(child.ctx, ast.Load):
+                if isinstance(child.value, ast.Name):
+                    modified.add(child.value.id)
+            elif isinstance(child, ast.Call) and isinstance(child.func, ast.Attribute):
+                if child.func.attr in _mutating_methods and isinstance(child.func.value, ast.Name):
+                    modified.add(child.func.value.id)
+            elif isinstance(child, (ast.Global, ast.Nonlocal)):
+                modified.update(child.names)
+            elif isinstance(child, (ast.Import, ast.ImportFrom)):
+                modified.update(_bound_by_import(child))
+            elif isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                modified.add(child.name)
+    return modified
+
+
+def _is_literal(value):
+    if not isinstance(value, _literal_types):
+        return False
+    try:
+        return ast.literal_eval(repr(value)) == value
+    except (ValueError, SyntaxError):
+        return False
+
+
+class _Hoister(object):
+    def __init__(self, module):
+        self.module = module
+        self.lines = []
+        self.names = []
+        self.seen = set()
+        self.session_state = set()
+
+    def globals(self, names, namespace):
+        for name in names:
+            if name in self.seen or name not in namespace:
+                continue
+            self.seen.add(name)
+            if self._global(name, namespace[name]):
+                self.names.append(name)
+
+    def _global(self, name, value):
+        if isinstance(value, types.ModuleType):
+            module = value.__name__
+            self.lines.append("import %s\n" % module if module == name else "import %s as %s\n" % (module, name))
+        elif isinstance(value, _pattern_type):
+            self.lines.append("%s = __import__('re').compile(%r, %d)\n" % (name, value.pattern, value.flags))
+        elif getattr(value, "_session_state", False):
+            original = inspect.unwrap(value)
+            if not self._function(original):
+                return False
+            self.lines.append("%s = (lambda value: lambda: value)(%s())\n" % (name, original.__name__))
+            self.session_state.add(name)
+        elif isinstance(value, types.FunctionType) and value.__module__ == self.module:
+            if not self._function(value):
+                return False
+            if name != value.__name__:
+                self.lines.append("%s = %s\n" % (name, value.__name__))
+        elif _is_literal(value):
+            self.lines.append("%s = %r\n" % (name, value))
+        else:
+            return False
+        return True
+
+    def _function(self, f):
+        try:
+            source = definition_source(f)
+            node = ast.parse(source).body[0]
+        except (OSError, TypeError, SyntaxError):
+            return False
+        if not isinstance(node, ast.FunctionDef) or node.name != f.__name__:
+            return False  # A lambda, or something else the source can't be recovered for
+        self.globals(_free_names([node], [node.name]), f.__globals__)
+        self.lines.append(source)
+        return True
+
+
+def _only_pure_calls(node, session_state):
+    for child in ast.walk(node):
+        if isinstance(child, ast.Call):
+            name = _dotted_name(child.func)
+            if name not in _pure_calls and not (len(name) == 1 and name[0] in session_state):
+                return False
+    return True
+
+
+def _last_line(statement):
+    # Python before 3.8 has no end_lineno, the last line any part of the statement starts on tells whether the next
+    # statement shares its line
+    return getattr(statement, "end_lineno", None) or max(getattr(n, "lineno", 0) for n in ast.walk(statement))
+
+
+def _leading_setup(statements, bound, session_state=()):
+    """The leading statements (after any docstring) that can run once per session, as (first line, last line) ranges
+    with None for the end of the body, and the names they bind."""
+    setup, names = [], []
+    body = list(statements)
+    if body and isinstance(body[0], ast.Expr) and literal_string(body[0].value) is not None:
+        body = body[1:]
+    bound = set(bound)
+    for i, statement in enumerate(body):
+        if isinstance(statement, (ast.Import, ast.ImportFrom)):
+            statement_names = _bound_by_import(statement)
+        elif isinstance(statement, ast.Assign) and all(isinstance(t, ast.Name) for t in statement.targets):
+            used = {n.id for n in ast.walk(statement.value) if isinstance(n, ast.Name)}
+            if used & _plpython_globals or not set(_free_names([statement.value])) <= bound:
+                break
+            if not _only_pure_calls(statement.value, session_state):
+                break
+            statement_names = [t.id for t in statement.targets]
+        else:
+            break
+        if set(statement_names) & _modified_names(body[i + 1:]):
+            break
+        following = body[i + 1] if i + 1 < len(body) else None
+        if following is not None and following.lineno <= _last_line(statement):
+            break  # Shares a line with the next statement, "import re; x = re.sub(...)"
+        last = getattr(statement, "end_lineno", None) or (following.lineno - 1 if following is not None else None)
+        setup.append((statement.lineno, last))
+        names.extend(name for name in statement_names if name not in names)
+        bound.update(statement_names)
+    return setup, names
+
+
+def hoist(f, code, parameters):
+    """Rewrite the plpython body code generated from f to run its setup once per session, see the module docstring.
+    parameters are the names of f's parameters, which plpython passes in as globals."""
+    statements = parse_body(code)
+    hoister = _Hoister(f.__module__)
+    hoister.globals(_free_names(statements, parameters), f.__globals__)
+    setup, setup_names = _leading_setup(statements, hoister.names, hoister.session_state)
+    names = hoister.names + [name for name in setup_names if name not in hoister.names]
+    if not names:
+        return code
+    lines = textwrap.dedent(code).splitlines(True)
+    hoisted_lines = set()
+    setup_source = list(hoister.lines)
+    for first, last in setup:
+        # Line 1 of the parsed source is the def that parse_body wraps the body in
+        last = len(lines) + 1 if last is None else last
+        setup_source.extend(lines[first - 2:last - 1])
+        hoisted_lines.update(range(first - 2, last - 1))
+    remainder = "".join(line for i, line in enumerate(lines) if i not in hoisted_lines)
+    restored = ", ".join(names) + ("," if len(names) == 1 else "")
+    initializer = "if %r in SD:\n    %s = SD[%r]\nelse:\n%s    SD[%r] = %s\n" % (
+        _hoisted_key, restored, _hoisted_key, textwrap.indent("".join(setup_source), "    "), _hoisted_key, restored)
+    return textwrap.indent(initializer + remainder, "    ")
@@ -0,0 +1,156 @@
+import time
+import weakref
+from collections import OrderedDict
+
+from .util import split_statement
+
+# Connection or engine -> callables that receive a StatementEvent for every statement executed through it
+_listeners = weakref.WeakKeyDictionary()
+
+
+class StatementEvent(object):
+    def __init__(self, kind, name, sql, elapsed, rowcount=None, lock_wait=None, error=None):
+        self.kind = kind
+        self.name = name
+        self.sql = sql
+        self.elapsed = elapsed
+        self.rowcount = rowcount
+        self.lock_wait = lock_wait  # Seconds spent waiting on locks, when the executor observed it
+        self.error = error
+
+    def __repr__(self):
+        return "StatementEvent(%s %s, %.3fs)" % (self.kind, self.name, self.elapsed)
+
+
+def listen(listener, connection):
+    """Call listener with an event for every statement pgalchemy executes through connection, or through any
+    connection checked out from it when it is an engine."""
+    _listeners.setdefault(connection, []).append(listener)
+    return listener
+
+
+def remove_listener(listener, connection):
+    listeners = _listeners.get(connection, [])
+    if listener in listeners:
+        listeners.remove(listener)
+    if not listeners:
+        _listeners.pop(connection, None)
+
+
+def listening(connection):
+    """The listeners attached to connection, or to the engine it came from."""
+    listeners = []
+    for target in (connection, getattr(connection, "engine", None)):
+        if target is None:
+            continue
+        try:
+            listeners.extend(_listeners.get(target, ()))
+        except TypeError:
+            pass  # Can't be weakly referenced, so nothing can be listening to it
+    return listeners
+
+
+def notify(listeners, event):
+    for listener in listeners:
+        listener(event)
+
+
+def object_name(obj):
+    obj = getattr(obj, "_privilege", obj)  # grant and revoke accept the clause a fluent chain ends on
+    if getattr(obj, "_object_kind", None) == "privilege":
+        return obj._format_target()  # Privileges have no name of their own
+    if hasattr(obj, "__table__"):
+        obj = obj.__table__
+    return getattr(obj, "_name", None) or getattr(obj, "name", None) or type(obj).__name__
+
+
+def _rowcount(result):
+    rowcount = getattr(result, "rowcount", None)
+    return rowcount if isinstance(rowcount, int) and rowcount >= 0 else None
+
+
+def _event(kind, obj, statement, started, result=None, error=None, lock_wait=None):
+    sql, _ = split_statement(statement)
+    return StatementEvent(kind, object_name(obj), sql, time.perf_counter() - started, _rowcount(result), lock_wait,
+                          error)
+
+
+def instrumented(connection, kind, obj, statement, execute, *args, lock_wait=None):
+    """Call execute(*args) to run the statement for obj on connection, telling every listener on it how it went.
+
+    Nothing is timed or named unless a listener is attached.  Executors that waited on locks before running the
+    statement pass the time waited as lock_wait.
+    """
+    listeners = listening(connection)
+    if not listeners:
+        return execute(*args)
+    started = time.perf_counter()
+    try:
+        result = execute(*args)
+    except Exception as e:
+        notify(listeners, _event(kind, obj, statement, started, error=e, lock_wait=lock_wait))
+        raise
+    notify(listeners, _event(kind, obj, statement, started, result, lock_wait=lock_wait))
+    return result
+
+
+async def instrumented_async(connection, kind, obj, statement, execute, *args):
+    listeners = listening(connection)
+    if not listeners:
+        return await execute(*args)
+    started = time.perf_counter()
+    try:
+        result = await execute(*args)
+    except Exception as e:
+        notify(listeners, _event(kind, obj, statement, started, error=e))
+        raise
+    notify(listeners, _event(kind, obj, statement, started, result))
+    return result
+
+
+class TimingCollector(object):
+    """Listener that keeps every event, for a report of the slowest statements and the time spent per object kind.
+
+        with TimingCollector(engine) as timings:
+            registry.create_all(engine)
+        print(timings.report())
+    """
+
+    def __init__(self, connection=None):
+        self.connection = connection
+        self.events = []
+
+    def __call__(self, event):
+        self.events.append(event)
+
+    def __enter__(self):
+        return listen(self, self.connection)
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        remove_listener(self, self.connection)
+        return False
+
+    def slowest(self, count=10):
+        return sorted(self.events, key=lambda e: e.elapsed, reverse=True)[:count]
+
+    def by_kind(self):
+        """Statement count and total seconds per object kind, the most expensive kind first."""
+        totals = OrderedDict()
+        for event in self.events:
+            statements, elapsed = totals.get(event.kind, (0, 0.0))
+            totals[event.kind] = statements + 1, elapsed + event.elapsed
+        return OrderedDict(sorted(totals.items(), key=lambda item: item[1][1], reverse=True))
+
+    def report(self, count=10):
+        lines = ["%-12s %8s %10s" % ("kind", "count", "seconds")]
+        for kind, (statements, elapsed) in self.by_kind().items():
+            lines.append("%-12s %8d %10.3f" % (kind, statements, elapsed))
+        lines.append("")
+        lines.append("slowest statements:")
+        for event in self.slowest(count):
+            lock_wait = " (lock wait %.3fs)" % event.lock_wait if event.lock_wait else ""
+            failed = " FAILED" if event.error is not None else ""
+            sql = " ".join(event.sql.split())
+            lines.append("%10.3fs %s %s%s%s: %s" % (event.elapsed, event.kind, event.name, lock_wait, failed,
+                                                    sql[:120]))
+        return "\n".join(lines)
@@ -0,0 +1,393 @@
+import re
+
+from .deploy import DependencyGraph, batch_statements, execute, transaction
+from .privilege import CommandOption, Privilege
+from .util import get_condition_text, get_name, get_table_name, server_version, split_statement
+
+_roles_query = """
+    SELECT rolname, rolsuper, rolcreatedb, rolcreaterole, rolinherit, rolcanlogin, rolreplication, rolconnlimit
+    FROM pg_roles
+"""
+
+_functions_query = """
+    SELECT p.proname, pg_get_function_identity_arguments(p.oid), pg_get_function_result(p.oid), p.prosrc,
+           p.provolatile, p.proparallel, p.procost, p.prorows, p.proisstrict, p.proleakproof, p.prosecdef, p.proconfig,
+           oidvectortypes(p.proargtypes)
+    FROM pg_proc p JOIN pg_namespace n ON n.oid = p.pronamespace
+    WHERE pg_function_is_visible(p.oid) AND n.nspname NOT IN ('pg_catalog', 'information_schema')
+"""
+
+_function_attributes = ("volatility", "parallel", "cost", "rows", "strict", "leakproof", "security_definer")
+
+_triggers_query = """
+    SELECT n.nspname, c.relname, pg_table_is_visible(c.oid), t.tgname, t.tgtype, p.proname, t.tgargs
+    FROM pg_trigger t JOIN pg_class c ON c.oid = t.tgrelid JOIN pg_namespace n ON n.oid = c.relnamespace
+         JOIN pg_proc p ON p.oid = t.tgfoid
+    WHERE NOT t.tgisinternal AND n.nspname NOT IN ('pg_catalog', 'information_schema')
+"""
+
+_policies_query = """
+    SELECT n.nspname, c.relname, pg_table_is_visible(c.oid), p.policyname, p.cmd, p.roles::text[], p.qual,
+           p.with_check
+    FROM pg_policies p JOIN pg_namespace n ON n.nspname = p.schemaname
+         JOIN pg_class c ON c.relnamespace = n.oid AND c.relname = p.tablename
+"""
+
+_domains_query = """
+    SELECT t.typname, format_type(t.typbasetype, t.typtypmod), c.conname, pg_get_constraintdef(c.oid)
+    FROM pg_type t LEFT JOIN pg_constraint c ON c.contypid = t.oid
+    WHERE t.typtype = 'd' AND pg_type_is_visible(t.oid)
+"""
+
+_acls_query = """
+    SELECT target_type, target, coalesce(r.rolname, 'PUBLIC'), a.privilege_type
+    FROM (
+        SELECT CASE WHEN c.relkind = 'S' THEN 'SEQUENCE' ELSE 'TABLE' END AS target_type, c.relname AS target,
+               c.relowner AS owner, coalesce(c.relacl, acldefault(CASE WHEN c.relkind = 'S' THEN 's' ELSE 'r' END,
+                                                                   c.relowner)) AS acl
+        FROM pg_class c
+        WHERE c.relkind IN ('r', 'p', 'v', 'm', 'f', 'S') AND pg_table_is_visible(c.oid)
+        UNION ALL
+        SELECT 'FUNCTION', p.proname, p.proowner, coalesce(p.proacl, acldefault('f', p.proowner))
+        FROM pg_proc p JOIN pg_namespace n ON n.oid = p.pronamespace
+        WHERE pg_function_is_visible(p.oid) AND n.nspname NOT IN ('pg_catalog', 'information_schema')
+        UNION ALL
+        SELECT 'SCHEMA', n.nspname, n.nspowner, coalesce(n.nspacl, acldefault('n', n.nspowner))
+        FROM pg_namespace n
+        UNION ALL
+        SELECT CASE WHEN t.typtype = 'd' THEN 'DOMAIN' ELSE 'TYPE' END, t.typname, t.typowner,
+               coalesce(t.typacl, acldefault('T', t.typowner))
+        FROM pg_type t
+        WHERE t.typtype IN ('d', 'e', 'c', 'r') AND pg_type_is_visible(t.oid)
+        UNION ALL
+        SELECT 'DATABASE', d.datname, d.datdba, coalesce(d.datacl, acldefault('d', d.datdba))
+        FROM pg_database d
+    ) AS targets, aclexplode(targets.acl) AS a LEFT JOIN pg_roles r ON r.oid = a.grantee
+    WHERE a.grantee <> targets.owner
+"""
+
+# Role options, in the order their flags are selected from pg_roles
+_role_attributes = ("SUPERUSER", "CREATEDB", "CREATEROLE", "INHERIT", "LOGIN", "REPLICATION")
+
+_trigger_type_row = 1 << 0
+_trigger_type_before = 1 << 1
+_trigger_type_events = ((1 << 2, "INSERT"), (1 << 3, "DELETE"), (1 << 4, "UPDATE"), (1 << 5, "TRUNCATE"))
+_trigger_type_instead = 1 << 6
+
+_all_privileges = {
+    "TABLE": ("SELECT", "INSERT", "UPDATE", "DELETE", "TRUNCATE", "REFERENCES", "TRIGGER"),
+    "SEQUENCE": ("USAGE", "SELECT", "UPDATE"),
+    "FUNCTION": ("EXECUTE",),
+    "SCHEMA": ("CREATE", "USAGE"),
+    "DOMAIN": ("USAGE",),
+    "TYPE": ("USAGE",),
+    "DATABASE": ("CREATE", "CONNECT", "TEMPORARY"),
+}
+
+_type_aliases = {
+    "int": "integer", "int4": "integer", "int8": "bigint", "int2": "smallint", "bool": "boolean",
+    "varchar": "character varying", "char": "character", "float": "double precision", "float8": "double precision",
+    "float4": "real", "timestamp": "timestamp without time zone", "timestamptz": "timestamp with time zone",
+    "time": "time without time zone", "decimal": "numeric",
+}
+
+_operator_spellings = ((" not ilike ", " !~~* "), (" not like ", " !~~ "), (" ilike ", " ~~* "), (" like ", " ~~ "),
+                       ("!=", "<>"))
+_cast_re = re.compile(r"::(?:character varying|timestamp with(?:out)? time zone|time with(?:out)? time zone|"
+                      r"double precision|[a-z_][a-z0-9_]*)(?:\(\d+(?:,\s*\d+)?\))?(?:\[\])?")
+_qualifier_re = re.compile(r"\b[a-z_][a-z0-9_]*\.(?=[a-z_\"])")
+_noise_re = re.compile(r"[\s()\"]")
+_column_separator_re = re.compile(r",\s*(?![^()]*\))")
+_modifier_re = re.compile(r"\(.*\)")
+
+
+def normalize_expression(expression):
+    """Reduce a SQL expression to a form that can be compared with the way Postgres decompiles it."""
+    if expression is None:
+        return None
+    text = " %s " % str(get_condition_text(expression)).lower()
+    for spelling, catalog_spelling in _operator_spellings:
+        text = text.replace(spelling, catalog_spelling)
+    text = _cast_re.sub("", text)
+    text = _qualifier_re.sub("", text)
+    return _noise_re.sub("", text)
+
+
+def normalize_type(type_name):
+    type_name = " ".join(type_name.lower().split())
+    if type_name.startswith("setof "):
+        return "setof " + normalize_type(type_name[len("setof "):])
+    if type_name.startswith("table"):
+        columns = _column_separator_re.split(type_name[len("table"):].strip()[1:-1])
+        return "table(%s)" % ", ".join("%s %s" % (column.split(" ", 1)[0].strip('"'),
+                                                  normalize_type(column.split(" ", 1)[1])) for column in columns)
+    array = ""
+    while type_name.endswith("[]"):
+        type_name, array = type_name[:-2].strip(), array + "[]"
+    base, _, modifier = type_name.partition("(")
+    base = _type_aliases.get(base.strip(), base.strip())
+    return base + ("(" + modifier.replace(" ", "") if modifier else "") + array
+
+
+class CatalogState(object):
+    """Snapshot of the objects pgalchemy manages, as they currently exist on the server."""
+
+    def __init__(self, roles=None, functions=None, triggers=None, policies=None, domains=None, acls=None,
+                 server_version=None, visible_tables=None):
+        self.roles = roles or {}
+        self.functions = functions or {}
+        self.triggers = triggers or {}
+        self.policies = policies or {}
+        self.domains = domains or {}
+        self.acls = acls or {}
+        self.server_version = server_version
+        # Triggers and policies are keyed by table name the way get_table_name spells it: bare for tables found on
+        # the search path, schema-qualified otherwise.  visible_tables maps those bare names to their schema.
+        self.visible_tables = visible_tables or {}
+
+    @classmethod
+    def from_connection(cls, connection) -> 'CatalogState':
+        state = cls(server_version=server_version(connection))
+        for row in connection.execute(_roles_query):
+            attributes = dict(zip(_role_attributes, row[1:7]))
+            attributes["CONNECTION_LIMIT"] = row[7]
+            state.roles[row[0]] = attributes
+        for row in connection.execute(_functions_query):
+            name, arguments, result, source = row[:4]
+            key = name, argument_types(row[12].split(", ") if row[12] else [])
+            state.functions[key] = dict(zip(_function_attributes, row[4:11]), arguments=arguments, result=result,
+                                        source=source)
+            state.functions[key]["config"] = sorted(row[11] or [])
+        for schema, table, visible, name, trigger_type, function, arguments in connection.execute(_triggers_query):
+            key = state._table_key(schema, table, visible), name
+            state.triggers[key] = cls._decode_trigger(trigger_type, function, arguments)
+        for schema, table, visible, name, command, roles, using, check in connection.execute(_policies_query):
+            key = state._table_key(schema, table, visible), name
+            state.policies[key] = {"command": command, "roles": set(r.lower() for r in roles),
+                                   "using": normalize_expression(using), "check": normalize_expression(check)}
+        for name, base_type, constraint_name, constraint in connection.execute(_domains_query):
+            domain = state.domains.setdefault(name, {"type": normalize_type(base_type), "constraints": {}})
+            if constraint_name:
+                domain["constraints"][constraint_name] = normalize_expression(constraint[len("CHECK"):])
+        for target_type, target, grantee, privilege in connection.execute(_acls_query):
+            state.acls.setdefault((target_type, target), set()).add((grantee, privilege))
+        return state
+
+    def _table_key(self, schema, table, visible):
+        if visible:
+            self.visible_tables[table] = schema
+            return table
+        return "%s.%s" % (schema, table)
+
+    def table_key(self, table) -> str:
+        """The key triggers and policies on a declared table are found under."""
+        name = get_table_name(table)
+        schema, _, bare = name.rpartition(".")
+        if schema and self.visible_tables.get(bare) == schema:
+            return bare
+        return name
+
+    @staticmethod
+    def _decode_trigger(trigger_type, function, arguments):
+        if trigger_type & _trigger_type_instead:
+            timing = "INSTEAD OF"
+        elif trigger_type & _trigger_type_before:
+            timing = "BEFORE"
+        else:
+            timing = "AFTER"
+        arguments = bytes(arguments or b"").split(b"\0")[:-1]
+        return {"timing": timing,
+                "events": set(event for bit, event in _trigger_type_events if trigger_type & bit),
+                "cardinality": "ROW" if trigger_type & _trigger_type_row else "STATEMENT",
+                "function": function,
+                "arguments": tuple(a.decode("utf-8") for a in arguments)}
+
+
+def _trigger_signature(trigger):
+    return {"timing": trigger._execution_time,
+            "events": set(event.split(" OF ")[0] for event in trigger._event),
+            "cardinality": trigger._cardinality.split()[-1],
+            "function": trigger._function_name,
+            "arguments": tuple(str(a) for a in trigger._arguments or ())}
+
+
+def _diff_role(role, live):
+    if live is None:
+        return [role._create_statement]
+    for option, value in role._options.items():
+        if option == "CONNECTION_LIMIT":
+            if live["CONNECTION_LIMIT"] != int(value.split()[-1]):
+                return [role._alter_statement]
+        elif option in live and live[option] != (not value.startswith("NO ")):
+            return [role._alter_statement]
+    return []
+
+
+def _declared_function_attributes(function):
+    """The function's planner attributes, encoded the way pg_proc stores them."""
+    attributes = {"volatility": function.volatility[0].lower(), "parallel": (function.parallel or "u")[0].lower(),
+                  "cost": float(function.cost if function.cost is not None else 100),
+                  "rows": float(function.rows if function.rows is not None else 1000 if function.returns_set else 0),
+                  "strict": bool(function.strict), "leakproof": bool(function.leakproof),
+                  "security_definer": bool(function.security_definer)}
+    if None not in function.settings.values():  # FROM CURRENT captures a value that can't be known here
+        attributes["config"] = sorted("%s=%s" % (setting, ", ".join(value) if isinstance(value, (list, tuple))
+                                                  else value) for setting, value in function.settings.items())
+    return attributes
+
+
+def argument_types(types):
+    """Normalized argument types, which tell overloaded functions apart.  Type modifiers don't, so they're dropped."""
+    return tuple(_modifier_re.sub("", normalize_type(t)) for t in types)
+
+
+def _diff_function(function, live):
+    if live is None:
+        return [function._create_statement]
+    if normalize_type(live["result"]) != normalize_type(function.return_type):
+        # The return type of an existing function can't be changed in place
+        return [function._drop_statement, function._create_statement]
+    declared = _declared_function_attributes(function)
+    changed = [attribute for attribute, value in declared.items() if attribute in live and live[attribute] != value]
+    if live["source"].strip() != function.code.strip() or changed:
+        return [function._replace_statement]
+    return []
+
+
+def _diff_trigger(trigger, live, server_version=None):
+    if live is None:
+        return [trigger._create_statement]
+    if live != _trigger_signature(trigger):
+        return trigger._replace_statements(server_version)
+    return []
+
+
+def _diff_policy(policy, live):
+    if live is None:
+        return [policy._create_statement]
+    using, check = normalize_expression(policy._using), normalize_expression(policy._check)
+    # ALTER POLICY can't change the command, remove a USING or WITH CHECK clause, or go back to PUBLIC (without
+    # recipients it has no TO clause), those take a drop and create
+    if (live["command"] != (policy._command or "ALL") or (live["using"] is not None and using is None) or
+            (live["check"] is not None and check is None) or (not policy._recipient and live["roles"] != {"public"})):
+        return [policy._drop_statement, policy._create_statement]
+    roles = set(get_name(r).lower() for r in policy._recipient) or {"public"}
+    if live["roles"] != roles or live["using"] != using or live["check"] != check:
+        return [policy._alter_statement]
+    return []
+
+
+def _diff_domain(domain, live):
+    if live is None:
+        return [domain._create_statement]
+    if live["type"] != normalize_type(domain._type_name):
+        raise ValueError("The base type of domain %s has changed, which can't be done in place" % domain.name)
+    constraint = normalize_expression(domain.constraint) if hasattr(domain, "constraint") else None
+    if constraint in live["constraints"].values() or (constraint is None and not live["constraints"]):
+        return []
+    statements = ["ALTER DOMAIN %s DROP CONSTRAINT %s" % (domain.name, name) for name in live["constraints"]]
+    if constraint is not None:
+        statements.append("ALTER DOMAIN %s ADD CHECK (%s)" % (domain.name, get_condition_text(domain.constraint)))
+    return statements
+
+
+def _privilege_target_name(target_type, target):
+    if target_type == "TABLE":
+        return get_table_name(target)
+    return get_name(getattr(target, "__name__", target)).split("(")[0]
+
+
+def _declared_acls(privilege):
+    """Expand a Privilege into (target type, target, grantee, privilege) entries, or None if it can't be compared
+    against the catalog (column privileges, schema-wide targets and object types that aren't introspected)."""
+    target_type = privilege._target_type
+    if target_type not in _all_privileges:
+        return None
+    if any(c.columns for c in privilege._commands):
+        return None
+    if any(isinstance(t, str) and t.startswith("ALL ") for t in privilege._target):
+        return None
+    commands = set()
+    for command in privilege._commands:
+        commands.update(_all_privileges[target_type] if command.name == "ALL" else (command.name,))
+    return set((target_type, _privilege_target_name(target_type, target), get_name(grantee), command)
+               for target in privilege._target for grantee in privilege._recipient for command in commands)
+
+
+def _privilege_statement(action, target_type, target, grantee, commands):
+    privilege = Privilege(commands=[CommandOption(c) for c in sorted(commands)], target_type=target_type,
+                          targets=[target], recipients=[grantee])
+    return privilege._revoke_statement if action == "revoke" else privilege._grant_statement
+
+
+def _diff_acls(privileges, state):
+    statements = []
+    declared = set()
+    for privilege in privileges:
+        acls = _declared_acls(privilege)
+        if acls is None:
+            statements.append(privilege._grant_statement)  # GRANT is idempotent, so re-issuing it is always safe
+        else:
+            declared.update(acls)
+    missing = {}
+    for target_type, target, grantee, command in declared:
+        if (grantee, command) not in state.acls.get((target_type, target), ()):
+            missing.setdefault((target_type, target, grantee), set()).add(command)
+    for (target_type, target, grantee), commands in sorted(missing.items()):
+        statements.append(_privilege_statement("grant", target_type, target, grantee, commands))
+    managed_targets = set((t[0], t[1]) for t in declared)
+    for target_type, target in sorted(managed_targets):
+        extra = {}
+        for grantee, command in state.acls.get((target_type, target), ()):
+            if (target_type, target, grantee, command) not in declared:
+                extra.setdefault(grantee, set()).add(command)
+        for grantee, commands in sorted(extra.items()):
+            statements.append(_privilege_statement("revoke", target_type, target, grantee, commands))
+    return statements
+
+
+def diff(objects, state, prune=True):
+    """Work out the statements that bring the live catalog in line with the declared objects.
+
+    With prune, triggers and policies that exist on tables pgalchemy manages but are no longer declared are dropped.
+    """
+    graph = objects if isinstance(objects, DependencyGraph) else DependencyGraph(objects)
+    drops, changes, privileges = [], [], []
+    declared_triggers, declared_policies = set(), set()
+    for node in graph.ordered():
+        obj = node.object
+        if node.kind == "role":
+            changes.extend(_diff_role(obj, state.roles.get(obj.name)))
+        elif node.kind == "function":
+            key = obj.name, argument_types(p.split(" DEFAULT ")[0].split(None, 1)[-1] for p in obj.parameters)
+            changes.extend(_diff_function(obj, state.functions.get(key)))
+        elif node.kind == "trigger":
+            key = state.table_key(obj._selectable), obj._name
+            declared_triggers.add(key)
+            changes.extend(_diff_trigger(obj, state.triggers.get(key), state.server_version))
+        elif node.kind == "policy":
+            key = state.table_key(obj._table), obj._name
+            declared_policies.add(key)
+            changes.extend(_diff_policy(obj, state.policies.get(key)))
+        elif node.kind == "domain":
+            changes.extend(_diff_domain(obj, state.domains.get(obj.name)))
+        elif node.kind == "privilege":
+            privileges.append(obj)
+    if prune:
+        managed_tables = set(table for table, _ in declared_triggers | declared_policies)
+        for table, name in sorted(set(state.triggers) - declared_triggers):
+            if table in managed_tables:
+                drops.append('DROP TRIGGER IF EXISTS "%s" on %s' % (name, table))
+        for table, name in sorted(set(state.policies) - declared_policies):
+            if table in managed_tables:
+                drops.append("DROP POLICY IF EXISTS %s on %s" % (name, table))
+    return drops + changes + _diff_acls(privileges, state)
+
+
+def reconcile(objects, connection, prune=True, max_statements=500):
+    """Read the catalog and apply only the statements needed to match the declared objects, in one transaction."""
+    with transaction(connection) as conn:
+        statements = diff(objects, CatalogState.from_connection(conn), prune)
+        for sql, params in batch_statements((split_statement(s) for s in statements), max_statements):
+            execute(conn, sql, params)
+    return statements
@@ -0,0 +1,108 @@
+from collections import OrderedDict
+
+from .deploy import DependencyGraph, batch_statements, execute, transaction
+from .util import convert_python_value_to_sql, server_version, split_statement
+
+
+class Ledger(object):
+    """Records a fingerprint of the DDL each deployed object was created with, so unchanged objects can be skipped.
+
+    Alongside the fingerprint the ledger keeps the statement that removes the object, which lets objects that are no
+    longer declared be pruned even though their definition is gone.
+    """
+
+    _sql_create_template = """
+        CREATE TABLE IF NOT EXISTS {table} (
+            object_key text PRIMARY KEY,
+            fingerprint text NOT NULL,
+            drop_statement text,
+            deployed_at timestamp without time zone NOT NULL DEFAULT now()
+        )
+    """
+
+    _sql_select_template = """
+        SELECT object_key, fingerprint, drop_statement FROM {table} ORDER BY deployed_at
+    """
+
+    _sql_upsert_template = """
+        INSERT INTO {table} (object_key, fingerprint, drop_statement) VALUES {values}
+        ON CONFLICT (object_key) DO UPDATE
+        SET fingerprint = EXCLUDED.fingerprint, drop_statement = EXCLUDED.drop_statement, deployed_at = now()
+    """
+
+    _sql_delete_template = """
+        DELETE FROM {table} WHERE object_key IN ({keys})
+    """
+
+    def __init__(self, table="pgalchemy_ledger"):
+        self.table = table
+
+    @staticmethod
+    def key(node):
+        # Privileges have no name of their own, the grant itself identifies them
+        if node.kind == "privilege":
+            return "privilege:%s" % node.fingerprint
+        return "%s:%s" % node.key
+
+    def load(self, connection):
+        """Fetch every recorded fingerprint in one query, creating the ledger table on first use."""
+        connection.execute(self._sql_create_template.format(table=self.table))
+        rows = connection.execute(self._sql_select_template.format(table=self.table))
+        return OrderedDict((key, (fingerprint, drop_statement)) for key, fingerprint, drop_statement in rows)
+
+    def record_statement(self, entries):
+        values = ", ".join("(%s, %s, %s)" % tuple(convert_python_value_to_sql(v) for v in entry) for entry in entries)
+        return self._sql_upsert_template.format(table=self.table, values=values)
+
+    def forget_statement(self, keys):
+        keys = ", ".join(convert_python_value_to_sql(k) for k in keys)
+        return self._sql_delete_template.format(table=self.table, keys=keys)
+
+
+def _change_statements(node, previous_drop_statement, server_version=None):
+    """Statements that move an already deployed object to its new definition."""
+    if node.kind == "table":
+        return []  # Existing tables are left to a migration tool
+    elif node.kind in ("function", "trigger"):
+        return node.object._replace_statements(server_version)
+    elif node.kind == "role":
+        return [node.object._alter_statement]
+    statements = [previous_drop_statement] if previous_drop_statement else []
+    return statements + [node.create_statement]
+
+
+def changed_statements(graph, deployed, ledger, prune=False, server_version=None):
+    """Statements for every object whose fingerprint differs from the ledger, followed by the ledger update."""
+    statements, entries, declared = [], [], set()
+    for node in graph.ordered():
+        key = ledger.key(node)
+        declared.add(key)
+        fingerprint = node.fingerprint
+        previous = deployed.get(key)
+        if previous is not None and previous[0] == fingerprint:
+            continue
+        if previous is None:
+            statements.append(node.create_statement)
+        else:
+            statements.extend(_change_statements(node, previous[1], server_version))
+        drop_statement = node.drop_statement if node.kind != "table" else None  # Never prune tables, they hold data
+        entries.append((key, fingerprint, drop_statement.strip() if isinstance(drop_statement, str) else None))
+    stale = [key for key in deployed if key not in declared]
+    if prune and stale:
+        # Drop the most recently deployed objects first, since they are the ones that can depend on older ones
+        statements = [deployed[key][1] for key in reversed(stale) if deployed[key][1]] + statements
+        statements.append(ledger.forget_statement(stale))
+    if entries:
+        statements.append(ledger.record_statement(entries))
+    return statements
+
+
+def deploy_changes(objects, connection, ledger=None, prune=False, max_statements=500):
+    """Create or update only the objects whose generated DDL changed since they were last deployed."""
+    ledger = ledger or Ledger()
+    graph = objects if isinstance(objects, DependencyGraph) else DependencyGraph(objects)
+    with transaction(connection) as conn:
+        statements = changed_statements(graph, ledger.load(conn), ledger, prune, server_version(conn))
+        for sql, params in batch_statements((split_statement(s) for s in statements), max_statements):
+            execute(conn, sql, params)
+    return statements
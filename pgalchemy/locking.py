@@ -0,0 +1,84 @@
+import random
+import time
+from collections import OrderedDict
+
+from .deploy import DependencyGraph, apply_nodes, execute, transaction
+
+# SQLSTATE lock_not_available, raised when lock_timeout expires
+LOCK_NOT_AVAILABLE = "55P03"
+
+
+def is_lock_timeout(error):
+    original = getattr(error, "orig", None) or error  # SQLAlchemy wraps the DBAPI exception
+    code = getattr(original, "pgcode", None) or getattr(original, "sqlstate", None)
+    return code == LOCK_NOT_AVAILABLE or "lock timeout" in str(original)
+
+
+def lock_mode(nodes, drop=False):
+    """The strongest lock the statements for nodes take on their table, so it can be acquired once up front."""
+    kinds = {node.kind for node in nodes}
+    if "policy" in kinds or (drop and "trigger" in kinds):
+        return "ACCESS EXCLUSIVE"
+    elif "trigger" in kinds:
+        return "SHARE ROW EXCLUSIVE"
+    return None  # Grants don't lock the table itself
+
+
+def lock_groups(graph, drop=False):
+    """Split a graph into (table, nodes) units, each applied in its own short transaction.
+
+    Triggers, policies and table grants that nothing else depends on are collected per table, so each table is
+    locked once for all of them.  Everything else stays in dependency order in a unit whose table is None, which
+    runs before the table units when creating and after them when dropping.
+    """
+    depended_on = {key for node in graph.nodes.values() for key in graph._resolve_dependencies(node)}
+    tables, rest = OrderedDict(), []
+    for node in graph.ordered(drop):
+        lock_key = node.lock_key
+        if node.kind != "table" and lock_key[0] == "table" and node.key not in depended_on:
+            tables.setdefault(lock_key[1], []).append(node)
+        else:
+            rest.append(node)
+    groups = [(None, rest)] if rest else []
+    table_groups = list(tables.items())
+    return table_groups + groups if drop else groups + table_groups
+
+
+def backoff_delay(attempt, backoff=0.05, max_backoff=5.0):
+    """Exponential backoff with jitter, so that retrying deploys don't line up behind the same transaction."""
+    delay = min(max_backoff, backoff * 2 ** attempt)
+    return random.uniform(delay / 2, delay)
+
+
+def _apply_group(connection, table, nodes, drop, lock_timeout, max_statements, started):
+    with transaction(connection) as conn:
+        execute(conn, "SET LOCAL lock_timeout = %d" % lock_timeout)
+        mode = lock_mode(nodes, drop) if table else None
+        if mode:
+            execute(conn, "LOCK TABLE %s IN %s MODE" % (table, mode))
+        # Includes the attempts that timed out, and the backoff between them
+        lock_wait = time.perf_counter() - started if mode else None
+        apply_nodes(conn, nodes, drop, max_statements, lock_wait)
+
+
+def lock_aware_deploy(objects, connection, drop=False, lock_timeout=2000, retries=10, backoff=0.05, max_backoff=5.0,
+                      max_statements=500, sleep=time.sleep):
+    """Deploy without queueing behind long running transactions on busy tables.
+
+    Every unit from lock_groups runs in its own transaction with lock_timeout (in milliseconds) set, taking its
+    table's strongest lock before anything else.  A unit that times out waiting is rolled back and retried after a
+    jittered backoff, up to `retries` times.  Locks are only held for as long as one table's statements take, at the
+    cost of the deploy no longer being atomic as a whole.
+    """
+    graph = objects if isinstance(objects, DependencyGraph) else DependencyGraph(objects)
+    for table, nodes in lock_groups(graph, drop):
+        started = time.perf_counter()
+        for attempt in range(retries + 1):
+            try:
+                _apply_group(connection, table, nodes, drop, lock_timeout, max_statements, started)
+                break
+            except Exception as e:
+                if attempt == retries or not is_lock_timeout(e):
+                    raise
+                sleep(backoff_delay(attempt, backoff, max_backoff))
+    return graph
@@ -0,0 +1,82 @@
+"""NumPy arrays as plpython function parameters and results.
+
+Parameters and results annotated numpy.ndarray (float64) or numpy.typing.NDArray[dtype] map to the matching Postgres
+array type, and the generated body converts them to and from NumPy arrays, so the function body works on arrays.
+With zero_copy=True they are passed as bytea holding the raw buffer instead, which numpy.frombuffer wraps without
+copying or converting any element (the array is read-only), and the result goes back through a single tobytes().
+Only one-dimensional arrays round trip, in the machine's byte order.
+
+NumPy is only imported when an annotation already refers to it, and needs to be installed on the server as well.
+"""
+import textwrap
+
+# NumPy dtype name -> Postgres element type
+element_types = {
+    "float64": "float8",
+    "float32": "float4",
+    "int64": "int8",
+    "int32": "int4",
+    "int16": "int2",
+    "bool": "boolean",
+}
+
+_ndarray_template = """\
+def _ndarray_body({parameters}):
+{body}
+import numpy
+_result = _ndarray_body({arguments})
+return None if _result is None else {result}
+"""
+
+
+def _is_ndarray(annotation):
+    # isinstance, since NDArray[...] passes attribute lookups through to ndarray
+    return isinstance(annotation, type) and getattr(annotation, "__origin__", None) is None and \
+        annotation.__name__ == "ndarray" and \
+        annotation.__module__.split(".")[0] == "numpy"
+
+
+def ndarray_dtype(annotation):
+    """The dtype name of a numpy.ndarray or NDArray[...] annotation, otherwise None."""
+    if _is_ndarray(annotation):
+        return "float64"
+    if not _is_ndarray(getattr(annotation, "__origin__", None)):
+        return None
+    import numpy
+    try:
+        scalar_type = annotation.__args__[1].__args__[0]  # NDArray[T] is ndarray[shape, dtype[T]]
+        dtype = numpy.dtype(scalar_type).name
+    except (AttributeError, IndexError, TypeError):
+        raise ValueError("NumPy array annotations need a dtype, like NDArray[numpy.float64]: %s" % annotation)
+    if dtype not in element_types:
+        raise ValueError("No Postgres mapping was found for NumPy dtype: %s" % dtype)
+    return dtype
+
+
+def sql_type(dtype, zero_copy=False):
+    return "bytea" if zero_copy else element_types[dtype] + "[]"
+
+
+def _to_ndarray(name, dtype, zero_copy):
+    conversion = "numpy.frombuffer(%s, dtype=%r)" if zero_copy else "numpy.array(%s, dtype=%r)"
+    return "None if %s is None else %s" % (name, conversion % (name, dtype))
+
+
+def wrap(code, parameters, result_dtype, zero_copy=False):
+    """Wrap a plpython body so its ndarray parameters arrive, and its ndarray result leaves, as NumPy arrays.
+
+    parameters is a list of (name, dtype), with None as the dtype of parameters that aren't arrays.
+    """
+    arguments = []
+    for name, dtype in parameters:
+        arguments.append("(%s)" % _to_ndarray(name, dtype, zero_copy) if dtype else name)
+    if result_dtype is None:
+        result = "_result"
+    elif zero_copy:
+        result = "numpy.ascontiguousarray(_result, dtype=%r).tobytes()" % result_dtype
+    else:
+        result = "numpy.asarray(_result, dtype=%r).tolist()" % result_dtype
+    code = _ndarray_template.format(parameters=", ".join(name for name, _ in parameters),
+                                    body=textwrap.indent(textwrap.dedent(code), "    "),
+                                    arguments=", ".join(arguments), result=result)
+    return textwrap.indent(code, "    ")
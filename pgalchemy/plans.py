@@ -0,0 +1,127 @@
+import ast
+import hashlib
+import io
+import re
+import tokenize
+
+from .util import literal_string
+
+# Placeholders that can become bind parameters, '%s' (quoted by hand) included
+_placeholder_re = re.compile(r"'%s'|%%|%[sdif]")
+_quoting_functions = {"quote_literal", "quote_nullable"}
+_text_types = {"text", "varchar", "character varying", "char", "character", "name"}
+
+
+def _execute_calls(code):
+    """Yield the (start, end) character offsets of every plpy.execute(...) call in code."""
+    line_offsets = [0]
+    for line in code.splitlines(True):
+        line_offsets.append(line_offsets[-1] + len(line))
+    tokens = list(tokenize.generate_tokens(io.StringIO(code).readline))
+    for i in range(len(tokens) - 3):
+        if [t.string for t in tokens[i:i + 4]] != ["plpy", ".", "execute", "("]:
+            continue
+        depth = 0
+        for token in tokens[i + 3:]:
+            if token.string in "([{" and token.type == tokenize.OP:
+                depth += 1
+            elif token.string in ")]}" and token.type == tokenize.OP:
+                depth -= 1
+                if not depth:
+                    start, end = tokens[i].start, token.end
+                    yield line_offsets[start[0] - 1] + start[1], line_offsets[end[0] - 1] + end[1]
+                    break
+
+
+def _bind_parameter(node, parameter_types, quoted):
+    """The name and SQL type of a function parameter substituted into a query, or None when it can't be bound."""
+    if isinstance(node, ast.Call) and len(node.args) == 1 and not node.keywords:
+        function = node.func
+        if (isinstance(function, ast.Attribute) and function.attr in _quoting_functions and
+                isinstance(function.value, ast.Name) and function.value.id == "plpy"):
+            node, quoted = node.args[0], True
+    if not isinstance(node, ast.Name) or node.id not in parameter_types:
+        return None
+    sql_type = parameter_types[node.id]
+    if not quoted and sql_type in _text_types:
+        return None  # Substituted unquoted, it may well be an identifier rather than a value
+    return node.id, sql_type
+
+
+def parameterize(query, parameter_types):
+    """Turn the query passed to plpy.execute into (sql, [(argument, type)]), or None when it isn't a query whose
+    only variable parts are the function's own parameters."""
+    sql = literal_string(query)
+    if sql is not None:
+        return sql, []
+    if not (isinstance(query, ast.BinOp) and isinstance(query.op, ast.Mod)):
+        return None
+    template = literal_string(query.left)
+    if template is None:
+        return None
+    values = query.right.elts if isinstance(query.right, ast.Tuple) else [query.right]
+    placeholders = [m for m in _placeholder_re.finditer(template) if m.group() != "%%"]
+    if len(placeholders) != len(values):
+        return None
+    bound = []
+    for placeholder, value in zip(placeholders, values):
+        parameter = _bind_parameter(value, parameter_types, placeholder.group() == "'%s'")
+        if parameter is None:
+            return None
+        bound.append(parameter)
+    numbers = iter(range(1, len(bound) + 1))
+    sql = _placeholder_re.sub(lambda m: "%" if m.group() == "%%" else "$%d" % next(numbers), template)
+    return sql, bound
+
+
+def _limit(node):
+    if isinstance(node, ast.Name):
+        return node.id
+    value = getattr(node, "value", None)
+    if value is None:
+        value = getattr(node, "n", None)  # ast.Num before Python 3.8
+    return str(value) if isinstance(value, int) else None
+
+
+def _cached_execute(call, parameter_types):
+    if call.keywords or not 1 <= len(call.args) <= 2:
+        return None
+    parameterized = parameterize(call.args[0], parameter_types)
+    if parameterized is None:
+        return None
+    sql, bound = parameterized
+    types = [sql_type for _, sql_type in bound]
+    key = "plan_" + hashlib.sha1(("%s\0%s" % (sql, types)).encode("utf-8")).hexdigest()[:12]
+    plan = 'SD[%r] if %r in SD else SD.setdefault(%r, plpy.prepare(%r, %r))' % (key, key, key, sql, types)
+    arguments = "[%s]" % ", ".join(name for name, _ in bound)
+    if len(call.args) == 2:  # plpy.execute(query, limit)
+        limit = _limit(call.args[1])
+        if limit is None:
+            return None
+        return "plpy.execute(%s, %s, %s)" % (plan, arguments, limit)
+    return "plpy.execute(%s, %s)" % (plan, arguments)
+
+
+def cache_plans(code, parameter_types):
+    """Rewrite plpy.execute calls on fixed queries to run plans prepared once and kept in the function's SD.
+
+    A query qualifies when it is a string literal, or a %-formatted literal whose values are the function's own
+    parameters (optionally wrapped in plpy.quote_literal or plpy.quote_nullable).  Those values become bind
+    parameters typed by parameter_types, a mapping of parameter name to SQL type.  Every other call is left as is.
+    """
+    replacements = []
+    try:
+        calls = list(_execute_calls(code))
+    except (tokenize.TokenError, IndentationError):
+        return code  # Leave anything tokenize can't follow to fail, or not, on the server
+    for start, end in calls:
+        try:
+            call = ast.parse(code[start:end], mode="eval").body
+        except SyntaxError:
+            continue
+        replacement = _cached_execute(call, parameter_types)
+        if replacement is not None:
+            replacements.append((start, end, replacement))
+    for start, end, replacement in reversed(replacements):
+        code = code[:start] + replacement + code[end:]
+    return code
@@ -1,7 +1,7 @@
 from typing import Sequence
 
 from .util import get_condition_text, get_name
-from .types import FluentClauseContainer, ValueSetter, DependentCreatable
+from .types import FluentClauseContainer, ValueSetter, DependentCreatable, cached_statement
 
 
 class PolicyClause(DependentCreatable):
@@ -70,10 +70,16 @@ class PolicyOnClause(PolicyToClause, PolicyUsingClause, PolicyCheckClause):
 
 
 class Policy(FluentClauseContainer, DependentCreatable):
+    _object_kind = "policy"
+
     _sql_create_template = """
         CREATE POLICY {name} on {table_name} {for_command} {to_recipient} {using_expression} {with_check_expression}
     """
 
+    _sql_alter_template = """
+        ALTER POLICY {name} on {table_name} {to_recipient} {using_expression} {with_check_expression}
+    """
+
     _sql_drop_template = """
         DROP POLICY IF EXISTS {name} on {table_name}
     """
@@ -89,24 +95,32 @@ class Policy(FluentClauseContainer, DependentCreatable):
         self._policy = self
         self._current_clause = None
 
-    @property
-    def _create_statement(self):
+    def _statement(self, template):
         table_name = get_name(self._table)
         for_command = "FOR %s" % self._command if self._command else ''
         to_recipient = "TO %s" % ', '.join(self._recipient) if self._recipient else ''
-        using_expression = "USING (%s)" % get_condition_text(self._using) if self._using else ''
-        with_check_expression = "WITH CHECK (%s)" % get_condition_text(self._check) if self._check else ''
-        return self._sql_create_template.format(name=self._name, table_name=table_name, for_command=for_command,
-                                                to_recipient=to_recipient, using_expression=using_expression,
-                                                with_check_expression=with_check_expression)
+        using_expression = "USING (%s)" % get_condition_text(self._using) if self._using is not None else ''
+        with_check_expression = "WITH CHECK (%s)" % get_condition_text(self._check) if self._check is not None else ''
+        return template.format(name=self._name, table_name=table_name, for_command=for_command,
+                               to_recipient=to_recipient, using_expression=using_expression,
+                               with_check_expression=with_check_expression)
 
-    @property
+    @cached_statement
+    def _create_statement(self):
+        return self._statement(self._sql_create_template)
+
+    @cached_statement
+    def _alter_statement(self):
+        return self._statement(self._sql_alter_template)
+
+    @cached_statement
     def _drop_statement(self):
         table_name = get_name(self._table)
         return self._sql_drop_template.format(name=self._name, table_name=table_name)
 
     def _set_recipient(self, recipient):
         ValueSetter.set(self._recipient, recipient)
+        self._invalidate()
 
     def on(self, table) -> PolicyOnClause:
         self._table = table
@@ -1,8 +1,8 @@
 from types import FunctionType
-from .types import ValueSetter, FluentClauseContainer, PostgresOption
+from .types import ValueSetter, FluentClauseContainer, PostgresOption, CachedStatements, cached_statement
 from .util import get_name, get_table_name, get_role_name, before_create, after_create, before_drop, is_postgres, \
-    execute_if_postgres, get_name
-from .function import FunctionGenerator
+    execute_if_postgres, execute_async, get_name
+from .instrumentation import instrumented, instrumented_async
 
 
 class PrivilegeClause(object):
@@ -281,6 +281,7 @@ class TableCommand(TableCommandBase):
 class CallableTableCommand(TableCommand):
     def __call__(self, *columns):
         self._privilege._commands[-1].columns = columns
+        self._privilege._invalidate()
         return TableColumnCommand(self._privilege)
 
 
@@ -440,7 +441,9 @@ class CreateCommand(PrivilegeClause):
 
 
 class Privilege(UsageCommandBase, SelectCommandBase, UpdateCommandBase, CreateCommandBase, FunctionCommand,
-                TableCommandBase, DatabaseCommandBase, FluentClauseContainer):
+                TableCommandBase, DatabaseCommandBase, FluentClauseContainer, CachedStatements):
+    _object_kind = "privilege"
+
     _sql_grant_template = """
         GRANT {commands} on {target_type} {targets} to {recipients}
     """
@@ -462,18 +465,22 @@ class Privilege(UsageCommandBase, SelectCommandBase, UpdateCommandBase, CreateCo
 
     def _set_commands(self, commands):
         ValueSetter.set(self._commands, commands)
+        self._invalidate()
 
     def _set_targets(self, target):
         ValueSetter.set(self._target, target)
+        self._invalidate()
 
     def _set_recipients(self, recipient):
         ValueSetter.set(self._recipient, recipient)
+        self._invalidate()
 
     def _format_target(self):
         def format_function(f):
             if isinstance(f, str):
                 return f
             elif isinstance(f, FunctionType):
+                from .function import FunctionGenerator
                 parameters = FunctionGenerator.get_parameters(f)
                 sql_types = [FunctionGenerator.convert_python_type_to_sql(p.annotation) for p in parameters]
                 return "%s(%s)" % (f.__name__, ", ".join(sql_types))
@@ -495,14 +502,18 @@ class Privilege(UsageCommandBase, SelectCommandBase, UpdateCommandBase, CreateCo
         recipients = ", ".join(recipient_names)
         return template.format(commands=commands, target_type=target_type, targets=targets, recipients=recipients)
 
-    @property
+    @cached_statement
     def _grant_statement(self):
         return self._statement(self._sql_grant_template)
 
-    @property
+    @cached_statement
     def _revoke_statement(self):
         return self._statement(self._sql_revoke_template)
 
+    @property
+    def _fingerprint_statement(self):
+        return self._grant_statement
+
     @property
     def all(self) -> AllOnConnector:
         self._privilege._set_commands(CommandOption("ALL"))
@@ -513,7 +524,7 @@ def grant(*privileges, connection=None):
     for privilege in privileges:
         statement = privilege._grant_statement
         if connection:
-            execute_if_postgres(connection, statement)
+            instrumented(connection, "privilege", privilege, statement, execute_if_postgres, connection, statement)
         else:
             after_create(statement)
 
@@ -522,6 +533,26 @@ def revoke(*privileges, connection=None):
     for privilege in privileges:
         statement = privilege._revoke_statement
         if connection:
-            execute_if_postgres(connection, statement)
+            instrumented(connection, "privilege", privilege, statement, execute_if_postgres, connection, statement)
+        else:
+            after_create(statement)
+
+
+async def grant_async(*privileges, connection=None):
+    for privilege in privileges:
+        statement = privilege._grant_statement
+        if connection:
+            await instrumented_async(connection, "privilege", privilege, statement, execute_async, connection,
+                                     statement)
+        else:
+            after_create(statement)
+
+
+async def revoke_async(*privileges, connection=None):
+    for privilege in privileges:
+        statement = privilege._revoke_statement
+        if connection:
+            await instrumented_async(connection, "privilege", privilege, statement, execute_async, connection,
+                                     statement)
         else:
             after_create(statement)
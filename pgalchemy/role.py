@@ -1,38 +1,55 @@
-from pgalchemy.types import Creatable
+from pgalchemy.types import Creatable, cached_statement
 from pgalchemy.util import get_name
 
 
 class Role(Creatable):
+    _object_kind = "role"
 
     _sql_create_template = """
         CREATE ROLE {name} {with_options}
     """
 
+    _sql_alter_template = """
+        ALTER ROLE {name} {with_options}
+    """
+
     _sql_drop_template = """
         DROP ROLE IF EXISTS {name}
     """
 
+    # Membership options are only valid when the role is created
+    _create_only_options = {"IN ROLE", "ROLE", "ADMIN"}
+
     def __init__(self, name, options=None):
         self.name = name
         self._options = options or {}
+        self._referenced_roles = []
 
     def _set_boolean_option(self, option_name, value):
         option_string = "NO " + option_name if not value else option_name
         self._options[option_name] = option_string
         self._last_option = option_name
+        self._invalidate()
 
     def __call__(self, value) -> 'Role':
         self._set_boolean_option(self._last_option, value)
         return self
 
-    @property
+    @cached_statement
     def _create_statement(self):
         options = " ".join(self._options.values())
         if options:
             options = "WITH " + options
         return self._sql_create_template.format(name=self.name, with_options=options)
 
-    @property
+    @cached_statement
+    def _alter_statement(self):
+        options = " ".join(v for k, v in self._options.items() if k not in self._create_only_options)
+        if options:
+            options = "WITH " + options
+        return self._sql_alter_template.format(name=self.name, with_options=options)
+
+    @cached_statement
     def _drop_statement(self):
         return self._sql_drop_template.format(name=self.name)
 
@@ -68,6 +85,7 @@ class Role(Creatable):
 
     def connection_limit(self, connection_limit=-1) -> 'Role':
         self._options["CONNECTION_LIMIT"] = "CONNECTION LIMIT %s" % connection_limit
+        self._invalidate()
         return self
 
     def password(self, password, encrypted=True, valid_until=None) -> 'Role':
@@ -77,23 +95,30 @@ class Role(Creatable):
         if valid_until:
             password_option += " VALID UNTIL '%s'" % valid_until.isoformat()
         self._options["PASSWORD"] = password_option
+        self._invalidate()
         return self
 
     def in_role(self, *roles) -> 'Role':
         if roles:
             role_names = ", ".join(get_name(r) for r in roles)
+            self._referenced_roles.extend(get_name(r) for r in roles)
             self._options["IN ROLE"] = "IN ROLE %s" % role_names
+            self._invalidate()
         return self
 
     def including_roles(self, *roles) -> 'Role':
         if roles:
             role_names = ", ".join(get_name(r) for r in roles)
+            self._referenced_roles.extend(get_name(r) for r in roles)
             self._options["ROLE"] = "ROLE %s" % role_names
+            self._invalidate()
         return self
 
     def including_admins(self, *roles) -> 'Role':
         if roles:
             role_names = ", ".join(get_name(r) for r in roles)
+            self._referenced_roles.extend(get_name(r) for r in roles)
             self._options["ADMIN"] = "ADMIN %s" % role_names
+            self._invalidate()
         return self
 
@@ -0,0 +1,71 @@
+import re
+
+from .deploy import DependencyGraph, DeployNode, object_kind, resolve_object
+from .types import CachedStatements
+from .util import convert_python_value_to_sql, split_statement
+
+
+_placeholder_re = re.compile(r"'(?:[^']|'')*'|%%|%s")
+
+
+def render_statement(sql, params=()):
+    """Inline bind parameters as literals, the way the driver would have interpolated them.
+
+    Only %s placeholders outside string literals are substituted, so a literal % (LIKE 'a%') is left alone.
+    """
+    if params:
+        values = iter([convert_python_value_to_sql(p) for p in params])
+
+        def substitute(match):
+            token = match.group()
+            if token == "%s":
+                return next(values)
+            return "%" if token == "%%" else token
+
+        sql = _placeholder_re.sub(substitute, sql)
+    return sql
+
+
+def _node(obj):
+    obj = resolve_object(obj)
+    return DeployNode(obj, object_kind(obj), None)
+
+
+def _nodes(objects, drop, ordered):
+    if hasattr(objects, "dependency_graph"):  # A PostgresAlchemy registry
+        objects = objects.dependency_graph() if ordered else objects.objects
+    if ordered:
+        graph = objects if isinstance(objects, DependencyGraph) else DependencyGraph(objects)
+        return graph.ordered(drop)
+    # Stream straight from the iterable, objects are expected to already be in a valid order
+    return (_node(obj) for obj in objects)
+
+
+def _statements(objects, drop, ordered):
+    for node in _nodes(objects, drop, ordered):
+        yield split_statement(node.drop_statement if drop else node.create_statement)
+        if isinstance(node.object, CachedStatements):
+            node.object._invalidate()  # Don't let the cached statements accumulate into a copy of the script
+
+
+def iter_script(objects, drop=False, transaction=True, ordered=True):
+    """Generate a SQL script one statement at a time.
+
+    Only the objects themselves are held in memory, never the rendered script.  Pass ordered=False to skip the
+    dependency sort and stream objects from any iterable, in the order given.
+    """
+    if transaction:
+        yield "BEGIN;\n"
+    for sql, params in _statements(objects, drop, ordered):
+        yield "%s;\n" % render_statement(sql, params)
+    if transaction:
+        yield "COMMIT;\n"
+
+
+def write_script(objects, stream, drop=False, transaction=True, ordered=True):
+    """Write a script for the objects to a file path or anything with a write method."""
+    if isinstance(stream, str):
+        with open(stream, "w") as f:
+            return write_script(objects, f, drop, transaction, ordered)
+    for chunk in iter_script(objects, drop, transaction, ordered):
+        stream.write(chunk)
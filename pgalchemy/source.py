@@ -0,0 +1,115 @@
+import ast
+import inspect
+import linecache
+import textwrap
+from collections import namedtuple
+
+FunctionSource = namedtuple("FunctionSource", ["body", "assigned"])
+
+_comprehensions = (ast.ListComp, ast.SetComp, ast.DictComp, ast.GeneratorExp)
+_named_expressions = (ast.NamedExpr,) if hasattr(ast, "NamedExpr") else ()  # Python 3.8 on
+
+# filename -> (lines, {line number: function definition}), each file is parsed once for every function defined in it
+# until linecache sees it change
+_definitions = {}
+# code object -> FunctionSource
+_sources = {}
+
+
+def clear_cache():
+    _definitions.clear()
+    _sources.clear()
+    linecache.clearcache()
+
+
+def _index_definitions(tree):
+    definitions = {}
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            # co_firstlineno is the first decorator's line from Python 3.8 on, and the def line before that
+            first = min([node.lineno] + [decorator.lineno for decorator in node.decorator_list])
+            definitions.setdefault(first, node)
+            definitions.setdefault(node.lineno, node)
+    return definitions
+
+
+def _file_definitions(filename):
+    linecache.checkcache(filename)  # Drops the cached lines of a file that was edited, e.g. before a reload
+    lines = linecache.getlines(filename)
+    if not lines:
+        raise OSError("Could not get the source of %s" % filename)
+    cached_lines, definitions = _definitions.get(filename, (None, None))
+    if cached_lines is not lines:
+        definitions = _index_definitions(ast.parse("".join(lines), filename))
+        _definitions[filename] = lines, definitions
+    return definitions
+
+
+def assigned_names(statements):
+    """Names bound or deleted by statements, not counting the inside of nested functions, lambdas, classes or
+    comprehensions."""
+    names = []
+    nodes = list(statements)
+    while nodes:
+        node = nodes.pop(0)
+        if isinstance(node, ast.Name) and not isinstance(node.ctx, ast.Load):
+            names.append(node.id)
+        elif isinstance(node, ast.ExceptHandler) and node.name:
+            names.append(node.name)
+        elif isinstance(node, (ast.Import, ast.ImportFrom)):
+            names.extend((alias.asname or alias.name).split(".")[0] for alias in node.names)
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            names.append(node.name)
+            nodes.extend(node.decorator_list)
+            continue
+        elif isinstance(node, ast.Lambda):
+            continue
+        elif isinstance(node, _comprehensions):
+            # Comprehension variables are local to it, only an assignment expression binds in the function
+            nodes.extend(child for child in ast.walk(node) if isinstance(child, _named_expressions))
+            continue
+        nodes.extend(ast.iter_child_nodes(node))
+    return names
+
+
+def _body(lines, node):
+    first = node.body[0]
+    end = getattr(node, "end_lineno", None)
+    if end is None:  # Python before 3.8
+        end = node.lineno + len(inspect.getblock(lines[node.lineno - 1:])) - 1
+    if first.lineno == node.lineno or lines[first.lineno - 1][:first.col_offset].strip():
+        # A body on the same line as the signature, "def f(): return 1"
+        indent = " " * (node.col_offset + 4)
+        return indent + lines[first.lineno - 1][first.col_offset:] + "".join(lines[first.lineno:end])
+    start = first.lineno - 1
+    while start > node.lineno and lines[start - 1].strip()[:1] in ("", "#"):
+        start -= 1  # Keep comments and blank lines between the signature and the first statement
+    return "".join(lines[start:end])
+
+
+def function_source(f) -> FunctionSource:
+    """The body of f as plpython code, and the names it assigns to, cached per code object."""
+    code = f.__code__
+    source = _sources.get(code)
+    if source is None:
+        filename = inspect.getsourcefile(f) or code.co_filename
+        node = _file_definitions(filename).get(code.co_firstlineno)
+        if node is None or node.name != code.co_name:
+            raise OSError("Could not find the definition of %s in %s" % (code.co_name, filename))
+        source = _sources[code] = FunctionSource(_body(linecache.getlines(filename), node), assigned_names(node.body))
+    return source
+
+
+def definition_source(obj):
+    """The source of a class or function definition without its decorators, dedented."""
+    source = textwrap.dedent(inspect.getsource(obj))
+    lines = source.splitlines(True)
+    start = ast.parse(source).body[0].lineno - 1
+    while not lines[start].lstrip().startswith(("def ", "async def ", "class ")):
+        start += 1  # Before Python 3.8 a decorated definition starts at its first decorator
+    return "".join(lines[start:])
+
+
+def parse_body(code):
+    """The statements of a function body given as text."""
+    return ast.parse("def body():\n" + textwrap.indent(textwrap.dedent(code), "    ")).body[0].body
@@ -0,0 +1,274 @@
+"""Translation of pure Python expression bodies into LANGUAGE sql, which Postgres can inline into the calling query.
+
+The supported subset is a body of returns, optionally under if/elif/else, whose expressions use the function's
+parameters, literals, arithmetic, comparisons (only equality for text, which SQL orders by collation), boolean
+logic, conditional expressions, %-formatting and f-strings of text and integers, and a few builtins and str methods.
+Everything translates to immutable SQL, so a translated function declared IMMUTABLE can be used in index expressions.
+As in SQL, a NULL argument generally gives a NULL result where Python would have raised or compared None.  Integer
+arithmetic is done in the parameters' SQL types, so an intermediate result that overflows them raises "integer out of
+range" where Python's ints would just grow; declare numeric parameters for values that can get that large.  Case
+mapping (lower, upper) isn't translated, Postgres follows the database's locale where Python follows Unicode.
+"""
+import ast
+import math
+
+from .plans import _text_types
+from .source import parse_body
+from .util import convert_python_value_to_sql, literal_string
+
+_integer_types = {"int", "integer", "bigint", "smallint", "int2", "int4", "int8"}
+_numeric_types = _integer_types | {"numeric", "decimal", "real", "double precision", "float4", "float8"}
+
+_arithmetic = {ast.Add: "+", ast.Sub: "-", ast.Mult: "*"}
+_comparisons = {ast.Eq: "=", ast.NotEq: "<>", ast.Lt: "<", ast.LtE: "<=", ast.Gt: ">", ast.GtE: ">="}
+_orderings = (ast.Lt, ast.LtE, ast.Gt, ast.GtE)
+# Only with the characters given, without them Python strips any whitespace and SQL only spaces
+_trim_functions = {"strip": "btrim", "lstrip": "ltrim", "rstrip": "rtrim"}
+
+
+class Untranslatable(Exception):
+    pass
+
+
+def _category(sql_type):
+    sql_type = (sql_type or "").lower()
+    if sql_type in _text_types:
+        return "text"
+    elif sql_type in _integer_types:
+        return "integer"
+    elif sql_type in _numeric_types:
+        return "numeric"
+    elif sql_type == "boolean":
+        return "boolean"
+    return None
+
+
+class _Translator(object):
+    def __init__(self, parameter_types):
+        self.parameter_types = parameter_types
+
+    def statements(self, statements):
+        """One SQL expression for the value a list of statements returns."""
+        if not statements:
+            raise Untranslatable("falls through without returning")
+        statement = statements[0]
+        if isinstance(statement, ast.Return) and statement.value is not None:
+            return self.expression(statement.value)[0]
+        elif isinstance(statement, ast.If):
+            # A branch that doesn't return carries on with whatever follows the if
+            condition = self.condition(statement.test)
+            then = self.statements(statement.body + statements[1:])
+            otherwise = self.statements(statement.orelse + statements[1:])
+            if otherwise.startswith("CASE WHEN "):  # elif
+                return "CASE WHEN %s THEN %s %s" % (condition, then, otherwise[len("CASE "):])
+            return "CASE WHEN %s THEN %s ELSE %s END" % (condition, then, otherwise)
+        raise Untranslatable("unsupported statement: %s" % type(statement).__name__)
+
+    def condition(self, node):
+        sql, category = self.expression(node)
+        if category != "boolean":
+            raise Untranslatable("conditions need to be boolean, Python truthiness has no SQL equivalent")
+        return sql
+
+    def expression(self, node):
+        """(sql, category) for an expression, category being text, integer, numeric, boolean or None."""
+        method = getattr(self, "_" + type(node).__name__, None)
+        if method is None:
+            raise Untranslatable("unsupported expression: %s" % type(node).__name__)
+        return method(node)
+
+    def _Name(self, node):
+        if node.id not in self.parameter_types:
+            raise Untranslatable("%s is not a parameter" % node.id)
+        return node.id, _category(self.parameter_types[node.id])
+
+    def _Constant(self, node):
+        if hasattr(node, "value"):
+            value = node.value
+        else:  # ast.Num and ast.Str before Python 3.8
+            value = node.n if hasattr(node, "n") else node.s
+        if isinstance(value, bool):
+            return ("TRUE" if value else "FALSE"), "boolean"
+        elif value is None:
+            return "NULL", None
+        elif isinstance(value, int):
+            return str(value), "integer"
+        elif isinstance(value, float):
+            if not math.isfinite(value):
+                raise Untranslatable("infinite or NaN literal: %r" % value)
+            return repr(value), "numeric"
+        elif isinstance(value, str):
+            return convert_python_value_to_sql(value), "text"
+        raise Untranslatable("unsupported literal: %r" % value)
+
+    # Before Python 3.8
+    _NameConstant = _Num = _Str = _Constant
+
+    def _BinOp(self, node):
+        if isinstance(node.op, ast.Mod) and literal_string(node.left) is not None:
+            return self._percent_format(node)
+        left, left_category = self.expression(node.left)
+        right, right_category = self.expression(node.right)
+        categories = {left_category, right_category}
+        if isinstance(node.op, ast.Add) and categories == {"text"}:
+            return "(%s || %s)" % (left, right), "text"
+        elif isinstance(node.op, ast.Mult) and (left_category, right_category) == ("text", "integer"):
+            return "repeat(%s, %s)" % (left, right), "text"
+        elif not categories <= {"integer", "numeric"}:
+            raise Untranslatable("arithmetic on non-numeric values")
+        category = "integer" if categories == {"integer"} else "numeric"
+        if type(node.op) in _arithmetic:
+            return "(%s %s %s)" % (left, _arithmetic[type(node.op)], right), category
+        elif isinstance(node.op, ast.Div):
+            return "(%s::numeric / %s)" % (left, right), "numeric"
+        elif isinstance(node.op, ast.FloorDiv) and category == "integer":
+            return "floor(%s::numeric / %s)::bigint" % (left, right), "integer"
+        elif isinstance(node.op, ast.Pow):
+            return "power(%s, %s)" % (left, right), "numeric"
+        raise Untranslatable("unsupported operator: %s" % type(node.op).__name__)
+
+    def _UnaryOp(self, node):
+        operand, category = self.expression(node.operand)
+        if isinstance(node.op, ast.Not) and category == "boolean":
+            return "(NOT %s)" % operand, "boolean"
+        elif isinstance(node.op, (ast.USub, ast.UAdd)) and category in ("integer", "numeric"):
+            return "(%s%s)" % ("-" if isinstance(node.op, ast.USub) else "+", operand), category
+        raise Untranslatable("unsupported unary operator: %s" % type(node.op).__name__)
+
+    def _BoolOp(self, node):
+        # Python's and/or return an operand, which is only the same thing as SQL's for booleans
+        operands = [self.condition(value) for value in node.values]
+        operator = " AND " if isinstance(node.op, ast.And) else " OR "
+        return "(%s)" % operator.join(operands), "boolean"
+
+    def _Compare(self, node):
+        parts = []
+        left = node.left
+        for operator, right in zip(node.ops, node.comparators):
+            parts.append(self._comparison(left, operator, right))
+            left = right
+        return (parts[0] if len(parts) == 1 else "(%s)" % " AND ".join(parts)), "boolean"
+
+    def _comparison(self, left, operator, right):
+        if isinstance(operator, (ast.Is, ast.IsNot)):
+            if self.expression(right)[0] != "NULL":
+                raise Untranslatable("is only translates when comparing with None")
+            return "(%s IS %sNULL)" % (self.expression(left)[0], "NOT " if isinstance(operator, ast.IsNot) else "")
+        elif isinstance(operator, (ast.In, ast.NotIn)) and isinstance(right, (ast.Tuple, ast.List)):
+            values = ", ".join(self.expression(value)[0] for value in right.elts)
+            return "(%s %sIN (%s))" % (self.expression(left)[0], "NOT " if isinstance(operator, ast.NotIn) else "",
+                                       values)
+        elif type(operator) in _comparisons:
+            (left_sql, left_category), (right_sql, right_category) = self.expression(left), self.expression(right)
+            if "NULL" in (left_sql, right_sql):
+                raise Untranslatable("comparing with None needs is or is not")
+            if isinstance(operator, _orderings) and "text" in (left_category, right_category):
+                raise Untranslatable("text orders by code point in Python and by collation in SQL")
+            return "(%s %s %s)" % (left_sql, _comparisons[type(operator)], right_sql)
+        raise Untranslatable("unsupported comparison: %s" % type(operator).__name__)
+
+    def _IfExp(self, node):
+        then, category = self.expression(node.body)
+        otherwise = self.expression(node.orelse)[0]
+        return "CASE WHEN %s THEN %s ELSE %s END" % (self.condition(node.test), then, otherwise), category
+
+    def _Call(self, node):
+        if node.keywords:
+            raise Untranslatable("keyword arguments")
+        if isinstance(node.func, ast.Attribute):
+            return self._method(node.func.value, node.func.attr, node.args)
+        if not isinstance(node.func, ast.Name):
+            raise Untranslatable("unsupported call")
+        arguments = [self.expression(argument) for argument in node.args]
+        name = node.func.id
+        if name == "abs" and len(arguments) == 1 and arguments[0][1] in ("integer", "numeric"):
+            return "abs(%s)" % arguments[0][0], arguments[0][1]
+        elif name in ("min", "max") and len(arguments) > 1:
+            categories = {category for _, category in arguments}
+            if len(categories) > 1 and not categories <= {"integer", "numeric"}:
+                raise Untranslatable("%s of mixed types" % name)
+            if "text" in categories:
+                raise Untranslatable("text orders by code point in Python and by collation in SQL")
+            category = categories.pop() if len(categories) == 1 else "numeric"
+            function = "LEAST" if name == "min" else "GREATEST"
+            return "%s(%s)" % (function, ", ".join(sql for sql, _ in arguments)), category
+        elif name == "len" and len(arguments) == 1 and arguments[0][1] == "text":
+            return "length(%s)" % arguments[0][0], "integer"
+        elif name == "str" and len(arguments) == 1 and arguments[0][1] in ("text", "integer"):
+            return "%s::text" % arguments[0][0], "text"
+        elif name == "float" and len(arguments) == 1 and arguments[0][1] in ("integer", "numeric"):
+            return "%s::double precision" % arguments[0][0], "numeric"
+        raise Untranslatable("unsupported call: %s" % name)
+
+    def _method(self, value, name, arguments):
+        value, category = self.expression(value)
+        arguments = [self.expression(argument) for argument in arguments]
+        if category != "text" or any(argument_category != "text" for _, argument_category in arguments):
+            raise Untranslatable("unsupported method: %s" % name)
+        arguments = [sql for sql, _ in arguments]
+        if name in _trim_functions and len(arguments) == 1:
+            return "%s(%s, %s)" % (_trim_functions[name], value, arguments[0]), "text"
+        elif name == "startswith" and len(arguments) == 1:
+            return "(left(%s, length(%s)) = %s)" % (value, arguments[0], arguments[0]), "boolean"
+        elif name == "endswith" and len(arguments) == 1:
+            return "(right(%s, length(%s)) = %s)" % (value, arguments[0], arguments[0]), "boolean"
+        elif name == "replace" and len(arguments) == 2:
+            return "replace(%s, %s, %s)" % (value, arguments[0], arguments[1]), "text"
+        raise Untranslatable("unsupported method: %s" % name)
+
+    def _formatted(self, node):
+        # None formats as 'None' in Python, the coalesce keeps it that way rather than nulling the whole string
+        sql, category = self.expression(node)
+        if category == "text":
+            return sql if literal_string(node) is not None else "coalesce(%s, 'None')" % sql
+        elif category == "integer":
+            return "coalesce(%s::text, 'None')" % sql
+        raise Untranslatable("only text and integers format the same way in Python and SQL")
+
+    def _concatenate(self, parts):
+        parts = [part for part in parts if part != "''"]
+        return ("(%s)" % " || ".join(parts) if parts else "''"), "text"
+
+    def _percent_format(self, node):
+        template = literal_string(node.left)
+        values = node.right.elts if isinstance(node.right, ast.Tuple) else [node.right]
+        pieces = template.replace("%%", "\0").split("%")
+        if any(not piece.startswith(("s", "d")) for piece in pieces[1:]) or len(pieces) - 1 != len(values):
+            raise Untranslatable("only %s and %d placeholders translate")
+        parts = [convert_python_value_to_sql(pieces[0].replace("\0", "%"))]
+        for piece, value in zip(pieces[1:], values):
+            if piece[0] == "d" and self.expression(value)[1] != "integer":
+                raise Untranslatable("%d of a non-integer")
+            parts.append(self._formatted(value))
+            parts.append(convert_python_value_to_sql(piece[1:].replace("\0", "%")))
+        return self._concatenate(parts)
+
+    def _JoinedStr(self, node):
+        parts = []
+        for value in node.values:
+            if isinstance(value, ast.FormattedValue):
+                if value.conversion not in (-1, None) or value.format_spec is not None:
+                    raise Untranslatable("f-string conversions and format specs")
+                parts.append(self._formatted(value.value))
+            else:
+                parts.append(self.expression(value)[0])
+        return self._concatenate(parts)
+
+
+def _without_docstring(statements):
+    first = statements[0] if statements else None
+    if isinstance(first, ast.Expr) and literal_string(first.value) is not None:
+        return statements[1:]
+    return statements
+
+
+def translate(code, parameter_types, return_type):
+    """A LANGUAGE sql body equivalent to the plpython body code, or None when it isn't in the supported subset.
+
+    parameter_types maps each parameter name to its SQL type, the result is cast to return_type.
+    """
+    try:
+        expression = _Translator(parameter_types).statements(_without_docstring(parse_body(code)))
+    except Untranslatable:
+        return None
+    return "SELECT CAST(%s AS %s)" % (expression, return_type)
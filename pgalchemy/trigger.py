@@ -2,8 +2,8 @@ import inspect
 from typing import Union, Sequence
 
 from abc import ABC, abstractmethod
-from .util import get_condition_text, get_name, sanitize_name
-from .types import FluentClauseContainer, DependentCreatable
+from .util import get_condition_text, get_name, get_table_name, sanitize_name
+from .types import FluentClauseContainer, DependentCreatable, cached_statement
 
 
 class TriggerClause(object):
@@ -47,11 +47,12 @@ class TriggerEvent(TriggerClause):
 
 
 class BaseTrigger(FluentClauseContainer, DependentCreatable):
+    _object_kind = "trigger"
     _valid_execution_times = {"BEFORE", "AFTER", "INSTEAD OF"}
     _valid_defers = {"NOT DEFERRABLE", "DEFERRABLE INITIALLY IMMEDIATE", "DEFERRABLE INITIALLY DEFERRED"}
     _valid_cardinalities = {"FOR EACH ROW", "FOR EACH STATEMENT"}
     _sql_create_template = """
-        CREATE {constraint} TRIGGER {name} {execution_time} {event} on {selectable}
+        CREATE {replace}{constraint}TRIGGER {name} {execution_time} {event} on {selectable}
         {from_table}
         {defer}
         {cardinality}
@@ -65,6 +66,9 @@ class BaseTrigger(FluentClauseContainer, DependentCreatable):
 
     def __init__(self, f, name=None, execution_time="AFTER", event="INSERT", selectable='',
                  from_table='', defer="NOT DEFERRABLE", cardinality="ROW", condition='', arguments=''):
+        if isinstance(f, str):
+            # Trigger("name") declares a named trigger whose function is supplied later in the fluent chain
+            name, f = name or f, None
         self._execution_time = None
         self._function = None
         self._event = []
@@ -84,50 +88,61 @@ class BaseTrigger(FluentClauseContainer, DependentCreatable):
         self._set_condition(condition)
         self._set_arguments(arguments)
         self._set_constraint()
-        self._name = name or "trigger_%s" % f.__name__
+        self._name = name or "trigger_%s" % self._function_name
 
     def __call__(self, f):
         self._set_function(f)
         return f
 
     @property
-    def _create_statement(self):
+    def _function_name(self):
+        f = self._function
+        return getattr(f, "__name__", f)
+
+    def _trigger_statement(self, replace):
         bind_params = []
         if not self._function:
             raise RuntimeError("No function has been specified for this trigger to execute")
         event = " OR ".join(self._event)
-        if self._name:
-            name = '"%s"'
-            bind_params.append(sanitize_name(self._name))
-        if self._selectable:
-            selectable = get_name(self._selectable)
-        if self._from_table:
-            from_table = '"%s"'
-            bind_params.append(get_name(self._from_table))
-        if self._function:
-            function = '"%s"'
-            bind_params.append(sanitize_name(self._function))
+        name = '"%s"' % sanitize_name(self._name)
+        selectable = get_table_name(self._selectable) if self._selectable is not None else ''
+        from_table = "FROM %s" % get_table_name(self._from_table) if self._from_table is not None else ''
+        function = '"%s"' % sanitize_name(self._function_name)
+        arguments = ''
         if self._arguments:
             arguments = ", ".join('%s' for _ in self._arguments)
             bind_params.extend(self._arguments)
-        statement = self._sql_create_template.format(name=name, constraint=self._constraint,
+        condition = "WHEN (%s)" % self._condition if self._condition else ''
+        defer = self._defer if self._constraint else ''  # Only constraint triggers accept a deferral clause
+        statement = self._sql_create_template.format(replace="OR REPLACE " if replace else "", name=name,
+                                                     constraint=self._constraint + " " if self._constraint else "",
                                                      execution_time=self._execution_time, event=event,
                                                      selectable=selectable, from_table=from_table,
-                                                     deferr=self._defer, cardinality=self._cardinality,
-                                                     condition=self._condition, function=function,
+                                                     defer=defer, cardinality=self._cardinality,
+                                                     condition=condition, function=function,
                                                      arguments=arguments)
         return statement, bind_params
 
-    @property
+    @cached_statement
+    def _create_statement(self):
+        return self._trigger_statement(replace=False)
+
+    @cached_statement
+    def _replace_statement(self):
+        return self._trigger_statement(replace=True)
+
+    def _replace_statements(self, server_version=None):
+        # CREATE OR REPLACE TRIGGER arrived in Postgres 14 and doesn't cover constraint triggers, anywhere else the
+        # trigger has to be dropped and recreated, which is only safe inside a single transaction
+        if not self._constraint and server_version is not None and server_version >= (14,):
+            return [self._replace_statement]
+        return [self._drop_statement, self._create_statement]
+
+    @cached_statement
     def _drop_statement(self):
-        bind_params = []
-        if self._name:
-            name = '"%s"'
-            bind_params.append(self.name)
-        if self._selectable:
-            selectable = get_name(self._selectable)
-        statement = self._sql_drop_template.format(name=name, selectable=selectable)
-        return statement
+        name = '"%s"' % sanitize_name(self._name)
+        selectable = get_table_name(self._selectable) if self._selectable is not None else ''
+        return self._sql_drop_template.format(name=name, selectable=selectable)
 
     def _set_function(self, f):
         if f:
@@ -159,16 +174,21 @@ class BaseTrigger(FluentClauseContainer, DependentCreatable):
         elif isinstance(event, str):
             if event not in self._event:
                 self._event.append(event)
+                self._invalidate()
         elif isinstance(event, Sequence):
             self._event = list(event)
 
     def _set_selectable(self, selectable):
-        if hasattr(selectable, "__table__"):
+        if isinstance(selectable, str) and not selectable:
+            selectable = None
+        elif hasattr(selectable, "__table__"):
             selectable = selectable.__table__
         self._selectable = selectable
 
     def _set_from_table(self, from_table):
-        if hasattr(from_table, "__table__"):
+        if isinstance(from_table, str) and not from_table:
+            from_table = None
+        elif hasattr(from_table, "__table__"):
             from_table = from_table.__table__
         self._from_table = from_table
 
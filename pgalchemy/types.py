@@ -1,5 +1,10 @@
+import hashlib
+from functools import wraps
 from typing import Sequence
 
+from .instrumentation import instrumented, instrumented_async
+from .util import execute_async, server_version, split_statement
+
 
 class PostgresOption(object):
     """Base class for Postgres command options."""
@@ -14,17 +19,89 @@ class FluentClauseContainer(object):
         raise AttributeError("%r object has no attribute %r" % (self.__class__, attr))
 
 
-class Creatable(object):
+def cached_statement(f):
+    """Property that compiles a statement once and reuses it until the owning object is modified."""
+    key = f.__name__
+
+    @wraps(f)
+    def get_statement(self):
+        cache = vars(self).get("_statement_cache")
+        if cache is None:
+            cache = {}
+            setattr(self, "_statement_cache", cache)
+        if key not in cache:
+            cache[key] = f(self)
+        return cache[key]
+
+    return property(get_statement)
+
+
+def fingerprint_statement(statement):
+    if isinstance(statement, tuple):
+        sql, params = statement
+        statement = "%s\0%s" % (sql, "\0".join(str(p) for p in params))
+    return hashlib.sha1(statement.encode("utf-8")).hexdigest()
+
+
+class CachedStatements(object):
+    """Memoizes generated statements; any attribute assignment drops them, in-place changes must call _invalidate."""
+    _statement_cache = None
+    _cache_neutral_attributes = {"_statement_cache", "_current_clause", "_last_option"}
+
+    def __setattr__(self, name, value):
+        object.__setattr__(self, name, value)
+        if name not in self._cache_neutral_attributes:
+            self._invalidate()
+
+    def _invalidate(self):
+        self.__dict__.pop("_statement_cache", None)
+
+    @property
+    def _fingerprint_statement(self):
+        return self._create_statement
+
+    @cached_statement
+    def _fingerprint(self):
+        """Stable hash of the generated DDL, which only changes when the object's definition does."""
+        return fingerprint_statement(self._fingerprint_statement)
+
+
+class Creatable(CachedStatements):
+    _object_kind = None
 
     def _create(self, connection):
         statement = self._create_statement
         if connection:
-            connection.execute(statement)
+            instrumented(connection, self._object_kind, self, statement, connection.execute, statement)
 
     def _drop(self, connection):
         statement = self._drop_statement
         if connection:
-            connection.execute(statement)
+            instrumented(connection, self._object_kind, self, statement, connection.execute, statement)
+
+    def _replace_statements(self, server_version=None):
+        return [self._drop_statement, self._create_statement]
+
+    def _replace(self, connection):
+        """Swap in the current definition of an existing object without a window where it is missing."""
+        from .deploy import execute, transaction
+        statements = self._replace_statements(server_version(connection))
+        with transaction(connection) as conn:
+            for statement in statements:
+                sql, params = split_statement(statement)
+                instrumented(conn, self._object_kind, self, sql, execute, conn, sql, params)
+
+    async def _create_async(self, connection):
+        statement = self._create_statement
+        if connection:
+            await instrumented_async(connection, self._object_kind, self, statement, execute_async, connection,
+                                     statement)
+
+    async def _drop_async(self, connection):
+        statement = self._drop_statement
+        if connection:
+            await instrumented_async(connection, self._object_kind, self, statement, execute_async, connection,
+                                     statement)
 
     @property
     def _create_statement(self):
@@ -42,6 +119,7 @@ class DependentCreatable(Creatable):
 class ValueSetter(object):
     @staticmethod
     def set(container: list, value):
+        # Mutates in place, so callers that cache statements need to _invalidate afterwards
         if value:
             if isinstance(value, (str, PostgresOption)):
                 if value not in container:
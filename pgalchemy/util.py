@@ -1,19 +1,23 @@
 import re
+import sys
 from typing import Sequence
 from datetime import date, datetime, time
-try:
-    from sqlalchemy import Column
-    from sqlalchemy.sql.elements import ClauseList
-    from sqlalchemy.orm.attributes import InstrumentedAttribute
-except ImportError:
-    class _Stub(object): pass
-    Column = ClauseList = InstrumentedAttribute = _Stub
+
+
+class _NotLoaded(object):
+    pass
+
+
+def _sqlalchemy_class(module_name, class_name):
+    # SQLAlchemy is never imported here: until the caller has loaded it, no object can be an instance of its classes
+    module = sys.modules.get(module_name)
+    return getattr(module, class_name, _NotLoaded) if module is not None else _NotLoaded
 
 
 def get_name(e):
-    if isinstance(e, Column):
+    if isinstance(e, _sqlalchemy_class("sqlalchemy.sql.schema", "Column")):
         name = "%s.%s" % (e.table.name, e.name)
-    elif isinstance(e, InstrumentedAttribute):
+    elif isinstance(e, _sqlalchemy_class("sqlalchemy.orm.attributes", "InstrumentedAttribute")):
         column = e.prop.columns[0]  # Need the underlying database table column
         name = "%s.%s" % (column.table.name, column.name)
     elif hasattr(e, "__table__"):
@@ -25,12 +29,39 @@ def get_name(e):
     return name
 
 
+def get_table_name(t):
+    if hasattr(t, "__table__"):
+        t = t.__table__
+    if hasattr(t, "name"):
+        name = t.name
+        schema = getattr(t, "schema", None)
+        if schema:
+            name = "%s.%s" % (schema, name)
+    else:
+        name = sanitize_name(t)
+    return name
+
+
+def get_role_name(r):
+    if hasattr(r, "name"):
+        return r.name
+    return sanitize_name(r)
+
+
 def get_condition_text(condition):
-    if isinstance(condition, ClauseList):
-        condition = condition.compile(compile_kwargs={"literal_binds": True})
+    if isinstance(condition, _sqlalchemy_class("sqlalchemy.sql.elements", "ClauseElement")):
+        condition = str(condition.compile(compile_kwargs={"literal_binds": True}))
     return condition
 
 
+def literal_string(node):
+    """The value of an ast node that is a string literal, otherwise None."""
+    value = getattr(node, "value", None)
+    if value is None:
+        value = getattr(node, "s", None)  # ast.Str before Python 3.8
+    return value if isinstance(value, str) else None
+
+
 def sanitize_name(name):
     return name.replace('"', '""')
 
@@ -65,3 +96,74 @@ _all_cap_re = re.compile('([a-z0-9])([A-Z])')
 def camelcase_to_underscore(name):
     s1 = _first_cap_re.sub(r'\1_\2', name)
     return _all_cap_re.sub(r'\1_\2', s1).lower()
+
+
+# DDL that could not be executed immediately because no connection was supplied, keyed by the point in the
+# metadata lifecycle at which it should run.
+_deferred_ddl = {"before_create": [], "after_create": [], "before_drop": []}
+
+
+def _defer(event, statement):
+    _deferred_ddl[event].append(statement)
+
+
+def before_create(statement):
+    _defer("before_create", statement)
+
+
+def after_create(statement):
+    _defer("after_create", statement)
+
+
+def before_drop(statement):
+    _defer("before_drop", statement)
+
+
+def pop_deferred_ddl(event):
+    statements = list(_deferred_ddl[event])
+    del _deferred_ddl[event][:]
+    return statements
+
+
+def split_statement(statement):
+    """Normalize a statement to a (sql, bind_params) pair; triggers already generate statements in that form."""
+    if isinstance(statement, tuple):
+        sql, params = statement
+        return sql.strip(), list(params)
+    return str(statement).strip(), []
+
+
+def is_postgres(connection):
+    dialect = getattr(connection, "dialect", None)
+    return dialect is not None and dialect.name in ("postgresql", "postgres")
+
+
+def server_version(connection):
+    """The server version as a tuple like (14, 2), when the connection already knows it, otherwise None."""
+    version = getattr(getattr(connection, "dialect", None), "server_version_info", None)  # SQLAlchemy
+    if version is None and hasattr(connection, "get_server_version"):  # asyncpg
+        version = connection.get_server_version()
+    return tuple(version) if version else None
+
+
+def execute_if_postgres(connection, statement):
+    if is_postgres(connection):
+        return connection.execute(statement)
+
+
+def _numbered_placeholders(sql):
+    """asyncpg uses $1, $2... instead of the %s placeholders statements are generated with."""
+    parts = sql.split("%s")
+    return "".join(part + ("$%s" % i if i < len(parts) else "") for i, part in enumerate(parts, 1))
+
+
+async def execute_async(connection, statement):
+    """Execute a statement on a SQLAlchemy AsyncConnection or an asyncpg style connection."""
+    sql, params = split_statement(statement)
+    if hasattr(connection, "exec_driver_sql"):
+        result = connection.exec_driver_sql(sql, tuple(params)) if params else connection.exec_driver_sql(sql)
+    else:
+        result = connection.execute(_numbered_placeholders(sql), *params) if params else connection.execute(sql)
+    if hasattr(result, "__await__"):
+        result = await result
+    return result
@@ -0,0 +1,81 @@
+from contextlib import contextmanager
+
+
+class MockDialect(object):
+    name = "postgresql"
+
+
+class MockTransaction(object):
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __enter__(self):
+        self.connection.transactions += 1
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+class MockConnection(object):
+    """Stands in for a SQLAlchemy connection, recording statements instead of sending them to a server."""
+    dialect = MockDialect()
+
+    def __init__(self):
+        self.executed = []
+        self.transactions = 0
+
+    def begin(self):
+        return MockTransaction(self)
+
+    def execute(self, statement, *params):
+        self.executed.append((str(statement), list(params[0]) if params else []))
+
+
+class MockEngine(object):
+    """Stands in for a SQLAlchemy engine, handing out a fresh MockConnection for every transaction."""
+    dialect = MockDialect()
+
+    def __init__(self):
+        self.connections = []
+
+    def raw_connection(self):
+        raise NotImplementedError("MockEngine does not provide DBAPI connections")
+
+    def connect(self):
+        connection = MockConnection()
+        connection.engine = self
+        self.connections.append(connection)
+        return connection
+
+    @contextmanager
+    def begin(self):
+        connection = self.connect()
+        with connection.begin():
+            yield connection
+
+
+class MockAsyncTransaction(object):
+    def __init__(self, connection):
+        self.connection = connection
+
+    async def __aenter__(self):
+        self.connection.transactions += 1
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+class MockAsyncConnection(object):
+    """Stands in for an asyncpg connection, recording statements instead of sending them to a server."""
+
+    def __init__(self):
+        self.executed = []
+        self.transactions = 0
+
+    def transaction(self):
+        return MockAsyncTransaction(self)
+
+    async def execute(self, statement, *params):
+        self.executed.append((statement, list(params)))
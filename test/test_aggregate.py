@@ -0,0 +1,118 @@
+import pytest
+from pgalchemy.aggregate import Aggregate
+from pgalchemy.core import PostgresAlchemy
+from pgalchemy.emulator import Session
+from pgalchemy.function import FunctionGenerator
+from .mocks import MockConnection
+from .config import *
+
+
+class WeightedMean:
+    @staticmethod
+    def step(state, value: float, weight: float = 1.0):
+        total, weights = state or (0.0, 0.0)
+        return total + value * weight, weights + weight
+
+    @staticmethod
+    def combine(a, b):
+        return a[0] + b[0], a[1] + b[1]
+
+    @staticmethod
+    def final(state) -> float:
+        return state[0] / state[1] if state else None
+
+    @staticmethod
+    def serialize(state) -> bytes:
+        import struct
+        return struct.pack("dd", *state)
+
+    @staticmethod
+    def deserialize(data: bytes):
+        import struct
+        return struct.unpack("dd", data)
+
+
+class Sequential:
+    @classmethod
+    def step(cls, state, value: int):
+        return (state or 0) + value
+
+    @classmethod
+    def serialize(cls, state) -> bytes:
+        return str(state).encode()
+
+    @classmethod
+    def deserialize(cls, data: bytes):
+        return int(data)
+
+
+def test_aggregate_statement():
+    aggregate = Aggregate("total", ["int"], "bigint", "int8pl", combine="int8pl", initial_condition=0, parallel="safe")
+    assert " ".join(aggregate._create_statement.split()) == \
+        "CREATE AGGREGATE total (int) ( SFUNC = int8pl, STYPE = bigint, COMBINEFUNC = int8pl, INITCOND = '0', " \
+        "PARALLEL = SAFE )"
+    assert aggregate._drop_statement.strip() == "DROP AGGREGATE IF EXISTS total (int)"
+
+
+def test_aggregate_from_class():
+    aggregate = FunctionGenerator.aggregate_from_class(WeightedMean)
+    assert aggregate.name == "weighted_mean" and aggregate.arguments == ["numeric", "numeric"]
+    statement = " ".join(aggregate._create_statement.split())
+    assert statement == "CREATE AGGREGATE weighted_mean (numeric, numeric) ( SFUNC = weighted_mean_transition, " \
+                        "STYPE = bytea, FINALFUNC = weighted_mean_final, COMBINEFUNC = weighted_mean_combine, " \
+                        "PARALLEL = SAFE )"
+    transition, combine, final = aggregate.functions
+    assert transition.parameters == ["state bytea", "value numeric", "weight numeric"]
+    assert combine.parameters == ["a bytea", "b bytea"] and final.return_type == "numeric"
+    assert "STABLE PARALLEL SAFE" in combine._create_statement
+
+
+def test_aggregate_without_combine_is_not_parallel():
+    aggregate = FunctionGenerator.aggregate_from_class(Sequential, name="running")
+    assert [f.name for f in aggregate.functions] == ["running_transition"]
+    assert "PARALLEL" not in aggregate._create_statement
+
+
+def test_aggregate_methods_must_be_static():
+    class Broken:
+        def step(self, state, value: int):
+            return value
+
+    with pytest.raises(ValueError):
+        FunctionGenerator.aggregate_from_class(Broken)
+
+
+def test_parallel_aggregation_in_emulator():
+    aggregate = FunctionGenerator.aggregate_from_class(WeightedMean)
+    session = Session()
+    transition, combine, final = (session.function(f) for f in aggregate.functions)
+    first = second = None
+    for value in (1.0, 2.0):
+        first = transition(first, value, 1.0)
+    second = transition(second, 6.0, 2.0)
+    assert final(combine(first, second)) == (1.0 + 2.0 + 6.0 * 2.0) / 4.0
+    assert combine(None, second) == second
+    assert final(None) is None
+    key, = session.GD
+    assert key.startswith("aggregate_weighted_mean_")
+
+
+def test_changed_aggregate_class_gets_a_new_cache_key():
+    class Changed(WeightedMean):
+        @staticmethod
+        def final(state) -> float:
+            return state[0] / state[1] * 2 if state else None
+
+    original = FunctionGenerator.aggregate_from_class(WeightedMean).functions[0].code
+    changed = FunctionGenerator.aggregate_from_class(Changed, name="weighted_mean").functions[0].code
+    assert original.split("\n")[0] != changed.split("\n")[0]
+    assert original == FunctionGenerator.aggregate_from_class(WeightedMean).functions[0].code
+
+
+def test_aggregate_registered_after_its_functions():
+    db = PostgresAlchemy()
+    db.aggregate(WeightedMean)
+    connection = MockConnection()
+    db.create_all(connection)
+    statements = " ".join(s for s, _ in connection.executed)
+    assert statements.index("CREATE FUNCTION weighted_mean_final") < statements.index("CREATE AGGREGATE")
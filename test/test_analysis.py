@@ -0,0 +1,79 @@
+import warnings
+import pytest
+import pgalchemy.analysis as a
+import pgalchemy.function as f
+from .config import *
+
+
+def test_pure_body_is_immutable_and_parallel_safe():
+    analysis = a.analyze("""
+        total = 0
+        for value in values:
+            total += abs(value)
+        return total
+    """)
+    assert (analysis.volatility, analysis.parallel) == ("IMMUTABLE", "SAFE")
+    assert analysis.reasons == []
+
+
+def test_read_only_queries_are_stable():
+    analysis = a.analyze("""
+        plan = plpy.prepare("SELECT name FROM test_table WHERE id = $1", ["int"])
+        plpy.notice("looking up")
+        return plpy.execute(plan, [id])[0]["name"]
+    """)
+    assert (analysis.volatility, analysis.parallel) == ("STABLE", "RESTRICTED")
+
+
+def test_writes_are_volatile_and_parallel_unsafe():
+    for body in ('plpy.execute("UPDATE test_table SET name = 1")', "plpy.execute(sql)",
+                 'plpy.execute("SELECT * FROM test_table FOR UPDATE")', "plpy.commit()",
+                 'plpy.execute("WITH d AS (DELETE FROM test_table RETURNING *) SELECT count(*) FROM d")',
+                 'plpy.execute("SELECT nextval(\'test_seq\')")', 'plpy.execute("select setval(\'test_seq\', 1)")',
+                 "global counter\ncounter = 1", "import subprocess", "open('/tmp/x').read()"):
+        analysis = a.analyze(body)
+        assert (analysis.volatility, analysis.parallel) == ("VOLATILE", "UNSAFE"), body
+
+
+def test_randomness_time_and_session_state_are_volatile():
+    for body in ("import random\nreturn random.random()", "return time.time()", "return datetime.datetime.now()",
+                 "SD['count'] = SD.get('count', 0) + 1", "GD.setdefault('x', 1)"):
+        analysis = a.analyze(body)
+        assert (analysis.volatility, analysis.parallel) == ("VOLATILE", "RESTRICTED"), body
+    assert a.analyze("return SD.get('plan')").volatility == "STABLE"
+
+
+@f.function_options(infer=True)
+def inferred(a: int) -> int:
+    return a * 2
+
+
+@f.function_options(infer=True, volatility="STABLE")
+def inferred_parallel_only(a: int) -> int:
+    return a * 2
+
+
+def test_from_function_infers_attributes():
+    function = f.FunctionGenerator.from_function(inferred)
+    assert (function.volatility, function.parallel) == ("IMMUTABLE", "SAFE")
+    function = f.FunctionGenerator.from_function(inferred_parallel_only)
+    assert (function.volatility, function.parallel) == ("STABLE", "SAFE")
+
+
+@f.function_options(volatility="IMMUTABLE", parallel="SAFE")
+def falsely_immutable(a: int) -> int:
+    import random
+    return random.randint(0, a)
+
+
+def test_unsafe_declaration_warns():
+    with pytest.warns(a.FunctionAttributeWarning) as record:
+        f.FunctionGenerator.from_function(falsely_immutable)
+    assert len(record) == 2
+    assert "declared IMMUTABLE but its body is at most VOLATILE" in str(record[0].message)
+
+
+def test_safe_declaration_does_not_warn():
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        f.FunctionGenerator.from_function(inferred, volatility="IMMUTABLE", parallel="SAFE")
@@ -0,0 +1,52 @@
+import asyncio
+from pgalchemy import privilege as p
+from pgalchemy.core import PostgresAlchemy
+from pgalchemy.role import Role
+from pgalchemy.trigger import Trigger
+from .mocks import MockAsyncConnection
+from .config import *
+
+
+def run(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+def test_create_and_drop_async():
+    connection = MockAsyncConnection()
+    role = Role("nathan")
+    run(role._create_async(connection))
+    run(role._drop_async(connection))
+    assert [s.strip() for s, _ in connection.executed] == ["CREATE ROLE nathan", "DROP ROLE IF EXISTS nathan"]
+
+
+def test_trigger_parameters_use_numbered_placeholders():
+    connection = MockAsyncConnection()
+    trigger = Trigger("test")
+    trigger.before.insert.on(test_table).for_each.row.with_arguments("a", "b")(example_9)
+    run(trigger._create_async(connection))
+    statement, params = connection.executed[0]
+    assert statement.strip().endswith('EXECUTE PROCEDURE "example_9" ($1, $2)')
+    assert params == ["a", "b"]
+
+
+def test_grant_and_revoke_async():
+    connection = MockAsyncConnection()
+    privilege = p.Privilege().select.on.table(test_table).to("nathan")
+    run(p.grant_async(privilege, connection=connection))
+    run(p.revoke_async(privilege, connection=connection))
+    assert [s.split()[0] for s, _ in connection.executed] == ["GRANT", "REVOKE"]
+
+
+def test_create_all_async():
+    connection = MockAsyncConnection()
+    registry = PostgresAlchemy(connection)
+    registry.role("nathan")
+    registry.grant().select.on.table(test_table).to("nathan")
+    run(registry.create_all_async())
+    assert connection.transactions == 1
+    assert len(connection.executed) == 1
+    assert connection.executed[0][0].startswith("CREATE ROLE nathan")
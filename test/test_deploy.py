@@ -0,0 +1,86 @@
+import pytest
+import pgalchemy.function as f
+from pgalchemy import deploy as d
+from pgalchemy.core import PostgresAlchemy
+from pgalchemy.policy import Policy
+from pgalchemy.privilege import Privilege
+from pgalchemy.role import Role
+from pgalchemy.trigger import Trigger
+from .mocks import MockConnection, MockEngine
+from .config import *
+
+
+def test_dependency_graph_levels():
+    role = Role("nathan")
+    policy = Policy("test").on(test_table).for_.all.to("nathan")
+    privilege = Privilege().select.on.table(test_table).to("nathan")
+    graph = d.DependencyGraph([privilege, policy, test_table, role])
+    levels = [[node.kind for node in level] for level in graph.levels()]
+    assert levels == [["table", "role"], ["privilege", "policy"]]
+
+
+def test_dependency_graph_trigger_after_function():
+    function = f.FunctionGenerator.from_function(example_7)
+    trigger = Trigger("test")
+    trigger.after.insert.on(test_table).for_each.row(example_7)
+    graph = d.DependencyGraph([trigger, function])
+    assert [node.kind for node in graph.ordered()] == ["function", "trigger"]
+    assert [node.kind for node in graph.ordered(drop=True)] == ["trigger", "function"]
+
+
+def test_dependency_graph_role_membership():
+    graph = d.DependencyGraph([Role("admin").in_role("staff"), Role("staff")])
+    assert [node.name for node in graph.ordered()] == ["staff", "admin"]
+
+
+def test_dependency_graph_cycle():
+    graph = d.DependencyGraph([Role("a").in_role("b"), Role("b").in_role("a")])
+    with pytest.raises(ValueError):
+        graph.levels()
+
+
+def test_batch_statements():
+    statements = [("a", []), ("b", []), ("c", ["x"]), ("d", []), ("e", []), ("f", [])]
+    batches = list(d.batch_statements(statements, max_statements=2))
+    assert batches == [("a;\nb", []), ("c", ["x"]), ("d;\ne", []), ("f", [])]
+
+
+def test_create_all_single_transaction():
+    connection = MockConnection()
+    registry = PostgresAlchemy(connection)
+    registry.role("nathan").login
+    registry.table(test_table)
+    registry.policy("test").on(test_table).for_.select.to("nathan")
+    registry.grant().select.on.table(test_table).to("nathan")
+    registry.create_all()
+    assert connection.transactions == 1
+    assert len(connection.executed) == 1
+    statements = connection.executed[0][0].split(";\n")
+    assert statements[0].startswith("CREATE ROLE nathan")
+    assert statements[1].startswith("CREATE TABLE test_table")
+    assert statements[2].startswith("CREATE POLICY test")
+    assert statements[3].startswith("GRANT SELECT")
+
+
+def test_waves_group_by_table():
+    other_table = Table("other_table", metadata, Column("id", Integer, primary_key=True), extend_existing=True)
+    policies = [Policy("a").on(test_table), Policy("b").on(other_table), Policy("c").on(test_table)]
+    graph = d.DependencyGraph(policies + [Role("x"), Role("y")])
+    waves = graph.waves(workers=2)
+    assert len(waves) == 1
+    units = [[node.object._name if node.kind == "policy" else node.name for node in unit] for unit in waves[0]]
+    assert units == [["a", "c", "y"], ["b", "x"]]
+
+
+def test_parallel_deploy():
+    engine = MockEngine()
+    roles = [Role("role_%s" % i) for i in range(10)]
+    d.parallel_deploy(roles + [Policy("test").on(test_table).for_.all.to("role_1")], engine, workers=3)
+    assert len(engine.connections) == 4
+    assert all(connection.transactions == 1 for connection in engine.connections)
+    assert engine.connections[-1].executed[0][0].startswith("CREATE POLICY test")
+
+
+def test_parallel_deploy_requires_engine():
+    with pytest.raises(ValueError):
+        d.parallel_deploy([Role("nathan")], MockConnection())
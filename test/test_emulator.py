@@ -0,0 +1,106 @@
+import pytest
+from pgalchemy.emulator import Plpy, Session, SPIError
+from pgalchemy.function import Function, function_options
+from pgalchemy.trigger import Trigger
+from .config import *
+
+
+def users(sql, args, limit):
+    return [{"id": 1, "name": "nathan"}, {"id": 2, "name": "ada"}]
+
+
+def count_users(minimum: int) -> int:
+    rows = plpy.execute("SELECT id FROM users WHERE id >= %s" % minimum)
+    return len(rows)
+
+
+@function_options(cache_plans=True)
+def user_name(user_id: int) -> str:
+    rows = plpy.execute("SELECT name FROM users WHERE id = %s" % user_id)
+    return rows[0]["name"]
+
+
+def remember(value: int) -> int:
+    SD["last"] = SD.get("last", 0) + value
+    GD["total"] = GD.get("total", 0) + value
+    return SD["last"]
+
+
+def upper_name() -> Trigger:
+    if TD["event"] == "INSERT" and TD["new"]["name"]:
+        TD["new"]["name"] = TD["new"]["name"].upper()
+        plpy.notice("changed %s on %s" % (TD["new"]["id"], TD["table_name"]))
+        return "MODIFY"
+    return "OK"
+
+
+def test_function_runs_against_handler():
+    queries = []
+    session = Session(lambda sql, args, limit: queries.append((sql, args)) or users(sql, args, limit))
+    assert session.function(count_users)(1) == 2
+    assert queries == [("SELECT id FROM users WHERE id >= 1", [])]
+    assert session.plpy.calls["execute"] == 1
+
+
+def test_cached_plans_prepare_once():
+    session = Session(users)
+    name = session.function(user_name)
+    assert [name(1), name(2)] == ["nathan", "nathan"]
+    assert session.plpy.calls["prepare"] == 1 and session.plpy.calls["execute"] == 2
+    assert list(session.plpy.queries) == ["SELECT name FROM users WHERE id = $1"]
+
+
+def test_sd_is_per_function_and_gd_is_shared():
+    session = Session()
+    code = 'GD["total"] = GD.get("total", 0) + value\nreturn GD["total"]'
+    first, second = session.function(remember), session.function(Function("other", ["value int"], "int", code))
+    assert first(1) == 1 and first(2) == 3
+    assert second(10) == 13
+    assert first.SD == {"last": 3} and second.SD == {}
+
+
+def test_assigning_a_parameter_fails_like_plpython():
+    with pytest.raises(UnboundLocalError):
+        Session().function(Function("overwrite", ["a int"], "int", "a = a + 1\nreturn a"))(1)
+
+
+def test_set_returning_functions_are_consumed():
+    def numbers(n: int) -> Sequence[int]:
+        for i in range(n):
+            yield i
+
+    assert Session().function(numbers)(3) == [0, 1, 2]
+
+
+def test_trigger_fires_with_td():
+    trigger = Trigger(upper_name, event="INSERT", execution_time="BEFORE", selectable=test_table)
+    session = Session()
+    result, td = session.trigger(upper_name, trigger).fire(new={"id": 1, "name": "nathan"})
+    assert result == "MODIFY" and td["new"]["name"] == "NATHAN"
+    assert (td["when"], td["level"], td["table_name"]) == ("BEFORE", "ROW", "test_table")
+    assert session.plpy.messages == [("notice", "changed 1 on test_table")]
+    assert session.trigger(upper_name)(new={"id": 1, "name": ""}, event="UPDATE") == "OK"
+
+
+def test_plpy():
+    plpy = Plpy()
+    assert plpy.quote_literal("it's") == "'it''s'"
+    assert plpy.quote_nullable(None) == "NULL"
+    assert plpy.quote_ident("id") == "id" and plpy.quote_ident("Name") == '"Name"'
+    with pytest.raises(SPIError):
+        plpy.execute("SELECT $1", [1])
+    with pytest.raises(SPIError):
+        plpy.prepare("SELECT $1", ["int"]).execute([])
+    with pytest.raises(plpy.Error):
+        plpy.error("failed")
+
+
+def test_benchmark():
+    session = Session(users)
+    report = session.function(user_name).benchmark([(1,)] * 11)
+    assert report.calls == 10
+    assert report.plpy_calls_per_call() == {"execute": 1.0}
+    assert report.percentile(95) >= report.percentile(50) > 0
+    assert "plpy.execute: 1.00 per call" in str(report)
+    trigger_report = session.trigger(upper_name).benchmark([{"new": {"id": 1, "name": "a"}}] * 3)
+    assert trigger_report.plpy_calls_per_call() == {"notice": 1.0}
@@ -0,0 +1,41 @@
+from pgalchemy.core import PostgresAlchemy
+from .mocks import MockEngine
+
+
+def test_fan_out_collects_failures():
+    engines = {}
+
+    def engine_factory(url):
+        if url.endswith("broken"):
+            raise RuntimeError("could not connect")
+        engines[url] = MockEngine()
+        return engines[url]
+
+    registry = PostgresAlchemy()
+    registry.role("nathan")
+    urls = ["postgresql:///tenant_%s" % i for i in range(5)] + ["postgresql:///broken"]
+    progress = []
+    results = registry.fan_out(urls, concurrency=2, progress=lambda r, done, total: progress.append((done, total)),
+                               engine_factory=engine_factory)
+    assert list(results) == urls
+    assert [r.succeeded for r in results.values()] == [True] * 5 + [False]
+    assert isinstance(results["postgresql:///broken"].error, RuntimeError)
+    assert sorted(progress) == [(i, 6) for i in range(1, 7)]
+    for url, engine in engines.items():
+        assert engine.connections[0].executed[0][0].startswith("CREATE ROLE nathan")
+
+
+def test_fan_out_passes_keyword_arguments_to_method():
+    engines = []
+
+    def engine_factory(url):
+        engines.append(MockEngine())
+        return engines[-1]
+
+    registry = PostgresAlchemy()
+    registry.role("nathan")
+    registry.role("bob")
+    results = registry.fan_out(["postgresql:///a", "postgresql:///b"], engine_factory=engine_factory,
+                               max_statements=1)
+    assert all(r.succeeded for r in results.values())
+    assert [len(engine.connections[0].executed) for engine in engines] == [2, 2]
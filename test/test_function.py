@@ -1,7 +1,16 @@
+import inspect
+from collections import namedtuple
+from datetime import date
+from typing import Dict, Generator, Iterator, List, NamedTuple, Sequence
 import pytest
 import pgalchemy.function as f
 from .config import *
 
+try:
+    from dataclasses import dataclass
+except ImportError:  # Python 3.6
+    dataclass = None
+
 
 def test_get_function_body_simple():
     body = f.FunctionGenerator.get_function_body(example_1)
@@ -132,6 +141,11 @@ def test_generate_sql_default_value_nodefault():
     assert type_and_default == "boolean"
 
 
+def test_generate_sql_default_value_parameter_without_default():
+    type_and_default = f.FunctionGenerator.generate_sql_default_value("boolean", inspect.Parameter.empty)
+    assert type_and_default == "boolean"
+
+
 def test_generate_sql_default_value_boolean_default():
     type_and_default = f.FunctionGenerator.generate_sql_default_value("boolean", True)
     assert type_and_default == "boolean DEFAULT True"
@@ -157,3 +171,168 @@ def test_generate_procedure_from_function():
 if __name__ == "__main__":
     pass
     # pytest.main()
+
+
+def test_function_planner_attributes():
+    function = f.Function("slugify", ["title text"], "SETOF text", "return [title]", volatility="IMMUTABLE",
+                          parallel="safe", cost=10, rows=1, strict=True, leakproof=True, security_definer=True,
+                          settings={"search_path": ["pg_temp"], "work_mem": "64MB", "timezone": None})
+    attributes = function._create_statement.split("plpython3u")[1].strip()
+    assert attributes == ("IMMUTABLE PARALLEL SAFE STRICT LEAKPROOF SECURITY DEFINER COST 10 ROWS 1 "
+                          "SET search_path = 'pg_temp' SET timezone FROM CURRENT SET work_mem = '64MB'")
+
+
+def test_function_volatile_compatibility():
+    function = f.Function("test", code="return 1")
+    assert function._create_statement.strip().endswith("plpython3u VOLATILE")
+    function.volatile = False
+    assert function.volatility == "STABLE"
+    assert function._create_statement.strip().endswith("plpython3u STABLE")
+
+
+def test_function_invalid_attributes():
+    with pytest.raises(ValueError):
+        f.Function("test", return_type="int", rows=10)._create_statement
+    with pytest.raises(ValueError):
+        f.Function("test", volatility="CONSTANT")._create_statement
+    with pytest.raises(ValueError):
+        f.Function("test", parallel="ALWAYS")._create_statement
+
+
+@f.function_options(volatility="IMMUTABLE", parallel="SAFE")
+@f.function_options(cost=5)
+def decorated(a: int) -> int:
+    return a + 1
+
+
+def test_function_options_decorator():
+    function = f.FunctionGenerator.from_function(decorated)
+    assert function.volatility == "IMMUTABLE"
+    assert function.parallel == "SAFE"
+    assert function.cost == 5
+    assert function.code.strip() == "return a + 1"
+    assert f.FunctionGenerator.from_function(decorated, cost=50).cost == 50
+    with pytest.raises(TypeError):
+        f.function_options(immutable=True)
+
+
+class Sale(NamedTuple):
+    region: str
+    total: float
+
+
+def report_sales(year: int) -> Iterator[Sale]:
+    for row in plpy.cursor("SELECT region, sum(total) FROM sales GROUP BY region"):
+        yield Sale(row["region"], row["sum"])
+
+
+def count_up(limit: int) -> Generator[int, None, None]:
+    yield from range(limit)
+
+
+def test_generate_return_type_iterators():
+    assert f.FunctionGenerator.generate_return_type(count_up) == "SETOF int"
+    assert f.FunctionGenerator.generate_return_type(report_sales) == "TABLE (region text, total numeric)"
+
+
+def test_generate_return_type_table():
+    def plain() -> Sequence[namedtuple("Plain", "a b")]:
+        return []
+
+    with pytest.raises(ValueError):
+        f.FunctionGenerator.generate_return_type(plain)
+
+
+@pytest.mark.skipif(dataclass is None, reason="dataclasses need Python 3.7")
+def test_generate_return_type_dataclass():
+    @dataclass
+    class Visit(object):
+        day: date
+        visitors: int
+
+    def visits() -> Sequence[Visit]:
+        return []
+
+    assert f.FunctionGenerator.generate_return_type(visits) == "TABLE (day date, visitors int)"
+
+
+def test_generator_function_streams_rows():
+    function = f.FunctionGenerator.from_function(report_sales)
+    assert function.returns_set
+    assert "yield Sale(" in function.code
+    assert "RETURNS TABLE (region text, total numeric)" in function._create_statement
+
+
+@f.function_options(batched=True, volatility="IMMUTABLE")
+def scaled(a: int, factor: float = 2.0) -> float:
+    if a is None:
+        return None
+    return a * factor
+
+
+def pair(a: int) -> Array[int]:
+    return [a, a]
+
+
+@f.function_options(strict=True)
+def doubled(a: int, b: int = 0) -> int:
+    return a * 2 + b
+
+
+def test_batched_from_function():
+    function = f.FunctionGenerator.batched_from_function(scaled)
+    assert function.name == "scaled_batch"
+    assert function.parameters == ["a int[]", "factor numeric[]"]
+    assert function.return_type == "numeric[]"
+    assert "IMMUTABLE STRICT" in function._create_statement
+    assert f.FunctionGenerator.batched_from_function(pair).return_type == "SETOF int[]"
+    with pytest.raises(ValueError):
+        f.FunctionGenerator.batched_from_function(example_4)  # Array parameter
+    with pytest.raises(ValueError):
+        f.FunctionGenerator.batched_from_function(example_1)
+
+
+def test_batched_function_runs_the_body_per_element():
+    from pgalchemy.emulator import Session
+    session = Session()
+    assert session.function(f.FunctionGenerator.batched_from_function(scaled))([1, None, 3], [2, 2, 0.5]) == \
+        [2, None, 1.5]
+    assert session.function(f.FunctionGenerator.batched_from_function(pair))([1, 2]) == [[1, 1], [2, 2]]
+    assert session.function(f.FunctionGenerator.batched_from_function(doubled))([1, None, 3], [0, 1, None]) == \
+        [2, None, None]
+    with pytest.raises(session.plpy.Error):
+        session.function(f.FunctionGenerator.batched_from_function(scaled))([1, 2], [1])
+
+
+def test_batched_companion_is_registered():
+    from pgalchemy.core import PostgresAlchemy
+    db = PostgresAlchemy()
+    db.procedure(scaled)
+    assert list(db.procedures) == ["scaled", "scaled_batch"]
+    assert "batched" not in f.FunctionGenerator.from_function(scaled)._create_statement
+
+
+def enrich(event: dict, tags: f.Hstore, labels: Dict[str, str] = None, extra: list = ({"a": 1},)) -> dict:
+    return dict(event, tags=tags)
+
+
+def tags_of(ids: List[int]) -> List[int]:
+    return ids
+
+
+def test_jsonb_and_hstore_mappings():
+    function = f.FunctionGenerator.from_function(enrich)
+    assert function.parameters == ["event jsonb", "tags hstore", "labels jsonb DEFAULT NULL",
+                                   """extra jsonb DEFAULT '[{"a": 1}]'"""]
+    assert function.return_type == "jsonb"
+    assert "LANGUAGE plpython3u TRANSFORM FOR TYPE jsonb, FOR TYPE hstore VOLATILE" in function._create_statement
+    function = f.FunctionGenerator.from_function(tags_of)
+    assert function.parameters == ["ids jsonb"] and function.return_type == "jsonb" and not function.returns_set
+
+
+def test_transforms():
+    assert "TRANSFORM" not in f.FunctionGenerator.from_function(example_3)._create_statement
+    function = f.FunctionGenerator.from_function(example_7, transforms=["jsonb"])
+    assert "LANGUAGE plpython3u TRANSFORM FOR TYPE jsonb VOLATILE" in function._create_statement
+    function = f.FunctionGenerator.from_function(enrich, transforms=[])
+    assert "TRANSFORM" not in function._create_statement
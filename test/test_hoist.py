@@ -0,0 +1,110 @@
+import datetime
+import math
+import random
+import re
+from pgalchemy.emulator import Session
+from pgalchemy.function import FunctionGenerator, function_options
+from pgalchemy.hoist import hoist, session_state
+from .config import *
+
+_word_re = re.compile(r"\w+", re.IGNORECASE)
+STOPWORDS = ("a", "the")
+loads = []
+
+
+def normalize(word):
+    return word.lower().strip()
+
+
+@session_state
+def weights():
+    loads.append(1)
+    return {"pgalchemy": 2}
+
+
+@function_options(hoist=True)
+def score(text: str) -> int:
+    """Sum of word weights."""
+    import collections
+    counts_type = collections.Counter
+    total = 0
+    for word in _word_re.findall(text):
+        word = normalize(word)
+        if word not in STOPWORDS:
+            total += weights().get(word, 1)
+    return total + int(math.sqrt(len(counts_type(text))))
+
+
+def per_call(values: Array[int]) -> int:
+    seen = set()
+    for value in values:
+        seen.add(value)
+    return len(seen)
+
+
+def uses_parameters(a: int) -> int:
+    import json
+    b = a * 2
+    return b
+
+
+def stamp(label: str) -> str:
+    pattern = re.compile("[a-z]+")
+    now = datetime.datetime.now()
+    token = random.random()
+    return label + pattern.sub("", now.isoformat()) + str(token)
+
+
+def stamp_random() -> float:
+    token = random.random()
+    return token
+
+
+def test_hoist_module_level_names_and_setup():
+    code = FunctionGenerator.from_function(score).code
+    assert code.startswith("    if 'hoisted' in SD:\n"
+                           "        _word_re, normalize, STOPWORDS, loads, weights, math, collections, "
+                           "counts_type = SD['hoisted']\n    else:\n")
+    assert "        _word_re = __import__('re').compile('\\\\w+', 34)\n" in code
+    assert "        def normalize(word):\n            return word.lower().strip()\n" in code
+    assert "        weights = (lambda value: lambda: value)(weights())\n" in code
+    assert "        import collections\n        counts_type = collections.Counter\n" in code
+    assert code.endswith("        SD['hoisted'] = _word_re, normalize, STOPWORDS, loads, weights, math, collections, "
+                         "counts_type\n    \"\"\"Sum of word weights.\"\"\"\n    total = 0\n" +
+                         code.split("total = 0\n")[1])
+
+
+def test_hoisted_function_runs_setup_once(monkeypatch):
+    runtime = Session().function(score)
+    assert runtime("The pgalchemy, the plpython") == 3 + 3
+    hoisted = runtime.SD["hoisted"]
+    assert runtime("a") == 0 + 1
+    assert runtime.SD["hoisted"] is hoisted
+    # A fresh session_state, weights may already have been loaded by another test
+    fresh_loads = []
+
+    @session_state
+    def fresh_weights():
+        fresh_loads.append(1)
+        return {"pgalchemy": 2}
+
+    monkeypatch.setitem(globals(), "weights", fresh_weights)
+    assert score("The pgalchemy") == 2 + 3 and score("a") == 1 and fresh_loads == [1]
+
+
+def test_setup_that_changes_per_call_stays():
+    code = "    seen = set()\n    for value in values:\n        seen.add(value)\n    return len(seen)\n"
+    assert hoist(per_call, code, ["values"]) == code
+    code = FunctionGenerator.get_function_body(uses_parameters)
+    hoisted = hoist(uses_parameters, code, ["a"])
+    assert "        import json\n        SD['hoisted'] = json,\n" in hoisted
+    assert "    b = a * 2\n" in hoisted.split("SD['hoisted'] = json,\n")[1]
+
+
+def test_calls_that_change_per_call_stay():
+    code = FunctionGenerator.from_function(stamp, hoist=True).code
+    setup, body = code.split("SD['hoisted'] = ")
+    assert "re.compile" in setup and "now()" not in setup and "random()" not in setup
+    assert "    now = datetime.datetime.now()\n    token = random.random()\n" in body
+    code = FunctionGenerator.from_function(stamp_random, hoist=True).code
+    assert code.endswith("SD['hoisted'] = random,\n    token = random.random()\n    return token\n")
@@ -0,0 +1,77 @@
+import pytest
+import pgalchemy.instrumentation as i
+from pgalchemy.core import PostgresAlchemy
+from pgalchemy.privilege import Privilege, grant
+from pgalchemy.role import Role
+from .mocks import MockConnection, MockEngine
+from .config import *
+
+
+class FailingConnection(MockConnection):
+    def execute(self, statement, *params):
+        raise RuntimeError("canceling statement due to lock timeout")
+
+
+def test_create_emits_event():
+    connection = MockConnection()
+    with i.TimingCollector(connection) as timings:
+        Role("nathan")._create(connection)
+    assert [(e.kind, e.name, e.sql) for e in timings.events] == [("role", "nathan", "CREATE ROLE nathan")]
+    assert timings.events[0].elapsed >= 0
+    assert timings.events[0].error is None
+    assert not i.listening(connection)
+
+
+def test_grant_emits_event():
+    privilege = Privilege().select.on.table(test_table).to("nathan")
+    connection = MockConnection()
+    with i.TimingCollector(connection) as timings:
+        grant(privilege, connection=connection)
+    assert [(e.kind, e.name) for e in timings.events] == [("privilege", "test_table")]
+
+
+def test_failed_statement_emits_event():
+    connection = FailingConnection()
+    with i.TimingCollector(connection) as timings:
+        with pytest.raises(RuntimeError):
+            Role("nathan")._create(connection)
+    assert isinstance(timings.events[0].error, RuntimeError)
+
+
+def test_deploy_attributes_statements_to_objects():
+    db = PostgresAlchemy()
+    db.role("nathan")
+    db.table(test_table)
+    db.policy("test").on(test_table).for_.all.to("nathan")
+    connection = MockConnection()
+    with i.TimingCollector(connection) as timings:
+        db.create_all(connection)
+        other = MockConnection()
+        db.create_all(other)
+    assert [(e.kind, e.name) for e in timings.events] == [("role", "nathan"), ("table", "test_table"),
+                                                           ("policy", "test")]
+    assert len(connection.executed) == 3
+    assert connection.transactions == 1
+    assert len(other.executed) == 1  # Nothing listens to it, so its statements are still batched
+
+
+def test_listeners_on_engine_see_its_connections():
+    engine = MockEngine()
+    db = PostgresAlchemy()
+    db.role("nathan")
+    with i.TimingCollector(engine) as timings:
+        db.create_all(engine)
+    db.create_all(engine)
+    assert [(e.kind, e.name) for e in timings.events] == [("role", "nathan")]
+
+
+def test_report():
+    timings = i.TimingCollector()
+    timings(i.StatementEvent("policy", "slow", "CREATE POLICY slow", 2.0, lock_wait=1.5))
+    timings(i.StatementEvent("policy", "fast", "CREATE POLICY fast", 0.5))
+    timings(i.StatementEvent("role", "nathan", "CREATE ROLE nathan", 1.0))
+    assert [e.name for e in timings.slowest(2)] == ["slow", "nathan"]
+    assert timings.by_kind() == {"policy": (2, 2.5), "role": (1, 1.0)}
+    report = timings.report()
+    assert "lock wait 1.500s" in report
+    assert report.index("policy slow") < report.index("role nathan") < report.index("policy fast")
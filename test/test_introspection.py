@@ -0,0 +1,122 @@
+import pgalchemy.function as f
+from pgalchemy import introspection as i
+from pgalchemy.policy import Policy
+from pgalchemy.privilege import Privilege
+from pgalchemy.role import Role
+from pgalchemy.trigger import Trigger
+from .config import *
+
+
+def test_normalize_expression():
+    catalog = "((name)::text ~~ '%@gmail.com'::text)"
+    assert i.normalize_expression(catalog) == i.normalize_expression(test_table.c.name.like("%@gmail.com"))
+    assert i.normalize_expression("(id = 1)") == i.normalize_expression(test_table.c.id == 1)
+    assert i.normalize_expression("(id = 2)") != i.normalize_expression(test_table.c.id == 1)
+
+
+def test_normalize_type():
+    assert i.normalize_type("VARCHAR(255)") == i.normalize_type("character varying(255)")
+    assert i.normalize_type("INTEGER") == i.normalize_type("int4")
+    assert i.normalize_type("SETOF int[]") == "setof integer[]"
+    assert i.normalize_type("TABLE (region text, total numeric(10, 2), visitors int)") == \
+        i.normalize_type("TABLE(region text, total numeric(10,2), visitors integer)")
+
+
+def test_diff_no_changes():
+    role = Role("nathan").login
+    policy = Policy("test").on(test_table).for_.select.to("nathan").using(test_table.c.id == 1)
+    privilege = Privilege().select.insert.on.table(test_table).to("nathan")
+    state = i.CatalogState(roles={"nathan": {"LOGIN": True, "SUPERUSER": False}},
+                           policies={("test_table", "test"): {"command": "SELECT", "roles": {"nathan"},
+                                                              "using": i.normalize_expression("(id = 1)"),
+                                                              "check": None}},
+                           acls={("TABLE", "test_table"): {("nathan", "SELECT"), ("nathan", "INSERT")}})
+    assert i.diff([role, policy, privilege], state) == []
+
+
+def test_diff_creates_and_alters():
+    role = Role("nathan").login
+    policy = Policy("test").on(test_table).for_.select.to("nathan").using(test_table.c.id == 2)
+    function = f.FunctionGenerator.from_function(example_7)
+    state = i.CatalogState(roles={"nathan": {"LOGIN": False}},
+                           policies={("test_table", "test"): {"command": "SELECT", "roles": {"nathan"},
+                                                              "using": i.normalize_expression("(id = 1)"),
+                                                              "check": None}})
+    statements = [s.strip() for s in i.diff([role, policy, function], state)]
+    assert statements[0].startswith("ALTER ROLE nathan WITH LOGIN")
+    assert statements[1].startswith("CREATE FUNCTION example_7")
+    assert statements[2].startswith("ALTER POLICY test on test_table TO nathan USING")
+
+
+def test_diff_replaces_changed_function_and_trigger():
+    function = f.FunctionGenerator.from_function(example_7)
+    trigger = Trigger("test")
+    trigger.before.insert.on(test_table).for_each.row(example_7)
+    live = {"result": "trigger", "source": "return None", "volatility": "v"}
+    state = i.CatalogState(functions={("example_7", ()): live},
+                           triggers={("test_table", "test"): {"timing": "AFTER", "events": {"INSERT"},
+                                                              "cardinality": "ROW", "function": "example_7",
+                                                              "arguments": ()}})
+    statements = i.diff([function, trigger], state)
+    assert statements[0].strip().startswith("CREATE OR REPLACE FUNCTION example_7")
+    assert statements[1].strip().startswith('DROP TRIGGER IF EXISTS "test"')
+    assert statements[2][0].strip().startswith('CREATE TRIGGER "test" BEFORE INSERT')
+    state.server_version = (14, 2)
+    statements = i.diff([function, trigger], state)
+    assert len(statements) == 2
+    assert statements[1][0].strip().startswith('CREATE OR REPLACE TRIGGER "test" BEFORE INSERT')
+
+
+def test_diff_replaces_function_with_changed_attributes():
+    function = f.Function("test", code="return 1", volatility="IMMUTABLE", parallel="SAFE", cost=10)
+    live = {"result": "void", "source": "return 1", "volatility": "i", "parallel": "s", "cost": 10.0, "rows": 0.0,
+            "strict": False, "leakproof": False, "security_definer": False, "config": []}
+    assert i.diff([function], i.CatalogState(functions={("test", ()): live})) == []
+    live["parallel"] = "u"
+    statements = i.diff([function], i.CatalogState(functions={("test", ()): live}))
+    assert statements[0].strip().startswith("CREATE OR REPLACE FUNCTION test")
+
+
+def test_diff_matches_function_overloads_by_argument_types():
+    function = f.Function("total", ["a int", "b numeric(10, 2) DEFAULT 1"], "int", code="return a")
+    live = {"result": "integer", "source": "return a", "volatility": "v"}
+    state = i.CatalogState(functions={("total", ("integer", "numeric")): live,
+                                      ("total", ("text",)): dict(live, source="return len(a)")})
+    assert i.diff([function], state) == []
+    assert i.argument_types(["int", "numeric(10, 2)[]"]) == ("integer", "numeric[]")
+
+
+def test_diff_recreates_policies_alter_cannot_change():
+    live = {"command": "SELECT", "roles": {"nathan"}, "using": i.normalize_expression("(id = 1)"), "check": None}
+    state = i.CatalogState(policies={("test_table", "test"): live})
+    for policy in (Policy("test").on(test_table).for_.select.to("nathan"),  # USING removed
+                   Policy("test").on(test_table).for_.select.to().using(test_table.c.id == 1)):  # Back to PUBLIC
+        statements = [s.strip() for s in i.diff([policy], state)]
+        assert statements[0].startswith("DROP POLICY") and statements[1].startswith("CREATE POLICY test")
+    policy = Policy("test").on(test_table).for_.select.to("bob").using(test_table.c.id == 1)
+    assert i.diff([policy], state)[0].strip().startswith("ALTER POLICY test")
+
+
+def test_diff_prunes_undeclared_policies_and_acls():
+    policy = Policy("test").on(test_table).for_.all
+    privilege = Privilege().select.on.table(test_table).to("nathan")
+    state = i.CatalogState(policies={("test_table", "test"): {"command": "ALL", "roles": {"public"}, "using": None,
+                                                              "check": None},
+                                     ("test_table", "old"): {"command": "ALL", "roles": {"public"}, "using": None,
+                                                             "check": None}},
+                           acls={("TABLE", "test_table"): {("nathan", "SELECT"), ("nathan", "DELETE"),
+                                                           ("bob", "SELECT")}})
+    statements = [s.strip() for s in i.diff([policy, privilege], state)]
+    assert statements == ["DROP POLICY IF EXISTS old on test_table",
+                          "REVOKE SELECT on TABLE test_table from bob",
+                          "REVOKE DELETE on TABLE test_table from nathan"]
+
+
+def test_diff_matches_schema_qualified_tables():
+    table = Table("events", MetaData(), Column("id", Integer, primary_key=True), schema="app")
+    policy = Policy("own").on(table).for_.all
+    live = {"command": "ALL", "roles": {"public"}, "using": None, "check": None}
+    state = i.CatalogState(policies={("app.events", "own"): live, ("app.events", "old"): live})
+    assert [s.strip() for s in i.diff([policy], state)] == ["DROP POLICY IF EXISTS old on app.events"]
+    state = i.CatalogState(policies={("events", "own"): live}, visible_tables={"events": "app"})
+    assert i.diff([policy], state) == []
@@ -0,0 +1,62 @@
+from collections import OrderedDict
+import pgalchemy.function as f
+from pgalchemy import ledger as l
+from pgalchemy.deploy import DependencyGraph
+from pgalchemy.policy import Policy
+from pgalchemy.privilege import Privilege
+from pgalchemy.role import Role
+from pgalchemy.trigger import Trigger
+from .config import *
+
+
+def _deployed(graph, ledger):
+    return OrderedDict((ledger.key(node), (node.fingerprint, node.drop_statement)) for node in graph.ordered())
+
+
+def test_unchanged_objects_are_skipped():
+    ledger = l.Ledger()
+    graph = DependencyGraph([Role("nathan"), Policy("test").on(test_table).for_.all.to("nathan"),
+                             Privilege().select.on.table(test_table).to("nathan")])
+    assert l.changed_statements(graph, _deployed(graph, ledger), ledger) == []
+
+
+def test_new_and_changed_objects_are_deployed():
+    ledger = l.Ledger()
+    role = Role("nathan")
+    policy = Policy("test").on(test_table).for_.all.to("nathan")
+    function = f.FunctionGenerator.from_function(example_7)
+    deployed = _deployed(DependencyGraph([role, policy, function]), ledger)
+    role.login
+    policy.using(test_table.c.id == 1)
+    function.volatile = False
+    graph = DependencyGraph([role, policy, function, Privilege().select.on.table(test_table).to("nathan")])
+    statements = [s.strip() for s in l.changed_statements(graph, deployed, ledger)]
+    assert statements[0].startswith("ALTER ROLE nathan WITH LOGIN")
+    assert statements[1].startswith("CREATE OR REPLACE FUNCTION example_7")
+    assert statements[2].startswith("DROP POLICY IF EXISTS test on test_table")
+    assert statements[3].startswith("CREATE POLICY test")
+    assert statements[4].startswith("GRANT SELECT")
+    assert statements[5].startswith("INSERT INTO pgalchemy_ledger")
+    assert statements[5].count("'role:nathan'") == 1
+
+
+def test_prune_drops_stale_objects():
+    ledger = l.Ledger()
+    deployed = _deployed(DependencyGraph([Role("nathan"), Role("bob")]), ledger)
+    statements = [s.strip() for s in l.changed_statements(DependencyGraph([Role("nathan")]), deployed, ledger,
+                                                          prune=True)]
+    assert statements == ["DROP ROLE IF EXISTS bob", "DELETE FROM pgalchemy_ledger WHERE object_key IN ('role:bob')"]
+
+
+def test_changed_trigger_is_replaced_in_place():
+    ledger = l.Ledger()
+    trigger = Trigger("test")
+    trigger.before.insert.on(test_table).for_each.row(example_7)
+    deployed = _deployed(DependencyGraph([trigger]), ledger)
+    trigger._set_event("UPDATE")
+    graph = DependencyGraph([trigger])
+    statements = l.changed_statements(graph, deployed, ledger, server_version=(14, 2))
+    assert statements[0][0].strip().startswith('CREATE OR REPLACE TRIGGER "test" BEFORE INSERT OR UPDATE')
+    statements = l.changed_statements(graph, deployed, ledger, server_version=(12, 0))
+    assert statements[0].strip().startswith('DROP TRIGGER IF EXISTS "test"')
+    assert statements[1][0].strip().startswith('CREATE TRIGGER "test"')
@@ -0,0 +1,106 @@
+import pytest
+import pgalchemy.locking as l
+from pgalchemy.core import PostgresAlchemy
+from pgalchemy.deploy import DependencyGraph
+from pgalchemy.instrumentation import TimingCollector
+from pgalchemy.privilege import Privilege
+from pgalchemy.role import Role
+from .mocks import MockConnection
+from .config import *
+
+
+class LockNotAvailable(Exception):
+    pgcode = "55P03"
+
+
+class BusyConnection(MockConnection):
+    """Times out on the first `busy` attempts to lock a table."""
+
+    def __init__(self, busy):
+        super().__init__()
+        self.busy = busy
+
+    def execute(self, statement, *params):
+        if str(statement).startswith("LOCK TABLE") and self.busy:
+            self.busy -= 1
+            raise LockNotAvailable("canceling statement due to lock timeout")
+        super().execute(statement, *params)
+
+
+def registry():
+    db = PostgresAlchemy()
+    db.role("nathan")
+    db.table(test_table)
+    db.policy("test").on(test_table).for_.all.to("nathan")
+    db.trigger("audit").after.insert.on(test_table).for_each.row(example_7)
+    db.grant(Privilege().select.on.table(test_table).to("nathan"))
+    return db
+
+
+def test_lock_groups_collect_each_table():
+    groups = l.lock_groups(registry().dependency_graph())
+    assert [(table, [node.kind for node in nodes]) for table, nodes in groups] == [
+        (None, ["role", "table"]),
+        ("test_table", ["trigger", "policy", "privilege"]),
+    ]
+    drop_groups = l.lock_groups(registry().dependency_graph(), drop=True)
+    assert [table for table, _ in drop_groups] == ["test_table", None]
+
+
+def test_lock_groups_keep_dependencies_in_order():
+    role = Role("nathan")
+    privilege = Privilege().select.on.table(test_table).to("nathan")
+    groups = l.lock_groups(DependencyGraph([privilege, role]))
+    assert [(table, [node.kind for node in nodes]) for table, nodes in groups] == [
+        (None, ["role"]), ("test_table", ["privilege"])
+    ]
+
+
+def test_lock_mode():
+    graph = registry().dependency_graph()
+    nodes = dict((node.kind, node) for node in graph.nodes.values())
+    assert l.lock_mode([nodes["privilege"]]) is None
+    assert l.lock_mode([nodes["trigger"]]) == "SHARE ROW EXCLUSIVE"
+    assert l.lock_mode([nodes["trigger"]], drop=True) == "ACCESS EXCLUSIVE"
+    assert l.lock_mode([nodes["trigger"], nodes["policy"]]) == "ACCESS EXCLUSIVE"
+
+
+def test_lock_aware_deploy_locks_each_table_once():
+    connection = MockConnection()
+    registry().create_all(connection, lock_timeout=500)
+    statements = [s.strip() for s, _ in connection.executed]
+    assert statements.count("SET LOCAL lock_timeout = 500") == 2
+    assert statements.count("LOCK TABLE test_table IN ACCESS EXCLUSIVE MODE") == 1
+    assert connection.transactions == 2
+
+
+def test_lock_aware_deploy_retries_with_backoff():
+    connection = BusyConnection(busy=2)
+    delays = []
+    with TimingCollector(connection) as timings:
+        l.lock_aware_deploy(registry().dependency_graph(), connection, sleep=delays.append)
+    assert len(delays) == 2
+    assert 0.025 <= delays[0] <= 0.05 and 0.05 <= delays[1] <= 0.1
+    lock_waits = [e.lock_wait for e in timings.events if e.lock_wait is not None]
+    assert len(lock_waits) == 1 and lock_waits[0] >= 0
+
+
+def test_lock_aware_deploy_gives_up():
+    with pytest.raises(LockNotAvailable):
+        l.lock_aware_deploy(registry().dependency_graph(), BusyConnection(busy=5), retries=2, sleep=lambda d: None)
+
+
+def test_lock_aware_deploy_does_not_retry_other_errors():
+    class BrokenConnection(MockConnection):
+        def execute(self, statement, *params):
+            raise ValueError("syntax error")
+
+    delays = []
+    with pytest.raises(ValueError):
+        l.lock_aware_deploy(registry().dependency_graph(), BrokenConnection(), sleep=delays.append)
+    assert not delays
+
+
+def test_lock_timeout_with_workers():
+    with pytest.raises(ValueError):
+        registry().create_all(MockConnection(), workers=2, lock_timeout=500)
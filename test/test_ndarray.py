@@ -0,0 +1,49 @@
+import pytest
+
+numpy = pytest.importorskip("numpy")
+
+from numpy.typing import NDArray
+from pgalchemy.emulator import Session
+from pgalchemy.function import FunctionGenerator, function_options
+from pgalchemy.ndarray import ndarray_dtype
+from .config import *
+
+
+def cosine(a: NDArray[numpy.float64], b: NDArray[numpy.float64]) -> float:
+    return float(a.dot(b) / (numpy.linalg.norm(a) * numpy.linalg.norm(b)))
+
+
+@function_options(zero_copy=True)
+def rolling_mean(values: NDArray[numpy.float32], window: int = 2) -> NDArray[numpy.float32]:
+    return numpy.convolve(values, numpy.ones(window) / window, mode="valid")
+
+
+def counts(values: numpy.ndarray) -> NDArray[numpy.int64]:
+    return values.astype("int64")
+
+
+def test_ndarray_dtype():
+    assert ndarray_dtype(NDArray[numpy.int32]) == "int32"
+    assert ndarray_dtype(numpy.ndarray) == "float64"
+    assert ndarray_dtype(list) is None
+    with pytest.raises(ValueError):
+        ndarray_dtype(NDArray[numpy.complex128])
+
+
+def test_ndarray_type_mapping():
+    assert FunctionGenerator.convert_python_type_to_sql(NDArray[numpy.float64]) == "float8[]"
+    function = FunctionGenerator.from_function(cosine)
+    assert function.parameters == ["a float8[]", "b float8[]"] and function.return_type == "numeric"
+    function = FunctionGenerator.from_function(rolling_mean)
+    assert function.parameters == ["values bytea", "window int DEFAULT 2"] and function.return_type == "bytea"
+    assert "numpy.frombuffer(values, dtype='float32')" in function.code
+
+
+def test_ndarray_bodies_run_on_arrays():
+    session = Session()
+    assert session.function(cosine)([1.0, 0.0], [1.0, 1.0]) == pytest.approx(2 ** -0.5)
+    assert session.function(counts)([1.0, 2.5]) == [1, 2]
+    values = numpy.array([1, 2, 3, 4], dtype="float32")
+    result = session.function(rolling_mean)(values.tobytes(), 2)
+    assert isinstance(result, bytes)
+    assert numpy.frombuffer(result, dtype="float32").tolist() == [1.5, 2.5, 3.5]
@@ -0,0 +1,74 @@
+import pgalchemy.function as f
+import pgalchemy.plans as p
+from .config import *
+
+parameter_types = {"id": "int", "name": "text", "price": "numeric"}
+
+
+def run(code, plans=None, **variables):
+    """Execute a rewritten body against a stand-in plpy that records every plan it prepares."""
+    prepared = [] if plans is None else plans
+
+    class Plpy(object):
+        @staticmethod
+        def prepare(sql, types):
+            prepared.append((sql, types))
+            return sql, types
+
+        @staticmethod
+        def execute(plan, arguments=None, limit=None):
+            return plan, arguments, limit
+
+        @staticmethod
+        def quote_literal(value):
+            return "'%s'" % value
+
+    namespace = dict(variables, plpy=Plpy(), SD=variables.get("SD", {}))
+    exec("def body():\n" + code + "\nresult = body()", namespace)
+    return namespace["result"]
+
+
+def test_literal_query_is_prepared_once():
+    code = p.cache_plans('    return plpy.execute("SELECT 1")\n', parameter_types)
+    assert "plpy.prepare('SELECT 1', [])" in code
+    plans, sd = [], {}
+    assert run(code, plans, SD=sd) == (("SELECT 1", []), [], None)
+    run(code, plans, SD=sd)
+    assert plans == [("SELECT 1", [])]
+
+
+def test_formatted_query_becomes_bind_parameters():
+    body = ('    return plpy.execute(\n'
+            '        "UPDATE test SET name = %s, note = \'%s\' WHERE id = %d AND price > %s AND x LIKE \'a%%\'"\n'
+            '        % (plpy.quote_literal(name), name, id, price), 5)\n')
+    code = p.cache_plans(body, parameter_types)
+    plan, arguments, limit = run(code, name="n", id=1, price=2)
+    assert plan == ("UPDATE test SET name = $1, note = $2 WHERE id = $3 AND price > $4 AND x LIKE 'a%'",
+                    ["text", "text", "int", "numeric"])
+    assert arguments == ["n", "n", 1, 2]
+    assert limit == 5
+
+
+def test_unsafe_queries_are_left_alone():
+    for body in ('    return plpy.execute("SELECT * FROM %s" % name)\n',  # probably an identifier
+                 '    return plpy.execute("SELECT %s" % other)\n',  # not a parameter
+                 '    return plpy.execute(query)\n',
+                 '    return plpy.execute("SELECT {0}".format(id))\n',
+                 '    return plpy.execute("SELECT 1", limit=1)\n'):
+        assert p.cache_plans(body, parameter_types) == body
+
+
+def test_strings_and_comments_are_not_rewritten():
+    body = '    # plpy.execute("SELECT 1")\n    return "plpy.execute(\'SELECT 1\')"\n'
+    assert p.cache_plans(body, parameter_types) == body
+
+
+@f.function_options(cache_plans=True)
+def cached(id: int) -> int:
+    return plpy.execute("SELECT count(*) AS n FROM test_table WHERE id > %d" % id)[0]["n"]
+
+
+def test_from_function_caches_plans():
+    function = f.FunctionGenerator.from_function(cached)
+    assert "plpy.prepare('SELECT count(*) AS n FROM test_table WHERE id > $1', ['int'])" in function.code
+    assert "plpy.execute(SD[" in function._create_statement
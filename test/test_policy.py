@@ -42,4 +42,17 @@ def test_policy_delete():
     policy.on(test_table).for_.delete.to("nathan", "CURRENT_USER")
     assert policy._table == test_table
     assert policy._command == "DELETE"
-    assert policy._recipient == ["nathan", "CURRENT_USER"]
\ No newline at end of file
+    assert policy._recipient == ["nathan", "CURRENT_USER"]
+
+
+def test_policy_statement_cache_invalidation():
+    policy = p.Policy("test")
+    policy.on(test_table).for_.select.to("nathan")
+    statement = policy._create_statement
+    fingerprint = policy._fingerprint
+    assert policy._create_statement is statement
+    policy._set_recipient("bob")
+    assert "nathan, bob" in policy._create_statement
+    assert policy._fingerprint != fingerprint
+    policy.using(test_table.c.id == 1)
+    assert "USING (test_table.id = 1)" in policy._create_statement
@@ -183,3 +183,16 @@ def test_type_privilege():
     assert privilege_2._target == ["foo"]
     assert privilege_2._recipient == ["nathan", "PUBLIC"]
 
+
+def test_privilege_statement_cache_invalidation():
+    privilege = p.Privilege()
+    privilege.select.on.table(test_table).to("nathan")
+    statement = privilege._grant_statement
+    assert privilege._grant_statement is statement
+    assert privilege._fingerprint == p.Privilege().select.on.table(test_table).to("nathan")._privilege._fingerprint
+    privilege.with_grant_option
+    privilege._set_recipients("bob")
+    assert "to nathan, bob" in privilege._grant_statement
+    privilege_2 = p.Privilege()
+    privilege_2.select(test_table.c.id)
+    assert "SELECT (test_table.id)" in privilege_2._grant_statement
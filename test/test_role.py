@@ -0,0 +1,22 @@
+from pgalchemy import role as r
+
+
+def test_role_create_statement():
+    role = r.Role("nathan").login.create_db(False).in_role("staff")
+    assert role._create_statement.split() == ["CREATE", "ROLE", "nathan", "WITH", "LOGIN", "NO", "CREATEDB", "IN",
+                                              "ROLE", "staff"]
+
+
+def test_role_alter_statement_skips_membership():
+    role = r.Role("nathan").login.in_role("staff")
+    assert role._alter_statement.split() == ["ALTER", "ROLE", "nathan", "WITH", "LOGIN"]
+
+
+def test_role_statement_cache_invalidation():
+    role = r.Role("nathan").login
+    statement = role._create_statement
+    assert role._create_statement is statement
+    role.superuser
+    assert "SUPERUSER" in role._create_statement
+    role.connection_limit(5)
+    assert "CONNECTION LIMIT 5" in role._create_statement
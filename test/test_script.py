@@ -0,0 +1,43 @@
+import io
+from pgalchemy import script as s
+from pgalchemy.core import PostgresAlchemy
+from pgalchemy.privilege import Privilege
+from pgalchemy.role import Role
+from pgalchemy.trigger import Trigger
+from .config import *
+
+
+def test_render_statement():
+    assert s.render_statement("EXECUTE PROCEDURE f (%s, %s)", ["a", 1]) == "EXECUTE PROCEDURE f ('a', 1)"
+    assert s.render_statement("LIKE '%'") == "LIKE '%'"
+    assert s.render_statement("WHEN (name LIKE 'a%' OR name LIKE '%s') EXECUTE PROCEDURE f (%s)", ["it's"]) == \
+        "WHEN (name LIKE 'a%' OR name LIKE '%s') EXECUTE PROCEDURE f ('it''s')"
+
+
+def test_iter_script_registry():
+    registry = PostgresAlchemy()
+    registry.grant().select.on.table(test_table).to("nathan")
+    registry.role("nathan")
+    chunks = list(s.iter_script(registry))
+    assert chunks[0] == "BEGIN;\n"
+    assert chunks[1].startswith("CREATE ROLE nathan")
+    assert chunks[2].startswith("GRANT SELECT on TABLE test_table to nathan")
+    assert chunks[-1] == "COMMIT;\n"
+
+
+def test_iter_script_streams_unordered_generator():
+    privileges = (Privilege().select.on.table(test_table).to("role_%s" % i) for i in range(3))
+    chunks = list(s.iter_script(privileges, transaction=False, ordered=False))
+    assert [c.split()[-1] for c in chunks] == ["role_0;", "role_1;", "role_2;"]
+
+
+def test_write_script_with_trigger_parameters():
+    trigger = Trigger("test")
+    trigger.before.insert.on(test_table).for_each.row.with_arguments("a")(example_9)
+    stream = io.StringIO()
+    s.write_script([Role("nathan"), trigger], stream, drop=True)
+    script = stream.getvalue()
+    assert script.index('DROP TRIGGER IF EXISTS "test"') < script.index("DROP ROLE IF EXISTS nathan")
+    stream = io.StringIO()
+    s.write_script([trigger], stream, transaction=False)
+    assert stream.getvalue().rstrip().endswith("""EXECUTE PROCEDURE "example_9" ('a');""")
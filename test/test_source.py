@@ -0,0 +1,94 @@
+import importlib
+import sys
+import pytest
+import pgalchemy.source as s
+from pgalchemy.function import FunctionGenerator, function_options
+from .config import *
+
+
+@function_options(cache_plans=True)
+@function_options(strict=True)
+def decorated(a: int) -> int:
+    return a
+
+
+def multiline_signature(a: int,
+                        b: int = 1
+                        ) -> int:
+    # Kept with the body
+    return a + b
+
+
+def one_liner(a: int) -> int: return a
+
+
+def similar_names(a: int, b: int) -> int:
+    ab = 1
+    b_ = a == b
+    return ab + b_
+
+
+def nested(a: int) -> int:
+    def inner(a=2):
+        a = 3
+        return a
+    return inner() + a
+
+
+def comprehension(x: int, xs: Array[int]) -> int:
+    return sum([x for x in xs]) + sum({x: 1 for x in xs}.values()) + x
+
+
+def test_body_after_decorators():
+    assert s.function_source(decorated).body == "    return a\n"
+
+
+def test_body_after_multiline_signature():
+    assert s.function_source(multiline_signature).body == "    # Kept with the body\n    return a + b\n"
+
+
+def test_body_on_signature_line():
+    assert s.function_source(one_liner).body == "    return a\n"
+
+
+def test_body_is_cached_per_code_object():
+    assert s.function_source(example_4) is s.function_source(example_4)
+    s.clear_cache()
+    assert s.function_source(example_4).body.endswith("return True\n")
+
+
+def test_assigned_names():
+    assert s.function_source(example_5).assigned == ["a", "b"]
+    assert sorted(s.function_source(similar_names).assigned) == ["ab", "b_"]
+    assert s.function_source(nested).assigned == ["inner"]
+    assert s.function_source(comprehension).assigned == []
+    statements = s.parse_body("for i, row in enumerate(rows):\n    pass\nimport json as j\ntry:\n    x += 1\n"
+                              "except ValueError as e:\n    del y")
+    assert sorted(s.assigned_names(statements)) == ["e", "i", "j", "row", "x", "y"]
+
+
+def test_similar_names_are_not_overwritten_parameters():
+    FunctionGenerator.from_function(similar_names)
+    FunctionGenerator.from_function(nested)
+    FunctionGenerator.from_function(comprehension)
+    with pytest.raises(ValueError):
+        FunctionGenerator.from_function(example_5)
+
+
+def test_source_not_available():
+    with pytest.raises(OSError):
+        s.function_source(eval("lambda: 1"))
+
+
+def test_edited_module_is_parsed_again(tmp_path, monkeypatch):
+    module = tmp_path / "edited_module.py"
+    module.write_text("def f(a: int) -> int:\n    return a\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    import edited_module
+    try:
+        assert s.function_source(edited_module.f).body == "    return a\n"
+        module.write_text("# Moves f down a line\ndef f(a: int) -> int:\n    return a + 1\n")
+        importlib.reload(edited_module)
+        assert s.function_source(edited_module.f).body == "    return a + 1\n"
+    finally:
+        del sys.modules["edited_module"]
@@ -0,0 +1,88 @@
+import pgalchemy.translate as t
+from pgalchemy.function import FunctionGenerator, function_options
+from .config import *
+
+types = {"a": "int", "b": "int", "x": "numeric", "name": "text", "flag": "boolean"}
+
+
+def translate(code, return_type="int"):
+    return t.translate(code, types, return_type)
+
+
+@function_options(translate=True, infer=True)
+def total(a: int, b: int = 1) -> int:
+    """Inlined wherever it's called."""
+    return a * 2 + b
+
+
+@function_options(translate=True)
+def grade(a: int) -> str:
+    if a >= 90:
+        return "A"
+    elif a >= 80:
+        return "B"
+    return "C"
+
+
+@function_options(translate=True)
+def lookup(a: int) -> int:
+    rows = plpy.execute("SELECT %s AS a" % a)
+    return rows[0]["a"]
+
+
+def test_arithmetic():
+    assert translate("return a * 2 + b") == "SELECT CAST(((a * 2) + b) AS int)"
+    assert translate("return -x / 3", "numeric") == "SELECT CAST(((-x)::numeric / 3) AS numeric)"
+    assert translate("return x * 1e999", "numeric") is None
+    assert translate("return a // b") == "SELECT CAST(floor(a::numeric / b)::bigint AS int)"
+    assert translate("return a % b") is None  # Python's modulo follows the divisor's sign, SQL's the dividend's
+    # Stays int arithmetic, a * b overflowing int raises in SQL where Python would carry on with a bigger int
+    assert translate("return a * b // 2") == "SELECT CAST(floor((a * b)::numeric / 2)::bigint AS int)"
+
+
+def test_conditionals():
+    code = "if a > 1 and flag:\n    return 1\nelif a is None:\n    return 2\nelse:\n    return 3"
+    assert translate(code) == "SELECT CAST(CASE WHEN ((a > 1) AND flag) THEN 1 WHEN (a IS NULL) THEN 2 ELSE 3 END " \
+                              "AS int)"
+    assert translate("return 1 if 0 < a <= 10 else 0") == \
+        "SELECT CAST(CASE WHEN ((0 < a) AND (a <= 10)) THEN 1 ELSE 0 END AS int)"
+    assert translate("if a:\n    return 1\nreturn 0") is None
+    assert translate("return a or b") is None
+
+
+def test_strings():
+    assert translate("return 'id-%s:%d' % (name, a)", "text") == \
+        "SELECT CAST(('id-' || coalesce(name, 'None') || ':' || coalesce(a::text, 'None')) AS text)"
+    assert translate("return f'{name.replace(\"-\", \" \")}!'", "text") == \
+        "SELECT CAST((coalesce(replace(name, '-', ' '), 'None') || '!') AS text)"
+    assert translate("return name.upper()", "text") is None  # Locale rather than Unicode case mapping
+    assert translate("return name.startswith('a') or len(name) > 3", "boolean") == \
+        "SELECT CAST(((left(name, length('a')) = 'a') OR (length(name) > 3)) AS boolean)"
+    assert translate("return '%.2f' % x", "text") is None
+    assert translate("return f'{x}'", "text") is None
+    assert translate("return name.strip('x ')", "text") == "SELECT CAST(btrim(name, 'x ') AS text)"
+    assert translate("return name.strip()", "text") is None  # Python strips tabs and newlines too
+    assert translate("return name < 'b'", "boolean") is None  # SQL orders text by collation
+    assert translate("return max(name, 'b')", "text") is None
+
+
+def test_untranslatable():
+    assert translate("b = a + 1\nreturn b") is None
+    assert translate("return math.floor(a)") is None
+    assert translate("return round(x)") is None
+    assert translate("return name + a", "text") is None
+
+
+def test_from_function():
+    function = FunctionGenerator.from_function(total)
+    assert function.language == "sql" and function.volatility == "IMMUTABLE"
+    assert "SELECT CAST(((a * 2) + b) AS int)" in function._create_statement
+    assert "LANGUAGE sql IMMUTABLE PARALLEL SAFE" in function._create_statement
+    assert "CASE WHEN (a >= 90) THEN 'A' WHEN (a >= 80) THEN 'B' ELSE 'C' END" in \
+        FunctionGenerator.from_function(grade).code
+
+
+def test_falls_back_to_plpython():
+    function = FunctionGenerator.from_function(lookup)
+    assert function.language == "plpython3u" and "plpy.execute" in function.code
+    assert "LANGUAGE plpython3u" in FunctionGenerator.from_function(example_3)._create_statement
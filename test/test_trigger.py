@@ -1,5 +1,6 @@
 import pytest
 from pgalchemy import trigger as t
+from .mocks import MockConnection, MockDialect
 from .config import *
 
 
@@ -73,6 +74,18 @@ def test_constraint_trigger():
     trigger.insert.update.on(test_table).for_each.row(example_7)
     assert trigger._constraint == "CONSTRAINT"
     assert trigger._execution_time == "AFTER"
+    assert trigger._create_statement[0].strip().startswith('CREATE CONSTRAINT TRIGGER "test" AFTER INSERT')
+
+
+def test_constraint_trigger_schema_qualified_tables():
+    metadata = MetaData()
+    events = Table("events", metadata, Column("id", Integer, primary_key=True), schema="app")
+    accounts = Table("accounts", metadata, Column("id", Integer, primary_key=True), schema="billing")
+    trigger = t.ConstraintTrigger("test")
+    trigger.insert.on(events).from_table(accounts).for_each.row(example_7)
+    statement = " ".join(trigger._create_statement[0].split())
+    assert "on app.events FROM billing.accounts" in statement
+    assert " ".join(trigger._drop_statement.split()).endswith("on app.events")
 
 
 def test_trigger_timing_exception_1():
@@ -85,3 +98,31 @@ def test_trigger_timing_exception_2():
     trigger = t.Trigger("test")
     with pytest.raises(ValueError):
         trigger.instead_of.truncate.on(test_table).for_each.statement
+
+
+def test_trigger_replace_statements():
+    trigger = t.Trigger("test")
+    trigger.before.insert.on(test_table).for_each.row(example_7)
+    replace, = trigger._replace_statements((14, 2))
+    assert replace[0].strip().startswith('CREATE OR REPLACE TRIGGER "test" BEFORE INSERT')
+    drop, create = trigger._replace_statements((13, 4))
+    assert drop.strip().startswith('DROP TRIGGER IF EXISTS "test"')
+    assert create == trigger._create_statement
+    assert len(trigger._replace_statements()) == 2
+    constraint_trigger = t.ConstraintTrigger("test")
+    constraint_trigger.insert.on(test_table).for_each.row(example_7)
+    assert len(constraint_trigger._replace_statements((14, 2))) == 2
+
+
+def test_trigger_replace_swaps_in_one_transaction():
+    trigger = t.Trigger("test")
+    trigger.before.insert.on(test_table).for_each.row(example_7)
+    connection = MockConnection()
+    trigger._replace(connection)
+    assert connection.transactions == 1
+    assert [s.split()[0] for s, _ in connection.executed] == ["DROP", "CREATE"]
+    connection = MockConnection()
+    connection.dialect = MockDialect()
+    connection.dialect.server_version_info = (14, 2)
+    trigger._replace(connection)
+    assert [s.split()[:3] for s, _ in connection.executed] == [["CREATE", "OR", "REPLACE"]]
@@ -0,0 +1,33 @@
+import os
+import subprocess
+import sys
+from .config import *
+from pgalchemy.util import get_name, get_condition_text
+
+
+package_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_import_does_not_load_sqlalchemy():
+    code = "import sys, pgalchemy.role, pgalchemy.policy, pgalchemy.privilege, pgalchemy.deploy; " \
+           "print('sqlalchemy' in sys.modules)"
+    output = subprocess.check_output([sys.executable, "-c", code], cwd=package_root)
+    assert output.strip() == b"False"
+
+
+def test_import_package_is_lazy():
+    code = "import sys, pgalchemy; pgalchemy.PostgresAlchemy(); " \
+           "print(any(m in sys.modules for m in ('pgalchemy.function', 'pgalchemy.deploy', 'sqlalchemy')))"
+    output = subprocess.check_output([sys.executable, "-c", code], cwd=package_root)
+    assert output.strip() == b"False"
+
+
+def test_get_name_sqlalchemy_objects():
+    assert get_name(test_table.c.id) == "test_table.id"
+    assert get_name(TestMappedClass.id) == "test_table.id"
+    assert get_name(TestMappedClass) == "test_table"
+
+
+def test_get_condition_text():
+    assert get_condition_text("a > 1") == "a > 1"
+    assert get_condition_text(test_table.c.id > 1) == "test_table.id > 1"